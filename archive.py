@@ -0,0 +1,171 @@
+"""
+Solid archives
+
+Packs many files into one payload, so a whole directory can be stored in a
+single level. Files are laid end to end in blocks of about BLOCK_SIZE and each
+block is compressed as one zstd frame: similar files compress against each
+other, and reading one member only decompresses the block that holds it.
+
+Layout:
+    b"GDSA", version byte
+    table size (4 bytes, big endian), table (zstd compressed JSON)
+    blocks, back to back
+
+Table:
+    {"blocks": [[offset, size, raw_size], ...],
+     "members": [[name, size, block, offset, sha256], ...]}
+
+Block offsets start after the table, member offsets are inside the
+decompressed block. Member names are relative POSIX paths.
+
+Archives are stored with method 6's skip_compression, the blocks are
+compressed already. The stored filename ends in SUFFIX.
+"""
+import hashlib
+import json
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+
+from methods.compression import compress_data, compress_parts, decompress_data, decompress_reader
+
+MAGIC = b"GDSA"
+VERSION = 1
+BLOCK_SIZE = 4 << 20  # Raw bytes per block, a member larger than this gets a block of its own
+SUFFIX = ".gdsa"
+HEADER_SIZE = len(MAGIC) + 1 + 4
+
+
+@dataclass
+class Member:
+    name: str
+    size: int
+    block: int
+    offset: int  # In the decompressed block
+    sha256: str
+
+
+def is_archive(data) -> bool:
+    return bytes(data[:len(MAGIC)]) == MAGIC
+
+
+def collect_members(paths: list[str]) -> list[tuple[str, Path]]:
+    """(member name, path) for the given files and directories (recursively).
+
+    Names are relative to each path's parent, so a directory keeps its own name.
+    """
+    members = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            for file in sorted(p for p in path.rglob("*") if p.is_file()):
+                members.append((file.relative_to(path.parent).as_posix(), file))
+        elif path.is_file():
+            members.append((path.name, path))
+        else:
+            raise FileNotFoundError(f"File not found: {path}")
+    return members
+
+
+def pack(members: list[tuple[str, Path]]) -> bytes:
+    """Build an archive from (member name, path) pairs."""
+    # Files of the same type next to each other compress better
+    ordered = sorted(members, key=lambda m: (PurePosixPath(m[0]).suffix.lower(), m[0]))
+
+    blocks = []        # Compressed frames
+    block_table = []
+    member_table = []
+    parts = []
+    raw_size = 0
+    offset = 0
+
+    def flush():
+        nonlocal parts, raw_size, offset
+        frame = compress_parts(*parts)
+        block_table.append([offset, len(frame), raw_size])
+        blocks.append(frame)
+        offset += len(frame)
+        parts = []
+        raw_size = 0
+
+    for name, path in ordered:
+        data = path.read_bytes()
+        if parts and raw_size + len(data) > BLOCK_SIZE:
+            flush()
+        member_table.append([name, len(data), len(block_table), raw_size, hashlib.sha256(data).hexdigest()])
+        parts.append(data)
+        raw_size += len(data)
+    if parts:
+        flush()
+
+    table = compress_data(json.dumps({"blocks": block_table, "members": member_table}).encode())
+    return b"".join([MAGIC, bytes([VERSION]), len(table).to_bytes(4, "big"), table, *blocks])
+
+
+class Archive:
+    """Read access to a packed archive."""
+
+    def __init__(self, data):
+        view = memoryview(data)
+        if not is_archive(view):
+            raise ValueError("Not an archive")
+        if view[len(MAGIC)] != VERSION:
+            raise ValueError(f"Unsupported archive version: {view[len(MAGIC)]}")
+
+        table_size = int.from_bytes(view[len(MAGIC) + 1:HEADER_SIZE], "big")
+        table = json.loads(decompress_data(view[HEADER_SIZE:HEADER_SIZE + table_size]))
+        self._blocks_view = view[HEADER_SIZE + table_size:]
+        self.blocks = [tuple(block) for block in table["blocks"]]
+        self.members = [Member(*member) for member in table["members"]]
+        self._by_name = {member.name: member for member in self.members}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._by_name
+
+    @property
+    def size(self) -> int:
+        """Total size of the members."""
+        return sum(member.size for member in self.members)
+
+    def _frame(self, index: int) -> memoryview:
+        offset, size, _ = self.blocks[index]
+        return self._blocks_view[offset:offset + size]
+
+    def read(self, name: str) -> bytes:
+        """One member's data. Only its block is decompressed, and only up to the member's end."""
+        member = self._by_name.get(name)
+        if member is None:
+            raise KeyError(f"No such member: {name}")
+
+        reader = decompress_reader(self._frame(member.block))
+        reader.seek(member.offset)
+        data = reader.read(member.size)
+        while len(data) < member.size:
+            more = reader.read(member.size - len(data))
+            if not more:
+                raise ValueError(f"Invalid archive: {name} is truncated")
+            data += more
+        return _checked(member, data)
+
+    def __iter__(self):
+        """Yield (member, data) for every member, decompressing each block once."""
+        by_block = {}
+        for member in self.members:
+            by_block.setdefault(member.block, []).append(member)
+        for index in sorted(by_block):
+            block = memoryview(decompress_data(self._frame(index)))
+            for member in by_block[index]:
+                yield member, _checked(member, block[member.offset:member.offset + member.size])
+
+
+def _checked(member: Member, data):
+    """data, if it is what the table says the member holds."""
+    if len(data) != member.size or hashlib.sha256(data).hexdigest() != member.sha256:
+        raise ValueError(f"Invalid archive: {member.name} is damaged")
+    return data
+
+
+def member_path(root: Path, name: str) -> Path:
+    """Where a member goes when extracted under root. Refuses names that would escape it."""
+    parts = PurePosixPath(name).parts
+    if not parts or PurePosixPath(name).is_absolute() or ".." in parts or "\\" in name:
+        raise ValueError(f"Unsafe member name: {name!r}")
+    return root.joinpath(*parts)
@@ -0,0 +1,135 @@
+"""
+Level string gzip benchmark
+
+Compares the outer gzip of method 6 levels, single-threaded gzip.compress
+(what encoding used before) against deflate.gzip_parallel with different
+thread counts, block sizes and levels. The input is a generated level string
+laid out like method 6 writes it (random groups, 10 per object), every output
+is checked with zlib.decompress(..., 15 + 32) the way gd_api reads levels.
+
+Usage:
+  python benchmarks/bench_gzip.py [--sizes 4M,16M,64M] [--threads 1,2,4,8] [--block-sizes 256K,1M,4M]
+                                  [--levels 6,9] [--compact] [--output results.json]
+
+Sizes are level string sizes, about 4.4x the payload (3.6x with --compact).
+Threads beyond the machine's CPU count can't make it faster.
+"""
+import argparse
+import gzip
+import json
+import os
+import platform
+import random
+import sys
+import time
+import zlib
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+
+from bench_methods import git_commit, parse_size  # noqa: E402
+from deflate import gzip_parallel  # noqa: E402
+
+SEED = 9999
+
+
+def generate_level(size: int, compact: bool) -> bytes:
+    """A raw level string of about size bytes in method 6's layout."""
+    rng = random.Random(SEED)
+    header = "kS38,,kS38,1_125_2_125_3_125_5_0_6_1_7_1.0|1_75_2_75_3_75_5_0_6_2_7_1.0;"
+    parts = [header]
+    length = len(header)
+    index = 0
+    while length < size:
+        groups = ".".join(map(str, rng.choices(range(1, 10000), k=10)))
+        obj = f"1,211,57,{groups};" if compact else f"1,211,2,{index * 30},3,0,57,{groups};"
+        parts.append(obj)
+        length += len(obj)
+        index += 1
+    return "".join(parts).encode()
+
+
+def baseline(level: bytes, compact: bool, compresslevel: int) -> bytes:
+    """The single-threaded path method 6 used before gzip_parallel."""
+    if compact:
+        compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, 16 + zlib.MAX_WBITS, 9, zlib.Z_FILTERED)
+        return compressor.compress(level) + compressor.flush()
+    return gzip.compress(level, compresslevel)
+
+
+def timed(func, repeat: int) -> tuple[bytes, float]:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return out, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the level string gzip")
+    parser.add_argument("--sizes", default="4M,16M,64M", help="Level string sizes")
+    parser.add_argument("--threads", default=f"1,2,4,{os.cpu_count() or 1}", help="Thread counts for gzip_parallel")
+    parser.add_argument("--block-sizes", default="256K,1M,4M", help="Block sizes for gzip_parallel")
+    parser.add_argument("--levels", default="6,9", help="Compression levels")
+    parser.add_argument("--compact", action="store_true", help="Compact level layout and its Z_FILTERED gzip")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement, the best one counts")
+    parser.add_argument("--output", help="Write results JSON here")
+    args = parser.parse_args()
+
+    threads = sorted({int(t) for t in args.threads.split(",")})
+    block_sizes = [parse_size(b) for b in args.block_sizes.split(",")]
+    levels = [int(level) for level in args.levels.split(",")]
+    strategy, mem_level = (zlib.Z_FILTERED, 9) if args.compact else (zlib.Z_DEFAULT_STRATEGY, 8)
+    print(f"{os.cpu_count()} CPUs")
+
+    results = []
+    failed = 0
+    for size in map(parse_size, args.sizes.split(",")):
+        level = generate_level(size, args.compact)
+        for compresslevel in levels:
+            out, seconds = timed(lambda: baseline(level, args.compact, compresslevel), args.repeat)
+            base = {"size": len(level), "level": compresslevel, "seconds": seconds, "bytes": len(out)}
+            results.append({**base, "mode": "gzip.compress"})
+            print(f"  {len(level):>12,} B  level {compresslevel}  gzip.compress        "
+                  f"{len(level) / seconds / 1e6:8.1f} MB/s  {len(out):>12,} B")
+
+            for block_size in block_sizes:
+                for count in threads:
+                    out, seconds = timed(
+                        lambda: gzip_parallel(level, compresslevel, block_size, count, strategy, mem_level),
+                        args.repeat,
+                    )
+                    ok = zlib.decompress(out, 15 + 32) == level
+                    failed += not ok
+                    results.append({
+                        "size": len(level), "level": compresslevel, "mode": "parallel", "threads": count,
+                        "block_size": block_size, "seconds": seconds, "bytes": len(out), "roundtrip": ok,
+                        "speedup": base["seconds"] / seconds, "size_change": len(out) / base["bytes"] - 1,
+                    })
+                    print(f"  {len(level):>12,} B  level {compresslevel}  {count:>2} threads {block_size >> 10:>5}K"
+                          f"  {len(level) / seconds / 1e6:8.1f} MB/s  {len(out):>12,} B"
+                          f"  x{base['seconds'] / seconds:5.2f}  {len(out) / base['bytes'] - 1:+.3%}"
+                          f"  {'ok' if ok else 'MISMATCH'}")
+
+    if args.output:
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "args": vars(args),
+            },
+            "results": results,
+        }
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"\nResults written to {args.output}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
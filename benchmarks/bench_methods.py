@@ -0,0 +1,291 @@
+"""
+Encoding method benchmark
+
+Runs every method in methods.METHODS over a generated corpus (random, text,
+already-compressed and sparse payloads, 1 KB - 95 MB) and reports encode and
+decode throughput, peak traced memory, object count, level string sizes and
+whether the payload round-trips. Results are written as JSON so runs from
+different commits can be compared.
+
+Usage:
+  python benchmarks/bench_methods.py [--methods 6] [--sizes 1K,1M] [--payloads random,text]
+                                     [--compact] [--output results.json] [--compare old.json]
+
+--compact encodes method 6 in compact mode; compare against a run without it
+to see how much smaller the uploaded levels get.
+
+The legacy methods (1-5) are limited to --legacy-max-size, they are far too
+slow for the large sizes. Pass --legacy-max-size 0 to run them anyway.
+"""
+import argparse
+import base64
+import contextlib
+import functools
+import gzip
+import io
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+
+from methods import METHODS  # noqa: E402
+
+PAYLOAD_TYPES = ["random", "text", "compressed", "sparse"]
+DEFAULT_SIZES = "1K,10K,100K,1M,10M,95M"  # A method 6 level holds at most ~95.3 MB (MAX_LENGTH)
+SEED = 9999
+
+WORDS = (
+    "the of and to in is you that it he was for on are as with his they at be this have from or one had by "
+    "word but not what all were we when your can said there use an each which she do how their if will up other "
+    "about out many then them these so some her would make like him into time has look two more write go see "
+    "number no way could people my than first water been call who oil its now find long down day did get come "
+    "made may part level group object block geometry dash storage encode decode"
+).split()
+
+
+def parse_size(text: str) -> int:
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    text = text.strip().upper()
+    if text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def format_size(size: int) -> str:
+    for unit, factor in (("G", 1024 ** 3), ("M", 1024 ** 2), ("K", 1024)):
+        if size >= factor and size % factor == 0:
+            return f"{size // factor}{unit}"
+    return str(size)
+
+
+def generate_text(rng: random.Random, size: int) -> bytes:
+    out = io.BytesIO()
+    while out.tell() < size:
+        line = " ".join(rng.choices(WORDS, k=rng.randint(4, 16)))
+        out.write(line.encode() + b"\n")
+    return out.getvalue()[:size]
+
+
+def generate_payload(kind: str, size: int) -> bytes:
+    """Deterministic payload of the given kind and size."""
+    rng = random.Random(f"{SEED}-{kind}-{size}")
+    if kind == "random":
+        return rng.randbytes(size)
+    if kind == "text":
+        return generate_text(rng, size)
+    if kind == "compressed":
+        # Independently gzipped blocks of text, like a folder of .gz logs
+        out = io.BytesIO()
+        while out.tell() < size:
+            out.write(gzip.compress(generate_text(rng, 256 * 1024), mtime=0))
+        return out.getvalue()[:size]
+    if kind == "sparse":
+        data = bytearray(size)
+        for _ in range(max(1, size // 100)):
+            data[rng.randrange(size)] = rng.randrange(1, 256)
+        return bytes(data)
+    raise ValueError(f"Unknown payload type: {kind}")
+
+
+def corpus_file(corpus_dir: Path, kind: str, size: int) -> Path:
+    path = corpus_dir / f"{kind}_{format_size(size)}.bin"
+    if not path.exists():
+        path.write_bytes(generate_payload(kind, size))
+    return path
+
+
+def level_sizes(level_string: str) -> tuple[int, int]:
+    """(raw level string bytes, uploaded gzip+base64 level string bytes)"""
+    if level_string.startswith("H4sI"):
+        raw = zlib.decompress(base64.urlsafe_b64decode(level_string + "=="), 15 + 32)
+        return len(raw), len(level_string)
+    raw = level_string.encode()
+    return len(raw), len(base64.urlsafe_b64encode(gzip.compress(raw)).rstrip(b"="))
+
+
+def decoded_bytes(result) -> bytes:
+    # Method 6 returns (filename, data), the legacy methods return data
+    return result[1] if isinstance(result, tuple) else result
+
+
+def peak_memory(func, *args) -> int:
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_one(method: int, path: Path, kind: str, size: int, measure_memory: bool, compact: bool = False) -> dict:
+    encode_func, decode_func, _ = METHODS[method]
+    if compact and method == 6:
+        encode_func = functools.partial(encode_func, compact=True)
+    result = {"method": method, "payload": kind, "size": size}
+
+    with contextlib.redirect_stdout(io.StringIO()):  # Legacy methods print progress
+        start = time.perf_counter()
+        encoded = encode_func(path)
+        encode_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        decoded = decoded_bytes(decode_func(encoded.level_string))
+        decode_time = time.perf_counter() - start
+
+        if measure_memory:
+            result["encode_peak_bytes"] = peak_memory(encode_func, path)
+            result["decode_peak_bytes"] = peak_memory(decode_func, encoded.level_string)
+
+    raw_level, gzip_level = level_sizes(encoded.level_string)
+    result.update({
+        "encode_s": encode_time,
+        "decode_s": decode_time,
+        "encode_mb_s": size / encode_time / 1e6,
+        "decode_mb_s": size / decode_time / 1e6,
+        "object_count": encoded.object_count,
+        "groups_per_object": encoded.groups_per_object,
+        "compressed_size": encoded.compressed_size,
+        "level_raw_bytes": raw_level,
+        "level_gzip_bytes": gzip_level,
+        "overhead": gzip_level / size,
+        "roundtrip": decoded == path.read_bytes(),
+    })
+    return result
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_result(r: dict):
+    if r.get("skipped"):
+        print(f"  {r['method']:>2} {r['payload']:<10} {format_size(r['size']):>5}  skipped ({r['skipped']})")
+        return
+    if r.get("error"):
+        print(f"  {r['method']:>2} {r['payload']:<10} {format_size(r['size']):>5}  FAILED ({r['error']})")
+        return
+    memory = ""
+    if "encode_peak_bytes" in r:
+        memory = f" peak {r['encode_peak_bytes'] / 1e6:8.1f}/{r['decode_peak_bytes'] / 1e6:.1f} MB"
+    print(
+        f"  {r['method']:>2} {r['payload']:<10} {format_size(r['size']):>5}"
+        f"  enc {r['encode_mb_s']:8.2f} MB/s  dec {r['decode_mb_s']:8.2f} MB/s{memory}"
+        f"  objs {r['object_count']:>9,}  level {r['level_raw_bytes']:>12,} / {r['level_gzip_bytes']:>12,} B"
+        f"  {'ok' if r['roundtrip'] else 'MISMATCH'}"
+    )
+
+
+def compare(results: list[dict], baseline_path: Path, threshold: float) -> int:
+    """Print changes against an earlier results file. Returns the number of regressions."""
+    baseline = json.loads(baseline_path.read_text())
+    old = {
+        (r["method"], r["payload"], r["size"]): r
+        for r in baseline["results"] if not r.get("skipped") and not r.get("error")
+    }
+    regressions = 0
+
+    print()
+    print(f"Compared to {baseline_path} ({(baseline['meta'].get('commit') or 'unknown')[:12]}):")
+    for r in results:
+        before = old.get((r["method"], r["payload"], r["size"]))
+        if r.get("skipped") or before is None:
+            continue
+        if r.get("error"):
+            print(f"  {r['method']:>2} {r['payload']:<10} {format_size(r['size']):>5}  FAILED")
+            regressions += 1
+            continue
+        changes = []
+        for key, higher_is_better in (("encode_mb_s", True), ("decode_mb_s", True), ("level_gzip_bytes", False)):
+            if not before.get(key):
+                continue
+            change = r[key] / before[key] - 1
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > threshold:
+                flag = " REGRESSION"
+                regressions += 1
+            changes.append(f"{key} {change:+.1%}{flag}")
+        if before.get("roundtrip") and not r["roundtrip"]:
+            changes.append("roundtrip BROKEN")
+            regressions += 1
+        print(f"  {r['method']:>2} {r['payload']:<10} {format_size(r['size']):>5}  " + ", ".join(changes))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark all encoding methods")
+    parser.add_argument("--methods", default=",".join(str(m) for m in METHODS), help="Comma separated method numbers")
+    parser.add_argument("--payloads", default=",".join(PAYLOAD_TYPES), help="Comma separated payload types")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Comma separated sizes (e.g. 1K,10M)")
+    parser.add_argument("--legacy-max-size", default="1M", help="Largest size to run methods 1-5 on (0 = no limit)")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc peak memory runs")
+    parser.add_argument("--compact", action="store_true", help="Encode method 6 in compact mode")
+    parser.add_argument("--corpus-dir", help="Where to keep generated payloads (default: temp dir)")
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--compare", help="Results JSON from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    methods = [int(m) for m in args.methods.split(",")]
+    payloads = args.payloads.split(",")
+    sizes = [parse_size(s) for s in args.sizes.split(",")]
+    legacy_max = parse_size(args.legacy_max_size)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_dir = Path(args.corpus_dir) if args.corpus_dir else Path(tmp)
+        corpus_dir.mkdir(parents=True, exist_ok=True)
+
+        results = []
+        for size in sizes:
+            for kind in payloads:
+                path = corpus_file(corpus_dir, kind, size)
+                for method in methods:
+                    if method != 6 and legacy_max and size > legacy_max:
+                        result = {"method": method, "payload": kind, "size": size, "skipped": "legacy size limit"}
+                    else:
+                        try:
+                            result = bench_one(method, path, kind, size, not args.no_memory, args.compact)
+                        except Exception as e:
+                            # One failing cell shouldn't throw away the rest of the matrix
+                            result = {
+                                "method": method, "payload": kind, "size": size, "error": f"{type(e).__name__}: {e}",
+                            }
+                    print_result(result)
+                    results.append(result)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"\nResults written to {args.output}")
+
+    failed = sum(1 for r in results if r.get("error") or (not r.get("skipped") and not r["roundtrip"]))
+    if args.compare:
+        failed += compare(results, Path(args.compare), args.threshold)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
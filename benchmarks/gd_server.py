@@ -0,0 +1,306 @@
+"""
+Local GD server stand-in
+
+Serves the endpoints gd-storage talks to (downloadGJLevel22, uploadGJLevel21,
+getGJUsers20 and the getGJLevels21 ID lookup) from memory, so fetch and
+upload can be measured and tested without touching RobTop's servers. Point
+the CLI at it with GD_STORAGE_SERVER:
+
+  python benchmarks/gd_server.py --port 8099 --latency 80 --bandwidth 2M
+  GD_STORAGE_SERVER=http://127.0.0.1:8099/database gd-storage --fetch 1
+
+Network conditions:
+  --latency MS         Delay before every response (plus up to --jitter MS)
+  --bandwidth RATE     Response bytes per second, per connection (e.g. 500K, 2M)
+  --error-rate P       Fraction of requests that fail, with a kind picked from --errors:
+                         gd     body "-1", what GD sends for most failures
+                         http   HTTP 500
+                         reset  connection closed without a response
+  --rate-limit N       Requests per second per client address; over that the
+                       request gets HTTP 429 with "error code: 1015" like Cloudflare's
+
+Accounts are made up on the fly: looking up or uploading as a new username
+creates it. Passwords aren't checked, but an upload with the wrong account
+ID for a username is refused with -1.
+"""
+import argparse
+import hashlib
+import random
+import signal
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ERROR_KINDS = ["gd", "http", "reset"]
+
+
+def parse_rate(text: str) -> int:
+    """'500K' / '2M' / '1000' -> bytes."""
+    text = text.strip().upper().removesuffix("B")
+    for unit, factor in (("G", 1 << 30), ("M", 1 << 20), ("K", 1 << 10)):
+        if text.endswith(unit):
+            return int(float(text[:-1]) * factor)
+    return int(text)
+
+
+class Conditions:
+    """Latency, bandwidth, fault injection and rate limiting applied to every request."""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, bandwidth=0, error_rate=0.0, errors=None,
+                 rate_limit=0.0, seed=None):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.errors = errors or ERROR_KINDS
+        self.rate_limit = rate_limit
+        self._rng = random.Random(seed)
+        self._buckets = {}  # Client address -> (tokens, last refill)
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        with self._lock:
+            return self.latency + self._rng.random() * self.jitter
+
+    def pick_error(self) -> str | None:
+        with self._lock:
+            if self.error_rate and self._rng.random() < self.error_rate:
+                return self._rng.choice(self.errors)
+        return None
+
+    def allow(self, client: str) -> bool:
+        """Token bucket per client, bursts of up to one second's worth of requests."""
+        if not self.rate_limit:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(client, (self.rate_limit, now))
+            tokens = min(self.rate_limit, tokens + (now - last) * self.rate_limit)
+            allowed = tokens >= 1
+            self._buckets[client] = (tokens - 1 if allowed else tokens, now)
+            return allowed
+
+
+class Store:
+    """Levels and accounts, in memory."""
+
+    def __init__(self):
+        self.levels = {}
+        self.accounts = {}  # Lowercase username -> (username, account ID)
+        self.stats = {}     # Endpoint -> {"requests": n, "errors": n}
+        self._next_level_id = 1
+        self._lock = threading.Lock()
+
+    def account(self, username: str) -> tuple[str, int]:
+        with self._lock:
+            key = username.lower()
+            if key not in self.accounts:
+                self.accounts[key] = (username, 1000 + len(self.accounts))
+            return self.accounts[key]
+
+    def add_level(self, name: str, level_string: str, description: str = "", objects: int = 0,
+                  author: str = "Player", level_id: int | None = None) -> int:
+        """Store a level. level_string as uploaded (base64 + gzip), description base64 encoded."""
+        with self._lock:
+            if level_id is None:
+                level_id = self._next_level_id
+            self._next_level_id = max(self._next_level_id, level_id + 1)
+            old = self.levels.get(level_id)
+            self.levels[level_id] = {
+                "name": name,
+                "description": description,
+                "level_string": level_string,
+                "version": old["version"] + 1 if old else 1,
+                "objects": objects,
+                "author": author,
+                "downloads": 0,
+            }
+            return level_id
+
+    def count(self, endpoint: str, error: bool = False):
+        with self._lock:
+            entry = self.stats.setdefault(endpoint, {"requests": 0, "errors": 0})
+            entry["requests"] += 1
+            entry["errors"] += error
+
+
+def level_info(level_id: int, level: dict) -> str:
+    return ":".join(map(str, [
+        1, level_id, 2, level["name"], 3, level["description"], 5, level["version"],
+        10, level["downloads"], 45, level["objects"],
+    ]))
+
+
+def handle_download(store: Store, form: dict) -> str:
+    level_id = int(form.get("levelID", 0))
+    level = store.levels.get(level_id)
+    if level is None:
+        return "-1"
+    level["downloads"] += 1
+    fields = [
+        1, level_id, 2, level["name"], 3, level["description"], 4, level["level_string"],
+        5, level["version"], 10, level["downloads"], 45, level["objects"],
+    ]
+    digest = hashlib.sha1(level["level_string"][:40].encode()).hexdigest()
+    return ":".join(map(str, fields)) + f"#{digest}#{digest}"
+
+
+def handle_search(store: Store, form: dict) -> str:
+    # Only the numeric ID lookup gd-storage uses
+    query = form.get("str", "")
+    if not query.isdigit() or int(query) not in store.levels:
+        return "-1"
+    level_id = int(query)
+    level = store.levels[level_id]
+    username, account_id = store.account(level["author"])
+    return f"{level_info(level_id, level)}#{account_id}:{username}:{account_id}##1:0:10#0"
+
+
+def handle_upload(store: Store, form: dict) -> str:
+    username = form.get("userName", "")
+    if not username or not form.get("gjp2") or not form.get("levelString"):
+        return "-1"
+    if store.account(username)[1] != int(form.get("accountID", 0)):
+        return "-1"
+    return str(store.add_level(
+        form.get("levelName", "Unnamed"), form["levelString"], form.get("levelDesc", ""),
+        int(form.get("objects", 0)), username,
+    ))
+
+
+def handle_users(store: Store, form: dict) -> str:
+    query = form.get("str", "")
+    if not query:
+        return "-1"
+    username, account_id = store.account(query)
+    return f"1:{username}:2:{account_id}:16:{account_id}#1:0:10"
+
+
+ENDPOINTS = {
+    "downloadGJLevel22.php": handle_download,
+    "getGJLevels21.php": handle_search,
+    "uploadGJLevel21.php": handle_upload,
+    "getGJUsers20.php": handle_users,
+}
+
+
+def make_handler(store: Store, conditions: Conditions):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            endpoint = self.path.rsplit("/", 1)[-1]
+            handler = ENDPOINTS.get(endpoint)
+
+            time.sleep(conditions.delay())
+            if not conditions.allow(self.client_address[0]):
+                store.count(endpoint, error=True)
+                return self.reply(b"error code: 1015", 429)
+            if handler is None:
+                store.count(endpoint, error=True)
+                return self.reply(b"-1", 404)
+
+            error = conditions.pick_error()
+            store.count(endpoint, error=error is not None)
+            if error == "reset":
+                self.close_connection = True
+                return
+            if error == "http":
+                return self.reply(b"Internal Server Error", 500)
+            if error == "gd":
+                return self.reply(b"-1")
+
+            form = {k: v[0] for k, v in urllib.parse.parse_qs(body.decode(), keep_blank_values=True).items()}
+            self.reply(handler(store, form).encode())
+
+        def reply(self, data: bytes, status: int = 200):
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            if not conditions.bandwidth:
+                self.wfile.write(data)
+                return
+            # Throttle in 1/20 s slices
+            step = max(1, conditions.bandwidth // 20)
+            start = time.monotonic()
+            for offset in range(0, len(data), step):
+                self.wfile.write(data[offset:offset + step])
+                ahead = (offset + step) / conditions.bandwidth - (time.monotonic() - start)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)  # Clients dropping keep-alive connections is normal
+
+
+def start_server(port: int = 0, conditions: Conditions | None = None, store: Store | None = None):
+    """Serve on 127.0.0.1 from a background thread. Returns (server, store, base URL)."""
+    store = store or Store()
+    server = Server(("127.0.0.1", port), make_handler(store, conditions or Conditions()))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, store, f"http://127.0.0.1:{server.server_address[1]}/database"
+
+
+def add_condition_args(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=0, help="Delay per response, ms")
+    parser.add_argument("--jitter", type=float, default=0, help="Extra random delay up to this, ms")
+    parser.add_argument("--bandwidth", type=parse_rate, default=0, help="Response bytes/s per connection (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0, help="Fraction of requests that fail")
+    parser.add_argument("--errors", default=",".join(ERROR_KINDS), help="Failure kinds to pick from")
+    parser.add_argument("--rate-limit", type=float, default=0, help="Requests/s per client (0 = unlimited)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for jitter and failures")
+
+
+def conditions_from_args(args) -> Conditions:
+    errors = [kind.strip() for kind in args.errors.split(",") if kind.strip()]
+    unknown = set(errors) - set(ERROR_KINDS)
+    if unknown:
+        raise SystemExit(f"Unknown error kinds: {', '.join(sorted(unknown))} (choose from {', '.join(ERROR_KINDS)})")
+    return Conditions(args.latency, args.jitter, args.bandwidth, args.error_rate, errors, args.rate_limit, args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the GD level server")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--level", action="append", default=[], metavar="ID=FILE",
+                        help="Serve a level: FILE holds an uploaded level string (base64 + gzip)")
+    add_condition_args(parser)
+    args = parser.parse_args()
+
+    server, store, url = start_server(args.port, conditions_from_args(args))
+    for spec in args.level:
+        level_id, _, path = spec.partition("=")
+        with open(path) as f:
+            store.add_level(f"level{level_id}", f.read().strip(), level_id=int(level_id))
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())  # May be ignored when started in the background
+
+    print(f"Serving on {url}")
+    print(f"  GD_STORAGE_SERVER={url}")
+    try:
+        while not stop.wait(1):
+            pass
+    finally:
+        server.shutdown()
+        for endpoint, entry in sorted(store.stats.items()):
+            print(f"  {endpoint:<24} {entry['requests']:>7,} requests {entry['errors']:>6,} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Network load test
+
+Drives fetches, info lookups and uploads against a GD server stand-in
+(benchmarks/gd_server.py) from many workers at once and reports requests/s
+and latency percentiles. Without --server a stand-in is started in this
+process, with the network conditions given here (see gd_server.py).
+
+Usage:
+  python benchmarks/load_test.py [--op fetch,info,upload] [--client library|cli]
+                                 [--concurrency 8] [--requests 200] [--size 100K]
+                                 [--latency 50 --bandwidth 2M --error-rate 0.05 ...]
+                                 [--server URL] [--output results.json]
+
+--op takes a comma separated list, requests cycle through it. The library
+client calls gd_api in threads (fetches stream and decode like --fetch does),
+the cli client runs `gd-storage --fetch/--info` as separate processes, each
+with its own empty HOME. Uploads are library only.
+
+Exits with 1 if any request failed or a fetched file didn't match.
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+
+import gd_server  # noqa: E402
+
+OPS = ["fetch", "info", "upload"]
+USERNAME = "loadtest"
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, round(pct / 100 * len(values) + 0.5) - 1))
+    return values[index]
+
+
+class Target:
+    """The level every request works on, uploaded once before the run."""
+
+    def __init__(self, size: int, workdir: Path):
+        from gd_api import gjp2_encode, lookup_account_id
+        from methods import DEFAULT_METHOD, METHODS
+
+        self.path = workdir / "payload.bin"
+        self.data = random.Random(f"load-{size}").randbytes(size)
+        self.path.write_bytes(self.data)
+        self.sha256 = hashlib.sha256(self.data).hexdigest()
+        self.encoded = METHODS[DEFAULT_METHOD][0](self.path)
+        self.method = METHODS.module(DEFAULT_METHOD)
+
+        # Setup goes through the same faulty network, so keep trying
+        self.gjp2 = gjp2_encode(USERNAME)
+        self.account_id = retry(lambda: lookup_account_id(USERNAME))
+        self.level_id = retry(self.upload)
+
+    def upload(self) -> int:
+        from gd_api import upload_level
+        return upload_level(USERNAME, self.gjp2, self.account_id, "loadtest", self.encoded, "load test")
+
+
+def retry(func, attempts: int = 20):
+    for attempt in range(attempts):
+        try:
+            return func()
+        except Exception:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.2)
+
+
+def library_request(op: str, target: Target) -> int:
+    """Run one request in this process. Returns payload bytes moved."""
+    import gd_api
+
+    if op == "info":
+        gd_api.get_level_info(target.level_id)
+        return 0
+    if op == "upload":
+        target.upload()
+        return len(target.encoded.level_string)
+
+    with gd_api.LevelStream(target.level_id, cache=False) as stream:
+        if not stream.fields:
+            raise ValueError("Level not found")
+        if hasattr(target.method, "decode_stream"):
+            pieces = target.method.decode_stream(stream)
+            next(pieces)  # Filename
+            digest = hashlib.sha256()
+            for piece in pieces:
+                digest.update(piece)
+        else:
+            digest = hashlib.sha256(target.method.decode("".join(stream))[1])
+    if digest.hexdigest() != target.sha256:
+        raise ValueError("Fetched data doesn't match")
+    return len(target.data)
+
+
+def cli_request(op: str, target: Target, server_url: str) -> int:
+    """Run one request as a gd-storage process."""
+    with tempfile.TemporaryDirectory() as home:
+        env = {**os.environ, "HOME": home, "GD_STORAGE_SERVER": server_url}
+        flag = "--fetch" if op == "fetch" else "--info"
+        result = subprocess.run(
+            [sys.executable, str(REPO_DIR / "cli.py"), flag, str(target.level_id), "--no-daemon"],
+            cwd=REPO_DIR, env=env, capture_output=True, text=True, stdin=subprocess.DEVNULL,
+        )
+        if result.returncode != 0:
+            lines = result.stdout.strip().splitlines()
+            raise ValueError(lines[-1] if lines else f"exit code {result.returncode}")
+        if op != "fetch":
+            return 0
+        saved = Path(home, "Downloads", target.path.name)
+        if not saved.exists() or hashlib.sha256(saved.read_bytes()).hexdigest() != target.sha256:
+            raise ValueError("Fetched data doesn't match")
+        return len(target.data)
+
+
+def run(ops: list[str], client: str, target: Target, server_url: str, requests: int, concurrency: int) -> dict:
+    latencies = {op: [] for op in ops}
+    errors = {}
+    moved = 0
+    lock = threading.Lock()
+
+    def one(index: int):
+        nonlocal moved
+        op = ops[index % len(ops)]
+        start = time.perf_counter()
+        try:
+            if client == "cli":
+                nbytes = cli_request(op, target, server_url)
+            else:
+                nbytes = library_request(op, target)
+        except Exception as e:
+            with lock:
+                key = f"{op}: {type(e).__name__}: {e}"[:100]
+                errors[key] = errors.get(key, 0) + 1
+            return
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies[op].append(elapsed)
+            moved += nbytes
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    def summary(values: list[float]) -> dict:
+        values = sorted(values)
+        return {
+            "ok": len(values),
+            "p50_ms": percentile(values, 50) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+            "max_ms": (values[-1] if values else 0) * 1000,
+        }
+
+    everything = [t for values in latencies.values() for t in values]
+    return {
+        "elapsed_s": elapsed,
+        "requests": requests,
+        "failed": sum(errors.values()),
+        "requests_per_s": requests / elapsed,
+        "mb_per_s": moved / elapsed / 1e6,
+        **summary(everything),
+        "ops": {op: summary(values) for op, values in latencies.items()},
+        "errors": errors,
+    }
+
+
+def print_report(result: dict, server_stats: dict | None):
+    print(f"  {result['requests']:,} requests in {result['elapsed_s']:.2f} s: "
+          f"{result['requests_per_s']:.1f} req/s, {result['mb_per_s']:.2f} MB/s payload")
+    print(f"  latency p50 {result['p50_ms']:.1f} ms  p99 {result['p99_ms']:.1f} ms  max {result['max_ms']:.1f} ms")
+    if len(result["ops"]) > 1:
+        for op, r in result["ops"].items():
+            print(f"    {op:<7} {r['ok']:>6,} ok  p50 {r['p50_ms']:8.1f} ms  p99 {r['p99_ms']:8.1f} ms")
+    print(f"  {result['failed']:,} failed")
+    for message, count in sorted(result["errors"].items(), key=lambda e: -e[1]):
+        print(f"    {count:>6,}  {message}")
+    if server_stats:
+        print("  Server side:")
+        for endpoint, entry in sorted(server_stats.items()):
+            print(f"    {endpoint:<24} {entry['requests']:>7,} requests {entry['errors']:>6,} failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test fetch/upload against a GD server stand-in")
+    parser.add_argument("--op", default="fetch", help=f"Comma separated operations ({', '.join(OPS)})")
+    parser.add_argument("--client", choices=["library", "cli"], default="library")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--size", type=gd_server.parse_rate, default="100K", help="Payload size (e.g. 100K, 4M)")
+    parser.add_argument("--server", help="Use a running stand-in instead of starting one")
+    parser.add_argument("--output", help="Write results JSON here")
+    gd_server.add_condition_args(parser)
+    args = parser.parse_args()
+
+    ops = [op.strip() for op in args.op.split(",") if op.strip()]
+    if not ops or set(ops) - set(OPS):
+        parser.error(f"--op takes {', '.join(OPS)}")
+    if args.client == "cli" and "upload" in ops:
+        parser.error("uploads can only be driven with --client library")
+
+    store = None
+    if args.server:
+        server_url = args.server.rstrip("/")
+    else:
+        _, store, server_url = gd_server.start_server(0, gd_server.conditions_from_args(args))
+        print(f"Stand-in server on {server_url}")
+
+    import gd_api
+    gd_api.GD_URL = server_url
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Uploading a {args.size:,} byte test level...")
+        target = Target(args.size, Path(tmp))
+        print(f"Running {args.requests:,} x {','.join(ops)} ({args.client}, {args.concurrency} at a time)...")
+        if store is not None:
+            store.stats.clear()
+        result = run(ops, args.client, target, server_url, args.requests, args.concurrency)
+
+    server_stats = store.stats if store is not None else None
+    print_report(result, server_stats)
+
+    if args.output:
+        report = {
+            "meta": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "args": vars(args),
+            },
+            "result": result,
+            "server": server_stats,
+        }
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"\nResults written to {args.output}")
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+CLI startup benchmark
+
+Measures cold start of non-encoding commands (`--help` by default) and uses
+`python -X importtime` to show which imports the time goes to.
+
+Usage:
+  python benchmarks/startup.py [--runs N] [--target-ms 50] [--top 15] [-- ARGS...]
+
+Exits with 1 if the median startup (minus bare interpreter startup) is over target.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+
+def time_run(cmd: list[str]) -> float:
+    start = time.perf_counter()
+    subprocess.run(cmd, cwd=REPO_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, stdin=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def median_ms(cmd: list[str], runs: int) -> float:
+    time_run(cmd)  # Warm the bytecode cache
+    return statistics.median(time_run(cmd) for _ in range(runs)) * 1000
+
+
+def import_times(cli_args: list[str]) -> list[tuple[int, int, str]]:
+    """Return (self_us, cumulative_us, module) for every import made by the CLI."""
+    code = f"import sys; sys.argv = ['gd-storage'] + {cli_args!r}; import cli; cli.main()"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_DIR, capture_output=True, text=True, stdin=subprocess.DEVNULL,
+    )
+    # Skip everything the interpreter imports before running our code
+    lines = result.stderr.splitlines()
+    for i, line in enumerate(lines):
+        if line.rstrip().endswith("| site"):
+            lines = lines[i + 1:]
+            break
+
+    entries = []
+    for line in lines:
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            entries.append((int(fields[0]), int(fields[1]), fields[2].rstrip()))
+        except (ValueError, IndexError):
+            continue  # Header line
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark gd-storage CLI startup")
+    parser.add_argument("--runs", type=int, default=20, help="Timed runs per command")
+    parser.add_argument("--target-ms", type=float, default=50.0, help="Startup budget on top of the bare interpreter")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to show")
+    parser.add_argument("cli_args", nargs="*", default=["--help"], help="CLI arguments to benchmark")
+    args = parser.parse_args()
+
+    baseline = median_ms([sys.executable, "-c", "pass"], args.runs)
+    cli_time = median_ms([sys.executable, "cli.py", *args.cli_args], args.runs)
+    overhead = cli_time - baseline
+
+    print(f"Command: gd-storage {' '.join(args.cli_args)}")
+    print(f"  Bare interpreter: {baseline:7.1f} ms")
+    print(f"  CLI total:        {cli_time:7.1f} ms")
+    print(f"  CLI overhead:     {overhead:7.1f} ms (target {args.target_ms:.0f} ms)")
+    print()
+
+    entries = import_times(args.cli_args)
+    total_us = sum(e[0] for e in entries)
+    print(f"Imports after interpreter startup: {len(entries)} modules, {total_us / 1000:.1f} ms")
+    print(f"  {'self ms':>8} {'cumul ms':>9}  module")
+    for self_us, cumulative_us, module in sorted(entries, key=lambda e: e[1], reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:8.2f} {cumulative_us / 1000:9.2f}  {module}")
+
+    return 0 if overhead <= args.target_ms else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,68 +1,17 @@
 import argparse
 import sys
 import os
-import base64
-import gzip
-import getpass
-import re
-import json
-import platform
 from pathlib import Path
 
-from methods import METHODS
+from common import collect_files, make_description, parse_description, save_decoded_file, save_decoded_stream
+from config import CONFIG_FILE, find_saved_credentials, get_default_gd_path, get_manager, load_config, save_config
+from methods import METHODS, DEFAULT_METHOD
 
+# Concurrent uploads in a batch, kept low to go easy on GD's servers
+UPLOAD_THREADS = 4
 
-# Config file location
-CONFIG_DIR = Path.home() / ".config" / "gd-storage"
-CONFIG_FILE = CONFIG_DIR / "config.json"
-
-
-def load_config() -> dict:
-    """Load config from file or return defaults."""
-    if CONFIG_FILE.exists():
-        try:
-            return json.loads(CONFIG_FILE.read_text())
-        except (json.JSONDecodeError, OSError):
-            pass
-    return {}
-
-
-def save_config(config: dict):
-    """Save config to file."""
-    CONFIG_DIR.mkdir(parents=True, exist_ok=True)
-    CONFIG_FILE.write_text(json.dumps(config, indent=2))
-
-
-def get_default_gd_path() -> str | None:
-    """Get default GD save path for current platform."""
-    system = platform.system()
-    if system == "Windows":
-        local_app_data = os.getenv("LOCALAPPDATA")
-        if local_app_data:
-            return os.path.join(local_app_data, "GeometryDash")
-    elif system == "Darwin":  # macOS
-        return os.path.expanduser("~/Library/Application Support/GeometryDash")
-    return None
-
-
-def get_manager(config: dict):
-    """Get GD save manager based on config."""
-    from save_manager import new_manager
-
-    gd_path = config.get("gd_path")
-    gd_format = config.get("format", "auto")
-
-    # Auto-detect path if not configured
-    if not gd_path:
-        gd_path = get_default_gd_path()
-        if not gd_path:
-            raise ValueError("GD path not configured. Run: gd-storage --config")
-
-    # Check path exists
-    if not os.path.exists(gd_path):
-        raise ValueError(f"GD save folder not found: {gd_path}\nRun: gd-storage --config")
-
-    return new_manager(path=gd_path, format=gd_format)
+# --erasure without K+M: 4 data + 2 parity levels
+ERASURE_SPEC = "4+2"
 
 
 def cmd_config():
@@ -116,142 +65,433 @@ def cmd_config():
     return 0
 
 
-def save_decoded_file(filename: str, data: bytes) -> Path | None:
-    """Save decoded file to Downloads, checking for overwrites."""
-    # Sanitize filename - prevent path traversal
-    safe_filename = Path(filename).name
-    if not safe_filename:
-        safe_filename = "decoded_file"
-
-    downloads = Path(os.path.expanduser("~")) / "Downloads" / safe_filename
-
-    if downloads.exists():
-        print(f"File already exists: {downloads}")
-        choice = input("Overwrite? (y/N): ").strip().lower()
-        if choice != 'y':
-            # Try adding a number suffix
-            stem = downloads.stem
-            suffix = downloads.suffix
-            for i in range(1, 100):
-                alt = downloads.parent / f"{stem}_{i}{suffix}"
-                if not alt.exists():
-                    downloads = alt
-                    break
-            else:
-                print("Could not find available filename")
-                return None
-
-    downloads.write_bytes(data)
-    return downloads
-
-
-def make_description(filename: str, file_size: int, max_len: int = 180) -> str:
-    """Build level description, truncating filename if needed to fit limit."""
-    prefix = "github.com/c4k3ss/GD-Storage | "
-    suffix = f" ({file_size:,} bytes)"
-
-    # Calculate max filename length
-    max_name_len = max_len - len(prefix) - len(suffix)
-
-    if len(filename) > max_name_len:
-        # Truncate filename, keep extension visible
-        name_part = filename[:max_name_len - 3] + "..."
-    else:
-        name_part = filename
-
-    return f"{prefix}{name_part}{suffix}"
-
-
 def show_help():
     print("GD Storage - Encode files into Geometry Dash levels")
     print()
     print("Usage:")
-    print("  gd-storage --upload <filepath>    Encode and upload to GD servers")
+    print("  gd-storage --upload <paths>...    Encode and upload files/directories to GD servers")
     print("  gd-storage --fetch <level_id>     Download and decode from GD servers")
-    print("  gd-storage --encode <filepath>    Encode and inject into local GD save")
+    print("  gd-storage --info <level_id>      Show what a level holds without downloading it")
+    print("  gd-storage --plan <paths>...      Estimate object count and level size without encoding")
+    print("  gd-storage --encode <paths>...    Encode files/directories and inject into local GD save")
     print("  gd-storage --decode <levelname>   Decode from local GD save")
+    print("  gd-storage --verify [ID|NAME]...  Check levels still decode to what was stored (default: local save)")
+    print("  gd-storage --list                 List the levels in the backend (see --backend)")
+    print("  gd-storage --copy-to <backend>    Copy every level of the backend to another, e.g. staged levels to gd")
     print("  gd-storage --config               Configure GD save path")
+    print("  gd-storage --serve [--port N]     Run a local daemon the other commands are sent to")
+    print()
+    print("Options:")
+    print("  --profile [text|json]             Print a per-stage timing breakdown")
+    print("  --backend gd|save|dir:<path>      Where --upload stores and --fetch/--info/--list read (default: gd)")
+    print("  --manifest <file>                 Results file for a batch upload (file -> level ID)")
+    print("  --archive                         With --upload, pack everything into one level")
+    print("  --dedup                           With --upload, only upload the parts that changed since last time")
+    print("  --erasure [K+M]                   With --upload, add parity levels so any K of K+M rebuild the file")
+    print("  --extract [member]                With --fetch/--decode, unpack an archive (or one file of it)")
+    print("  --compact                         With --upload/--encode/--plan, smaller levels (no object positions)")
+    print("  --no-daemon                       Run locally even if a daemon is running")
+
+
+def open_backend(spec: str = "gd", upload: bool = False):
+    """The storage backend for a --backend spec (gd, save or dir:PATH), None if it can't be used.
+
+    Uploading to GD needs credentials, they are asked for here so that
+    happens before any work is done.
+    """
+    import storage
+
+    if spec == "gd":
+        backend = storage.GDBackend()
+        if upload:
+            backend.credentials = get_credentials()
+            if not backend.credentials[0]:
+                return None
+        return backend
+    if spec == "save":
+        try:
+            return storage.SaveBackend(get_manager(load_config()))
+        except ValueError as e:
+            print(f"Error: {e}")
+            return None
+    if spec.startswith("dir:") and spec[4:]:
+        return storage.DirBackend(spec[4:])
+    print(f"Unknown backend '{spec}', use gd, save or dir:PATH")
+    return None
+
+
+def fetch_command(key, backend) -> str:
+    """The command line that fetches a level from a backend."""
+    import shlex
 
+    command = f"gd-storage --fetch {shlex.quote(str(key))}"
+    return command if backend.name == "gd" else f"{command} --backend {shlex.quote(backend.name)}"
 
-def cmd_upload(filepath: Path, encode_func):
-    """Encode and upload a file to GD servers."""
-    import dashlib
 
+def cmd_upload(filepath: Path, encode_func, backend=None):
+    """Encode and upload a file to GD servers (or another backend)."""
     if not filepath.exists():
         print(f"File not found: {filepath}")
         return 1
 
     print(f"Encoding {filepath.name} ({filepath.stat().st_size:,} bytes)...")
-    level_str = encode_func(filepath)
+    try:
+        encoded = encode_func(filepath)
+    except ValueError as e:
+        print(f"Encoding failed: {e}")
+        return 1
 
-    # Decompress to get raw level for object count
-    if level_str.startswith('H4sI'):
-        compressed = base64.urlsafe_b64decode(level_str + '==')
-        raw_level = gzip.decompress(compressed).decode('utf-8')
-    else:
-        raw_level = level_str
-
-    obj_count = raw_level.count(';')
-    level_name = filepath.stem[:20]
-    description = make_description(filepath.name, filepath.stat().st_size)
-    desc_encoded = base64.urlsafe_b64encode(description.encode()).decode()
-
-    class UploadLevel:
-        def __init__(self):
-            self.levelString = level_str
-            self.levelName = level_name
-            self.description = desc_encoded
-            self.password = 1
-            self.copiedId = 0
-            self.version = 1
-            self.officialSong = 0
-            self.customSongID = 0
-            self.coins = 0
-            self.lowDetailMode = False
-            self.objects = obj_count
-            self.isAuto = False
-            self.twoPlayer = False
-            self.starsRequested = 0
-            self.editorTime = 0
-            self.editorTimeCopies = 0
-            self.length = dashlib.LENGTH_TINY
-
-    level = UploadLevel()
-
-    # Get credentials
-    username, account_id, gjp2 = get_credentials()
-    if not username:
+    return upload_and_report(
+        encoded, filepath.stem[:20], make_description(filepath.name, encoded.raw_size), backend=backend,
+    )
+
+
+def upload_and_report(encoded, level_name: str, description: str, fetch_hint: str = "", backend=None):
+    """Upload an EncodedLevel and print the new level ID. Uploads to GD unless a backend is passed in."""
+    from storage import upload_encoded
+
+    backend = backend or open_backend("gd", upload=True)
+    if backend is None:
         return 1
 
     print(f"Uploading '{level_name}'...")
     try:
-        result = dashlib.uploadLevel(
-            level=level,
-            username=username,
-            accountID=account_id,
-            gjp2=gjp2,
-        )
-        if result == "-1" or result.startswith("-"):
-            raise ValueError(f"Server returned: {result}")
-        new_level_id = int(result)
-        print(f"Uploaded! Level ID: {new_level_id}")
-        print(f"Fetch with: gd-storage --fetch {new_level_id}")
+        key = upload_encoded(encoded, level_name, description, backend)
+        if backend.name == "gd":
+            print(f"Uploaded! Level ID: {key}")
+        else:
+            print(f"Stored as '{key}' in {backend.name}")
+        print(f"Fetch with: {fetch_command(key, backend)}{fetch_hint}")
         return 0
     except Exception as e:
         print(f"Upload failed: {e}")
         return 1
 
 
-def cmd_fetch(level_id: int, decode_func):
-    """Download and decode a level from GD servers."""
-    from gd_api import download_level
+def cmd_upload_archive(paths: list[str], compact: bool = False, backend=None):
+    """Pack files and directories into one solid archive and upload it as a single level."""
+    from archive import SUFFIX, collect_members, pack
+
+    try:
+        members = collect_members(paths)
+    except FileNotFoundError as e:
+        print(e)
+        return 1
+    if not members:
+        print("No files to upload")
+        return 1
+
+    total_size = sum(path.stat().st_size for _, path in members)
+    print(f"Packing {len(members)} files ({total_size:,} bytes)...")
+    data = pack(members)
+    print(f"Archive: {len(data):,} bytes")
+
+    # The blocks are compressed already
+    name = Path(paths[0]).resolve().name or "archive"
+    try:
+        encoded = METHODS.module(DEFAULT_METHOD).encode_bytes(data, name + SUFFIX, skip_compression=True, compact=compact)
+    except ValueError as e:
+        print(f"Encoding failed: {e}")
+        return 1
+
+    description = make_description(f"{name}{SUFFIX}, {len(members)} files", total_size)
+    return upload_and_report(encoded, name[:20], description, fetch_hint=" --extract", backend=backend)
+
+
+def cmd_upload_batch(paths: list[str], encode_func, manifest_path: str | None = None, backend=None):
+    """Encode files in a process pool and upload them concurrently as they finish (to GD unless a backend is given)."""
+    import json
+    import queue
+    import threading
+    import time
+    from storage import upload_encoded, upload_encoded_many
+
+    files = collect_files(paths)
+    if files is None:
+        return 1
+    if not files:
+        print("No files to upload")
+        return 1
+
+    # Resolve credentials once, before any work is done
+    backend = backend or open_backend("gd", upload=True)
+    if backend is None:
+        return 1
+
+    total_size = sum(f.stat().st_size for f in files)
+    print(f"Uploading {len(files)} files ({total_size:,} bytes)...")
+
+    entries = {filepath: {"file": filepath.name, "path": str(filepath.resolve())} for filepath in files}
+    # Bounded so encoding stays at most a few levels ahead of the uploads
+    levels = queue.Queue(maxsize=UPLOAD_THREADS * 2)
+    batch = []  # Everything for a single writer backend (the local save), stored at the end in one write
+
+    def uploaded(filepath, level_id):
+        entries[filepath]["level_id"] = level_id
+        print(f"  Uploaded {filepath.name}: {'level ID' if backend.name == 'gd' else 'key'} {level_id}")
+
+    def upload_failed(filepath, e):
+        entries[filepath]["error"] = f"Upload failed: {e}"
+        print(f"  {filepath.name}: upload failed: {e}")
+
+    def uploader():
+        while (item := levels.get()) is not None:
+            filepath, encoded = item
+            try:
+                level_id = upload_encoded(
+                    encoded, entries[filepath]["level_name"], make_description(filepath.name, encoded.raw_size),
+                    backend,
+                )
+            except Exception as e:
+                upload_failed(filepath, e)
+                continue
+            uploaded(filepath, level_id)
+
+    start = time.perf_counter()
+    thread_count = 0 if backend.single_writer else min(UPLOAD_THREADS, len(files))
+    threads = [threading.Thread(target=uploader, daemon=True) for _ in range(thread_count)]
+    for thread in threads:
+        thread.start()
+    try:
+        for filepath, encoded in iter_encoded(files, encode_func, window=(os.cpu_count() or 1) * 2):
+            entry = entries[filepath]
+            if isinstance(encoded, Exception):
+                entry["error"] = f"Encoding failed: {encoded}"
+                print(f"  {filepath.name}: encoding failed: {encoded}")
+                continue
+            entry.update({
+                "level_name": filepath.stem[:20],
+                "size": encoded.raw_size,
+                "sha256": encoded.payload_hash,
+                "object_count": encoded.object_count,
+            })
+            if backend.single_writer:
+                batch.append((filepath, encoded))
+            else:
+                levels.put((filepath, encoded))
+    finally:
+        for _ in threads:
+            levels.put(None)
+        for thread in threads:
+            thread.join()
+
+    if batch:
+        try:
+            level_ids = upload_encoded_many([
+                (encoded, entries[filepath]["level_name"], make_description(filepath.name, encoded.raw_size))
+                for filepath, encoded in batch
+            ], backend)
+        except Exception as e:
+            for filepath, _ in batch:
+                upload_failed(filepath, e)
+        else:
+            for (filepath, _), level_id in zip(batch, level_ids):
+                uploaded(filepath, level_id)
+
+    if manifest_path is None:
+        manifest_path = time.strftime("gd-storage-upload-%Y%m%d-%H%M%S.json")
+    manifest = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "backend": backend.name,
+        "levels": [entries[filepath] for filepath in files],
+    }
+    Path(manifest_path).write_text(json.dumps(manifest, indent=2))
+
+    failed = sum(1 for entry in manifest["levels"] if "error" in entry)
+    print(f"Uploaded {len(files) - failed}/{len(files)} files in {time.perf_counter() - start:.1f}s")
+    print(f"Manifest written to {manifest_path}")
+    return 1 if failed else 0
+
+
+def cmd_info_stored(key: str, backend):
+    """cmd_info() for a level in another backend than GD."""
+    try:
+        level = backend.stat(key)
+    except (OSError, ValueError) as e:
+        print(f"Failed to fetch: {e}")
+        return 1
+
+    print(f"Level: {level.name} (key {level.key} in {backend.name})")
+    print(f"Size: {level.size:,} bytes")
+    if level.description:
+        print(f"Description: {level.description}")
+    stored = parse_description(level.description)
+    if stored:
+        print(f"File: {stored[0]} ({stored[1]:,} bytes)")
+    return 0
+
+
+def cmd_list(backend):
+    """List the levels in a backend."""
+    try:
+        levels = backend.list()
+    except (OSError, ValueError) as e:
+        print(f"Failed to list: {e}")
+        return 1
+
+    for level in levels:
+        stored = parse_description(level.description)
+        what = f"{stored[0]} ({stored[1]:,} bytes)" if stored else level.description[:60]
+        print(f"  {level.key:<24} {level.name:<24} {what}")
+    print(f"{len(levels)} levels in {backend.name}")
+    return 0
+
+
+def cmd_copy(source, target, workers: int = UPLOAD_THREADS):
+    """Copy every level of one backend into another, e.g. a staged directory to GD."""
+    from concurrent.futures import ThreadPoolExecutor
+    import verify
+
+    try:
+        levels = source.list()
+    except (OSError, ValueError) as e:
+        print(f"Failed to list: {e}")
+        return 1
+    print(f"Copying {len(levels)} levels from {source.name} to {target.name}...")
+
+    def copied(level, stored, key):
+        if target.hash_section and stored.expected:
+            verify.record(target.hash_section, {key: stored.expected})
+        print(f"  {level.key} -> {key}")
+        return True
+
+    def copy(level):
+        try:
+            stored = source.get(level.key)
+            key = target.put(stored.level_string, stored.name, stored.description)
+        except Exception as e:
+            print(f"  {level.key}: copy failed: {e}")
+            return False
+        return copied(level, stored, key)
+
+    if target.single_writer:
+        # The local save is one file, written once for all of them
+        batch = []
+        for level in levels:
+            try:
+                batch.append((level, source.get(level.key)))
+            except Exception as e:
+                print(f"  {level.key}: copy failed: {e}")
+        try:
+            keys = target.put_many([(stored.level_string, stored.name, stored.description) for _, stored in batch])
+        except Exception as e:
+            print(f"Copy failed: {e}")
+            return 1
+        copied_count = sum(copied(level, stored, key) for (level, stored), key in zip(batch, keys))
+    else:
+        # Only uploads gain from running side by side
+        with ThreadPoolExecutor(workers if target.name == "gd" else 1) as pool:
+            copied_count = sum(pool.map(copy, levels))
+    print(f"Copied {copied_count}/{len(levels)} levels")
+    return 0 if copied_count == len(levels) else 1
+
+
+def cmd_info(level_id: int):
+    """Show a level's metadata, without downloading the level itself."""
+    from gd_api import get_level_info, load_cached_level
+
+    try:
+        info = get_level_info(level_id)
+    except Exception as e:
+        print(f"Failed to fetch: {e}")
+        return 1
+
+    print(f"Level: {info['name']} (ID {info['id']})")
+    print(f"Version: {info['version']}")
+    print(f"Objects: {info['objects']:,}")
+    print(f"Downloads: {info['downloads']:,}")
+    description = info.get("description", "")
+    if description:
+        print(f"Description: {description}")
+    stored = parse_description(description)
+    if stored:
+        print(f"File: {stored[0]} ({stored[1]:,} bytes)")
+    print(f"Cached: {'yes' if load_cached_level(level_id, info) else 'no'}")
+    return 0
+
+
+def cmd_plan(paths: list[str], compact: bool = False):
+    """Estimate what uploading files would produce, without encoding them."""
+    from plan import plan_file
+
+    files = collect_files(paths)
+    if files is None:
+        return 1
+    if not files:
+        print("No files to plan")
+        return 1
+
+    def estimate(e, unit: str = "") -> str:
+        if round(e.low) == round(e.high):
+            return f"{round(e.value):,}{unit}"
+        return f"~{round(e.value):,}{unit} ({round(e.low):,} - {round(e.high):,})"
+
+    for filepath in files:
+        plan = plan_file(filepath, compact)
+        how = "compressed whole" if plan.exact else f"{plan.sampled:,} bytes sampled"
+        print(f"{plan.name} ({plan.size:,} bytes), {how}, {plan.seconds:.2f}s")
+        print(f"  Payload:      {estimate(plan.payload, ' bytes')} "
+              f"({plan.payload.value / max(plan.size, 1):.1%} of the file)")
+        print(f"  Groups:       {estimate(plan.groups)}")
+        print(f"  Objects:      {estimate(plan.objects)} ({plan.groups.value / plan.objects.value:.2f} groups/object)")
+        print(f"  Level string: {estimate(plan.level_bytes, ' bytes')}")
+        print(f"  Upload:       {estimate(plan.upload_bytes, ' bytes')}")
+        if plan.levels == 1:
+            print("  Fits in one level")
+        else:
+            print(f"  Too large for one level, needs {plan.levels} "
+                  f"(--dedup would upload ~{plan.dedup_chunks:,} chunk levels)")
+    return 0
+
+
+def fetch_stored(key: str, backend, decode_func, extract: str | None = None):
+    """cmd_fetch() for a level in another backend than GD."""
+    import manifest
+
+    print(f"Fetching '{key}' from {backend.name}...")
+    try:
+        level = backend.get(key)
+    except (OSError, ValueError) as e:
+        print(f"Failed to fetch: {e}")
+        return 1
+
+    print(f"Level: {level.name}")
+    if level.description:
+        print(f"Description: {level.description}")
+
+    try:
+        filename, data = manifest.resolve(*decode_func(level.level_string), decode_func)
+        return save_payload(filename, data, extract)
+    except Exception as e:
+        print(f"Failed to decode: {e}")
+        return 1
+
+
+def cmd_fetch(level_id: int, decode_func, extract: str | None = None, decode_stream=None):
+    """Download and decode a level from GD servers.
+
+    With decode_stream (see methods.sniff), the level is decoded and written to disk
+    while it downloads, unless it has to be rebuilt or unpacked first.
+    """
+    from gd_api import fetch_level, get_level_info, load_cached_level
+    import manifest
 
     print(f"Fetching level {level_id}...")
     try:
-        level_data = download_level(level_id)
+        info = get_level_info(level_id)
+    except Exception:
+        info = {}  # Not searchable, download it anyway
+
+    if decode_stream is not None and not (info and load_cached_level(level_id, info)):
+        return fetch_streaming(level_id, decode_func, decode_stream, extract)
+
+    try:
+        level_data = fetch_level(level_id, info)
     except Exception as e:
         print(f"Failed to fetch: {e}")
         return 1
+    if level_data.get("cached"):
+        print("Level unchanged since the last fetch, using the cached copy")
 
     level_name = level_data.get("name", "Unknown")
     description = level_data.get("description", "")
@@ -262,92 +502,439 @@ def cmd_fetch(level_id: int, decode_func):
         print(f"Description: {description}")
 
     try:
-        filename, data = decode_func(level_str)
-        saved_path = save_decoded_file(filename, data)
-        if saved_path:
-            print(f"Saved to {saved_path} ({len(data):,} bytes)")
-            return 0
-        return 1
+        filename, data = manifest.resolve(*decode_func(level_str), decode_func)
+        return save_payload(filename, data, extract)
     except Exception as e:
         print(f"Failed to decode: {e}")
         return 1
 
 
-def cmd_encode(filepath: Path, encode_func):
-    """Encode and inject into local GD save."""
-    if not filepath.exists():
+def cmd_upload_dedup(filepath: Path, compact: bool = False):
+    """Upload a file as content-defined chunks plus a manifest level, skipping chunks uploaded before."""
+    import hashlib
+    from functools import partial
+    import dedup
+    import manifest
+    from methods.buffers import open_input
+    from storage import upload_encoded
+
+    if not filepath.is_file():
         print(f"File not found: {filepath}")
         return 1
+    encode_bytes = partial(METHODS.module(DEFAULT_METHOD).encode_bytes, compact=compact)
 
-    print(f"Encoding {filepath.name} ({filepath.stat().st_size:,} bytes)...")
-    level_str = encode_func(filepath)
+    backend = open_backend("gd", upload=True)
+    if backend is None:
+        return 1
 
-    config = load_config()
+    index = dedup.load_index()
+    with open_input(filepath) as data:
+        print(f"Chunking {filepath.name} ({len(data):,} bytes)...")
+        chunks = []
+        new = {}  # digest -> (start, end) of the chunk, in file order
+        for start, end in dedup.chunk_bounds(data):
+            digest = hashlib.sha256(data[start:end]).hexdigest()
+            chunks.append([digest, end - start])
+            if digest not in index and digest not in new:
+                new[digest] = (start, end)
+        file_hash = hashlib.sha256(data).hexdigest()
+        file_size = len(data)
+
+        new_size = sum(end - start for start, end in new.values())
+        print(f"{len(chunks)} chunks, {len(new)} new ({new_size:,} bytes), {len(chunks) - len(new)} already uploaded")
+
+        # Encode in worker processes while this thread uploads whatever is ready. Chunks are
+        # copied out of the file only when submitted, a few at a time
+        jobs = (
+            (digest, (bytes(data[start:end]), f"{digest[:16]}.chunk")) for digest, (start, end) in new.items()
+        )
+        for digest, encoded in iter_pool(encode_bytes, jobs, window=(os.cpu_count() or 1) * 2):
+            if isinstance(encoded, Exception):
+                print(f"Encoding failed: {encoded}")
+                return 1
+            start, end = new[digest]
+            dedup.cache_put(digest, data[start:end])
+            try:
+                level_id = upload_encoded(
+                    encoded, f"chunk {digest[:12]}", make_description(f"chunk {digest[:16]}", encoded.raw_size),
+                    backend,
+                )
+            except Exception as e:
+                print(f"Upload failed: {e}")
+                return 1
+            # Saved right away, so chunks uploaded before a failure aren't uploaded again
+            index[digest] = level_id
+            dedup.save_index(index)
+            print(f"  Uploaded chunk {digest[:12]}: level ID {level_id}")
+
+    payload = manifest.dumps(
+        "chunks", name=filepath.name, size=file_size, sha256=file_hash,
+        chunks=[[digest, size, index[digest]] for digest, size in chunks],
+    )
+    encoded = encode_bytes(payload, filepath.stem[:60] + manifest.SUFFIX)
+    return upload_and_report(
+        encoded, filepath.stem[:20], make_description(filepath.name, file_size), backend=backend,
+    )
+
+
+def cmd_upload_erasure(filepath: Path, spec: str, compact: bool = False):
+    """Upload a file as K data + M parity shard levels plus a manifest level, any K shards rebuild it."""
+    import hashlib
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
+    import erasure
+    import manifest
+    from methods.buffers import open_input
+    from methods.compression import compress_data
+    from methods.method6_optimized import MAX_LENGTH
+    from storage import upload_encoded
+
+    if not filepath.is_file():
+        print(f"File not found: {filepath}")
+        return 1
     try:
-        manager = get_manager(config)
+        k, m = erasure.parse_spec(spec)
     except ValueError as e:
-        print(f"Error: {e}")
+        print(e)
         return 1
 
-    description = make_description(filepath.name, filepath.stat().st_size)
-    manager.injectLevel(level_str, filepath.stem, description)
-    manager.save(ccll=True, ccgm=False)
-    print(f"Injected as '{filepath.stem}'")
+    with open_input(filepath) as data:
+        print(f"Encoding {filepath.name} ({len(data):,} bytes) as {k}+{m} shards...")
+        file_hash = hashlib.sha256(data).hexdigest()
+        file_size = len(data)
+        payload = compress_data(data)
+    shards = erasure.encode_shards(payload, k, m)
+    shard_size = len(shards[0])
+    if shard_size + 1 + len("00.shard") > MAX_LENGTH:
+        print(f"Shards of {shard_size:,} bytes are too large for one level, use a larger K")
+        return 1
+
+    backend = open_backend("gd", upload=True)
+    if backend is None:
+        return 1
+
+    # The payload is compressed already, shards are stored as they are
+    encode_bytes = partial(METHODS.module(DEFAULT_METHOD).encode_bytes, skip_compression=True, compact=compact)
+    entries = []
+    with ProcessPoolExecutor() as pool:
+        names = [f"{i:02}.shard" for i in range(k + m)]
+        for i, encoded in enumerate(pool.map(encode_bytes, shards, names)):
+            kind = "data" if i < k else "parity"
+            try:
+                level_id = upload_encoded(
+                    encoded, f"shard {i} {filepath.stem[:12]}",
+                    make_description(f"{kind} shard {i} of {filepath.name}", encoded.raw_size), backend,
+                )
+            except Exception as e:
+                print(f"Upload failed: {e}")
+                return 1
+            entries.append([encoded.payload_hash, level_id])
+            print(f"  Uploaded {kind} shard {i}: level ID {level_id}")
+
+    payload = manifest.dumps(
+        "erasure", name=filepath.name, size=file_size, sha256=file_hash, k=k, m=m,
+        payload_size=len(payload), shard_size=shard_size, shards=entries,
+    )
+    encoded = METHODS.module(DEFAULT_METHOD).encode_bytes(payload, filepath.stem[:60] + manifest.SUFFIX)
+    return upload_and_report(
+        encoded, filepath.stem[:20], make_description(filepath.name, file_size), backend=backend,
+    )
+
+
+def save_payload(filename: str, data: bytes, extract: str | None = None) -> int:
+    """Save a decoded file to Downloads. With extract set, unpack it as an archive instead."""
+    from archive import is_archive
+
+    if extract is not None:
+        return extract_archive(data, extract)
+
+    saved_path = save_decoded_file(filename, data)
+    if not saved_path:
+        return 1
+    print(f"Saved to {saved_path} ({len(data):,} bytes)")
+    if is_archive(data):
+        print("This is an archive, add --extract to unpack it")
     return 0
 
 
-def cmd_decode(level_name: str, decode_func):
-    """Decode from local GD save."""
-    print(f"Extracting '{level_name}'...")
+def extract_archive(data: bytes, member: str = "") -> int:
+    """Extract one member (or all of them) to Downloads."""
+    from archive import Archive, is_archive, member_path
 
-    config = load_config()
-    try:
-        manager = get_manager(config)
-    except ValueError as e:
-        print(f"Error: {e}")
+    if not is_archive(data):
+        print("Not an archive, run again without --extract")
         return 1
+    archive = Archive(data)
+
+    if member:
+        if member not in archive:
+            print(f"No member '{member}', the archive contains:")
+            for m in archive.members:
+                print(f"  {m.name} ({m.size:,} bytes)")
+            return 1
+        content = archive.read(member)
+        saved_path = save_decoded_file(Path(member).name, content)
+        if not saved_path:
+            return 1
+        print(f"Saved to {saved_path} ({len(content):,} bytes)")
+        return 0
 
-    ccll = manager.ccll.decode('utf-8', errors='ignore')
+    downloads = Path(os.path.expanduser("~")) / "Downloads"
+    print(f"Archive: {len(archive.members)} files ({archive.size:,} bytes)")
+    extracted = 0
+    for m, content in archive:
+        target = member_path(downloads, m.name)
+        if target.exists():
+            print(f"  Skipped {m.name} (already exists)")
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(content)
+        extracted += 1
+    print(f"Extracted {extracted} files to {downloads}")
+    return 0
 
-    start = ccll.find(f'<s>{level_name}</s>')
-    if start == -1:
-        print(f"Level '{level_name}' not found!")
+
+def fetch_streaming(level_id: int, decode_func, decode_stream, extract: str | None = None) -> int:
+    """Download, decode and save a level as it arrives."""
+    import http.client
+    from archive import SUFFIX as ARCHIVE_SUFFIX
+    from gd_api import LevelStream
+    import manifest
+
+    try:
+        level = LevelStream(level_id)
+    except Exception as e:
+        print(f"Failed to fetch: {e}")
         return 1
 
-    k4_start = ccll.find('<k>k4</k><s>', start) + len('<k>k4</k><s>')
-    k4_end = ccll.find('</s>', k4_start)
-    level_str = ccll[k4_start:k4_end]
+    with level:
+        print(f"Level: {level.fields.get('name', 'Unknown')}")
+        if level.fields.get("description"):
+            print(f"Description: {level.fields['description']}")
+
+        try:
+            pieces = decode_stream(level)
+            filename = next(pieces)
+            if extract is None and not manifest.is_manifest(filename) and not filename.endswith(ARCHIVE_SUFFIX):
+                return save_decoded_stream(filename, pieces)
+
+            # Manifests and archives are handled whole
+            filename, data = manifest.resolve(filename, b"".join(pieces), decode_func)
+            return save_payload(filename, data, extract)
+        except (OSError, http.client.HTTPException) as e:
+            print(f"Failed to fetch: {e}")
+            return 1
+        except Exception as e:
+            print(f"Failed to decode: {e}")
+            return 1
+
+
+def encode_files(files: list[Path], encode_func) -> list:
+    """Encode several files in a worker pool, keeping input order. Returns EncodedLevels."""
+    import profiling
+
+    # Stages inside worker processes can't be profiled, encode in-process instead
+    if len(files) == 1 or profiling.enabled():
+        return [encode_func(f) for f in files]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor() as pool:
+        results = []
+        for filepath, encoded in zip(files, pool.map(encode_func, files)):
+            print(f"  Encoded {filepath.name}")
+            results.append(encoded)
+        return results
+
+
+def iter_encoded(files: list[Path], encode_func, window: int):
+    """Encode files in a worker pool, yielding (filepath, EncodedLevel or exception) as they finish.
+
+    At most `window` files are queued or finished-but-not-consumed at a time, so a
+    slow consumer holds back the encoders instead of piling up level strings.
+    """
+    import profiling
+
+    # Stages inside worker processes can't be profiled, encode in-process instead
+    if len(files) == 1 or profiling.enabled():
+        for filepath in files:
+            try:
+                yield filepath, encode_func(filepath)
+            except Exception as e:
+                yield filepath, e
+        return
+
+    yield from iter_pool(encode_func, ((filepath, (filepath,)) for filepath in files), window)
+
+
+def iter_pool(func, jobs, window: int):
+    """Run func(*args) for (key, args) jobs in a worker pool, yielding (key, result or exception) as they finish.
+
+    jobs is only advanced when a job is submitted, so the arguments of at most
+    `window` jobs (and results not consumed yet) exist at a time.
+    """
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+    jobs = iter(jobs)
+    with ProcessPoolExecutor() as pool:
+        running = {}
+        while True:
+            for key, args in jobs:
+                running[pool.submit(func, *args)] = key
+                if len(running) >= window:
+                    break
+            if not running:
+                return
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = running.pop(future)
+                error = future.exception()
+                yield key, error if error else future.result()
+
+
+def cmd_encode(paths: list[str], encode_func):
+    """Encode files and inject them into local GD save in a single write."""
+    import verify
+
+    files = collect_files(paths)
+    if files is None:
+        return 1
+    if not files:
+        print("No files to encode")
+        return 1
 
+    total_size = sum(f.stat().st_size for f in files)
+    if len(files) == 1:
+        print(f"Encoding {files[0].name} ({total_size:,} bytes)...")
+    else:
+        print(f"Encoding {len(files)} files ({total_size:,} bytes)...")
     try:
-        filename, data = decode_func(level_str)
-        saved_path = save_decoded_file(filename, data)
-        if saved_path:
-            print(f"Saved to {saved_path} ({len(data):,} bytes)")
+        encoded_levels = encode_files(files, encode_func)
+    except ValueError as e:
+        print(f"Encoding failed: {e}")
+        return 1
+
+    backend = open_backend("save")
+    if backend is None:
+        return 1
+
+    # One write of the save for all of them
+    backend.put_many([
+        (encoded, filepath.stem, make_description(filepath.name, encoded.raw_size))
+        for filepath, encoded in zip(files, encoded_levels)
+    ])
+    verify.record("local", {filepath.stem: encoded for filepath, encoded in zip(files, encoded_levels)})
+    for filepath in files:
+        print(f"Injected as '{filepath.stem}'")
+    return 0
+
+
+def iter_local_levels(manager):
+    """(name, level string) of every level in the local save that has one, newest first."""
+    from storage import SaveBackend
+
+    for level in SaveBackend(manager).entries():
+        yield level.name, level.level_string
+
+
+def cmd_verify(targets: list[str]):
+    """Check that levels still decode to what was stored, without saving them.
+
+    Targets are level IDs (GD servers) or level names (local save). Without
+    targets, every GD Storage level in the local save is checked.
+    """
+    import time
+    import verify
+    from methods.sniff import sniff
+    from storage import SaveBackend
+
+    hashes = verify.load_hashes()
+    jobs = []
+    manager = None
+    if not targets or not all(target.isdigit() for target in targets):
+        try:
+            manager = get_manager(load_config())
+        except ValueError as e:
+            print(f"Error: {e}")
+            return 1
+
+    if targets:
+        for target in targets:
+            if target.isdigit():
+                jobs.append(("levels", int(target), None, hashes["levels"].get(target), ""))
+                continue
+            try:
+                level_str = SaveBackend(manager).get(target).level_string
+            except ValueError:
+                print(f"Level '{target}' not found!")
+                return 1
+            jobs.append(("local", target, level_str, hashes["local"].get(target), ""))
+    else:
+        seen = set()
+        for name, level_str in iter_local_levels(manager):
+            try:
+                sniff(level_str)
+            except ValueError:
+                continue  # One of the player's own levels
+            # Older levels with the same name were replaced, the stored hash is for the newest
+            label = f"'{name}'" if name not in seen else f"'{name}' (older copy)"
+            expected = hashes["local"].get(name) if name not in seen else None
+            seen.add(name)
+            jobs.append(("local", name, level_str, expected, label))
+        if not jobs:
+            print("No GD Storage levels in the local save")
             return 0
+
+    print(f"Verifying {len(jobs)} level{'s' if len(jobs) != 1 else ''}...")
+    start = time.perf_counter()
+    counts = dict.fromkeys(("ok", "unchecked", "mismatch", "failed"), 0)
+    labels = {"ok": "ok", "unchecked": "no hash", "mismatch": "MISMATCH", "failed": "FAILED"}
+    for result in verify.verify_many(jobs):
+        counts[result.status] += 1
+        line = f"  {labels[result.status]:<9} {result.target}"
+        if result.status != "failed":
+            line += f": {result.filename} ({result.size:,} bytes)"
+        if result.message:
+            line += f", {result.message}" if result.status != "failed" else f": {result.message}"
+        print(line)
+
+    print(f"{len(jobs)} checked in {time.perf_counter() - start:.1f}s: {counts['ok']} ok, "
+          f"{counts['unchecked']} without a stored hash, {counts['mismatch']} mismatched, {counts['failed']} failed")
+    return 1 if counts["mismatch"] or counts["failed"] else 0
+
+
+def cmd_decode(level_name: str, decode_func, extract: str | None = None):
+    """Decode from local GD save."""
+    import manifest
+
+    print(f"Extracting '{level_name}'...")
+
+    backend = open_backend("save")
+    if backend is None:
         return 1
+
+    try:
+        level_str = backend.get(level_name).level_string
+    except ValueError:
+        print(f"Level '{level_name}' not found!")
+        return 1
+
+    try:
+        filename, data = manifest.resolve(*decode_func(level_str), decode_func)
+        return save_payload(filename, data, extract)
     except Exception as e:
         print(f"Failed to decode: {e}")
         return 1
 
 
 def get_credentials():
-    """Get GD credentials from save file or prompt user."""
+    """Get GD credentials from cache, save file or prompt user."""
+    import getpass
     from gd_api import get_account_id
 
-    config = load_config()
-    try:
-        manager = get_manager(config)
-        ccgm = manager.ccgm.decode('utf-8', errors='ignore')
-
-        saved_user = re.search(r'<k>GJA_001</k><s>([^<]+)</s>', ccgm)
-        saved_id = re.search(r'<k>GJA_003</k><i>(\d+)</i>', ccgm)
-        saved_gjp2 = re.search(r'<k>GJA_005</k><s>([^<]+)</s>', ccgm)
-
-        if saved_user and saved_id and saved_gjp2:
-            print(f"Using saved credentials: {saved_user.group(1)}")
-            return saved_user.group(1), int(saved_id.group(1)), saved_gjp2.group(1)
-    except (ValueError, FileNotFoundError, OSError):
-        pass  # No local save, prompt for credentials
+    saved = find_saved_credentials()
+    if saved:
+        return saved
 
     print("Enter GD credentials:")
     username = input("Username: ")
@@ -362,42 +949,146 @@ def get_credentials():
         return None, None, None
 
 
+def run_command(args, encode_func, decode_func):
+    """Dispatch the parsed command."""
+    backend = None  # GD servers, the commands get credentials themselves when uploading
+    if args.backend != "gd" or args.list or args.copy_to:
+        if args.backend != "gd" and (args.dedup or args.erasure):
+            print("--dedup and --erasure only work with the gd backend, their manifests point at level IDs")
+            return 1
+        backend = open_backend(args.backend)
+        if backend is None:
+            return 1
+
+    if args.list:
+        return cmd_list(backend)
+    if args.copy_to:
+        target = open_backend(args.copy_to, upload=True)
+        return cmd_copy(backend, target) if target is not None else 1
+
+    if args.upload:
+        if args.archive:
+            return cmd_upload_archive(args.upload, args.compact, backend)
+        if args.dedup:
+            files = collect_files(args.upload)
+            if not files:
+                return 1
+            return max(cmd_upload_dedup(filepath, args.compact) for filepath in files)
+        if args.erasure:
+            files = collect_files(args.upload)
+            if not files:
+                return 1
+            return max(cmd_upload_erasure(filepath, args.erasure, args.compact) for filepath in files)
+        if len(args.upload) == 1 and Path(args.upload[0]).is_file():
+            return cmd_upload(Path(args.upload[0]), encode_func, backend)
+        return cmd_upload_batch(args.upload, encode_func, args.manifest, backend)
+    elif args.info:
+        if backend is not None:
+            return cmd_info_stored(args.info, backend)
+        return cmd_info(args.info)
+    elif args.plan:
+        return cmd_plan(args.plan, args.compact)
+    elif args.fetch:
+        if backend is not None:
+            return fetch_stored(args.fetch, backend, decode_func, args.extract)
+        from methods.sniff import decode_stream
+        return cmd_fetch(args.fetch, decode_func, args.extract, decode_stream)
+    elif args.encode:
+        return cmd_encode(args.encode, encode_func)
+    elif args.decode:
+        return cmd_decode(args.decode, decode_func, args.extract)
+    elif args.verify is not None:
+        return cmd_verify(args.verify)
+
+    return 0
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="GD Storage - Encode files into Geometry Dash levels",
         add_help=False
     )
-    parser.add_argument('--upload', metavar='FILE', help='Encode and upload to GD servers')
-    parser.add_argument('--fetch', metavar='ID', type=int, help='Download and decode from GD servers')
-    parser.add_argument('--encode', metavar='FILE', help='Encode and inject into local GD save')
+    parser.add_argument('--upload', metavar='FILE', nargs='+', help='Encode and upload to GD servers')
+    parser.add_argument('--manifest', metavar='FILE', help='Where a batch upload writes its results')
+    parser.add_argument('--archive', action='store_true', help='Upload files/directories as one archive level')
+    parser.add_argument('--dedup', action='store_true', help='Upload as chunks, skipping chunks uploaded before')
+    parser.add_argument('--erasure', metavar='K+M', nargs='?', const=ERASURE_SPEC,
+                        help='Upload as K data + M parity shard levels, any K of them rebuild the file')
+    parser.add_argument('--compact', action='store_true', help='Encode levels without object positions (smaller)')
+    parser.add_argument('--extract', metavar='MEMBER', nargs='?', const='',
+                        help='Unpack a fetched/decoded archive (or one member of it)')
+    parser.add_argument('--fetch', metavar='ID', help='Download and decode from GD servers')
+    parser.add_argument('--info', metavar='ID', help='Show level metadata without downloading it')
+    parser.add_argument('--plan', metavar='FILE', nargs='+', help='Estimate the levels a file would make')
+    parser.add_argument('--encode', metavar='FILE', nargs='+', help='Encode and inject into local GD save')
     parser.add_argument('--decode', metavar='NAME', help='Decode from local GD save')
+    parser.add_argument('--verify', metavar='ID|NAME', nargs='*',
+                        help='Check levels decode to what was stored (default: every level in the local save)')
+    parser.add_argument('--backend', metavar='gd|save|dir:PATH', default='gd',
+                        help='Where --upload stores levels and --fetch/--info/--list read them (default: gd)')
+    parser.add_argument('--list', action='store_true', help='List the levels in the backend')
+    parser.add_argument('--copy-to', metavar='gd|save|dir:PATH', help='Copy every level of the backend to another')
     parser.add_argument('--config', action='store_true', help='Configure GD save path')
+    parser.add_argument('--serve', action='store_true', help='Run the local daemon')
+    parser.add_argument('--port', type=int, default=0, help='Daemon port (default: any free port)')
+    parser.add_argument('--no-daemon', action='store_true', help='Run locally even if a daemon is running')
+    parser.add_argument('--profile', nargs='?', const='text', choices=['text', 'json'],
+                        help='Print a per-stage timing breakdown')
     parser.add_argument('--help', '-h', action='store_true', help='Show help')
 
     args = parser.parse_args()
+    # Level IDs are numbers, other backends have their own keys
+    if args.backend == "gd":
+        for flag in ("fetch", "info"):
+            value = getattr(args, flag)
+            if value is not None:
+                if not value.isdigit():
+                    parser.error(f"--{flag}: not a level ID: {value}")
+                setattr(args, flag, int(value))
 
     # Handle config
     if args.config:
         return cmd_config()
 
+    if args.serve:
+        from daemon import serve
+        return serve(args.port)
+
     # Show help if no args or --help
-    if args.help or (not args.upload and not args.fetch and not args.encode and not args.decode):
+    if args.help or not (args.upload or args.fetch or args.info or args.plan or args.encode or args.decode
+                         or args.verify is not None or args.list or args.copy_to):
         show_help()
         return 0
 
-    encode_func, decode_func, _ = METHODS[6]
+    # Profiling needs the stages to run in this process
+    if not args.no_daemon and not args.profile:
+        from daemon import run_client
+        status = run_client(args)
+        if status is not None:
+            return status
 
-    # Run command
-    if args.upload:
-        return cmd_upload(Path(args.upload), encode_func)
-    elif args.fetch:
-        return cmd_fetch(args.fetch, decode_func)
-    elif args.encode:
-        return cmd_encode(Path(args.encode), encode_func)
-    elif args.decode:
-        return cmd_decode(args.decode, decode_func)
+    from methods.sniff import decode_any
 
-    return 0
+    # Decoding works out the method from the level itself
+    encode_func, decode_func = METHODS[DEFAULT_METHOD][0], decode_any
+    if args.compact:
+        from functools import partial
+        encode_func = partial(encode_func, compact=True)
+
+    if not args.profile:
+        return run_command(args, encode_func, decode_func)
+
+    import json
+    import profiling
+
+    with profiling.profile() as prof:
+        status = run_command(args, encode_func, decode_func)
+    print()
+    if args.profile == 'json':
+        print(json.dumps(prof.to_dict(), indent=2))
+    else:
+        print(prof.report())
+    return status
 
 
 if __name__ == "__main__":
@@ -0,0 +1,106 @@
+"""
+Shared helpers
+
+Level descriptions, the files a command works on and saving decoded files
+to Downloads. Used by the CLI and the daemon.
+"""
+import os
+from pathlib import Path
+
+
+def make_description(filename: str, file_size: int, max_len: int = 180) -> str:
+    """Build level description, truncating filename if needed to fit limit."""
+    prefix = "github.com/c4k3ss/GD-Storage | "
+    suffix = f" ({file_size:,} bytes)"
+
+    # Calculate max filename length
+    max_name_len = max_len - len(prefix) - len(suffix)
+
+    if len(filename) > max_name_len:
+        # Truncate filename, keep extension visible
+        name_part = filename[:max_name_len - 3] + "..."
+    else:
+        name_part = filename
+
+    return f"{prefix}{name_part}{suffix}"
+
+
+def parse_description(description: str) -> tuple[str, int] | None:
+    """(filename, file size) from a description written by make_description."""
+    import re
+
+    match = re.fullmatch(r"github\.com/c4k3ss/GD-Storage \| (.*) \(([\d,]+) bytes\)", description)
+    if not match:
+        return None
+    return match.group(1), int(match.group(2).replace(",", ""))
+
+
+def collect_files(paths: list[str]) -> list[Path] | None:
+    """Expand a list of files and directories into the files to process."""
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.iterdir() if p.is_file()))
+        elif path.exists():
+            files.append(path)
+        else:
+            print(f"File not found: {path}")
+            return None
+    return files
+
+
+def choose_download_path(filename: str) -> Path | None:
+    """Where to save a decoded file in Downloads, asking before overwriting."""
+    # Sanitize filename - prevent path traversal
+    safe_filename = Path(filename).name
+    if not safe_filename:
+        safe_filename = "decoded_file"
+
+    downloads = Path(os.path.expanduser("~")) / "Downloads" / safe_filename
+
+    if downloads.exists():
+        print(f"File already exists: {downloads}")
+        choice = input("Overwrite? (y/N): ").strip().lower()
+        if choice != 'y':
+            # Try adding a number suffix
+            stem = downloads.stem
+            suffix = downloads.suffix
+            for i in range(1, 100):
+                alt = downloads.parent / f"{stem}_{i}{suffix}"
+                if not alt.exists():
+                    downloads = alt
+                    break
+            else:
+                print("Could not find available filename")
+                return None
+    downloads.parent.mkdir(parents=True, exist_ok=True)
+    return downloads
+
+
+def save_decoded_file(filename: str, data: bytes) -> Path | None:
+    """Save decoded file to Downloads, checking for overwrites."""
+    downloads = choose_download_path(filename)
+    if downloads:
+        downloads.write_bytes(data)
+    return downloads
+
+
+def save_decoded_stream(filename: str, pieces) -> int:
+    """Write a file arriving in pieces to Downloads. Nothing is left behind if it fails midway."""
+    downloads = choose_download_path(filename)
+    if not downloads:
+        return 1
+
+    part = downloads.with_name(downloads.name + ".part")
+    size = 0
+    try:
+        with open(part, "wb") as f:
+            for piece in pieces:
+                f.write(piece)
+                size += len(piece)
+        os.replace(part, downloads)
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+    print(f"Saved to {downloads} ({size:,} bytes)")
+    return 0
@@ -0,0 +1,161 @@
+"""
+Configuration and local paths
+
+Where GD Storage keeps its settings and caches, the GD save folder and the
+GD account found in it. Shared by the CLI, the daemon and the library
+modules, so none of them has to import the CLI.
+"""
+import os
+from pathlib import Path
+
+# Config file location
+CONFIG_DIR = Path.home() / ".config" / "gd-storage"
+CONFIG_FILE = CONFIG_DIR / "config.json"
+CREDENTIALS_FILE = CONFIG_DIR / "credentials.json"
+
+# Caches (downloaded levels, dedup chunks, save segments) live under here
+CACHE_DIR = Path.home() / ".cache" / "gd-storage"
+
+
+def load_config() -> dict:
+    """Load config from file or return defaults."""
+    import json
+
+    if CONFIG_FILE.exists():
+        try:
+            return json.loads(CONFIG_FILE.read_text())
+        except (json.JSONDecodeError, OSError):
+            pass
+    return {}
+
+
+def save_config(config: dict):
+    """Save config to file."""
+    import json
+
+    CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+    CONFIG_FILE.write_text(json.dumps(config, indent=2))
+
+
+def get_default_gd_path() -> str | None:
+    """Get default GD save path for current platform."""
+    import platform
+
+    system = platform.system()
+    if system == "Windows":
+        local_app_data = os.getenv("LOCALAPPDATA")
+        if local_app_data:
+            return os.path.join(local_app_data, "GeometryDash")
+    elif system == "Darwin":  # macOS
+        return os.path.expanduser("~/Library/Application Support/GeometryDash")
+    return None
+
+
+def get_gd_path(config: dict) -> str:
+    """Get GD save folder based on config."""
+    gd_path = config.get("gd_path")
+
+    # Auto-detect path if not configured
+    if not gd_path:
+        gd_path = get_default_gd_path()
+        if not gd_path:
+            raise ValueError("GD path not configured. Run: gd-storage --config")
+
+    # Check path exists
+    if not os.path.exists(gd_path):
+        raise ValueError(f"GD save folder not found: {gd_path}\nRun: gd-storage --config")
+
+    return gd_path
+
+
+def get_manager(config: dict):
+    """Get GD save manager based on config."""
+    from save_manager import new_manager
+
+    gd_path = get_gd_path(config)
+    gd_format = config.get("format", "auto")
+    return new_manager(path=gd_path, format=gd_format)
+
+
+def load_cached_credentials(ccgm_path: str, stat: os.stat_result):
+    """Return cached (username, account_id, gjp2) if the save file is unchanged."""
+    import json
+
+    try:
+        cache = json.loads(CREDENTIALS_FILE.read_text())
+    except (json.JSONDecodeError, OSError):
+        return None
+
+    entry = cache.get(ccgm_path)
+    if not isinstance(entry, dict):
+        return None
+    if entry.get("mtime_ns") != stat.st_mtime_ns or entry.get("size") != stat.st_size:
+        return None
+    try:
+        return entry["username"], int(entry["account_id"]), entry["gjp2"]
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def save_cached_credentials(ccgm_path: str, stat: os.stat_result, username: str, account_id: int, gjp2: str):
+    """Cache credentials for a save file, readable only by the current user."""
+    import json
+
+    try:
+        cache = json.loads(CREDENTIALS_FILE.read_text())
+        if not isinstance(cache, dict):
+            cache = {}
+    except (json.JSONDecodeError, OSError):
+        cache = {}
+
+    cache[ccgm_path] = {
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "username": username,
+        "account_id": account_id,
+        "gjp2": gjp2,
+    }
+
+    CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_file = CREDENTIALS_FILE.with_suffix(".tmp")
+    fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(json.dumps(cache, indent=2))
+    os.chmod(tmp_file, 0o600)
+    os.replace(tmp_file, CREDENTIALS_FILE)
+
+
+def find_saved_credentials():
+    """Get GD credentials from the cache or the save file, None if there are none."""
+    import re
+
+    config = load_config()
+    try:
+        ccgm_path = os.path.abspath(os.path.join(get_gd_path(config), "CCGameManager.dat"))
+        stat = os.stat(ccgm_path)
+
+        cached = load_cached_credentials(ccgm_path, stat)
+        if cached:
+            print(f"Using saved credentials: {cached[0]}")
+            return cached
+
+        manager = get_manager(config)
+        ccgm = manager.ccgm
+
+        saved_user = re.search(rb'<k>GJA_001</k><s>([^<]+)</s>', ccgm)
+        saved_id = re.search(rb'<k>GJA_003</k><i>(\d+)</i>', ccgm)
+        saved_gjp2 = re.search(rb'<k>GJA_005</k><s>([^<]+)</s>', ccgm)
+
+        if saved_user and saved_id and saved_gjp2:
+            username = saved_user.group(1).decode('utf-8', errors='ignore')
+            account_id = int(saved_id.group(1))
+            gjp2 = saved_gjp2.group(1).decode('utf-8', errors='ignore')
+            try:
+                save_cached_credentials(ccgm_path, stat, username, account_id, gjp2)
+            except OSError:
+                pass  # Caching is best effort
+            print(f"Using saved credentials: {username}")
+            return username, account_id, gjp2
+    except (ValueError, FileNotFoundError, OSError):
+        pass  # No local save
+    return None
@@ -0,0 +1,400 @@
+"""
+Local daemon
+
+`gd-storage --serve` keeps a warm process: imports done, a worker pool for
+encoding and decoding, the decoded save file and keep-alive connections to
+the GD servers. It listens on localhost HTTP and writes its port and a random
+token to ~/.config/gd-storage/daemon.json (readable only by you). While that
+file points at a live daemon the CLI sends its commands there instead of
+doing the work itself.
+
+Every job is a POST to /<job> with a JSON body and the token as a bearer
+Authorization header. Results come back as JSON, except decode and fetch
+which return the file itself with the details in X- headers.
+
+    encode  {"paths": [...]}                                 inject files into the local save
+    inject  {"levels": [{"level_string", "name", "description"}]}
+    decode  {"name": "..."}                                  from the local save
+    fetch   {"id": 123}                                      from the GD servers
+    upload  {"path": "..."}                                  needs saved credentials
+"""
+import json
+import os
+from pathlib import Path
+
+from config import CONFIG_DIR
+
+STATE_FILE = CONFIG_DIR / "daemon.json"
+HOST = "127.0.0.1"
+
+
+class JobError(Exception):
+    """A job failed in a way the client should report, with an HTTP status."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def read_state() -> dict | None:
+    try:
+        state = json.loads(STATE_FILE.read_text())
+        return state if isinstance(state, dict) and "port" in state and "token" in state else None
+    except (json.JSONDecodeError, OSError):
+        return None
+
+
+def write_state(state: dict):
+    CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_file = STATE_FILE.with_suffix(".tmp")
+    fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(json.dumps(state))
+    os.chmod(tmp_file, 0o600)
+    os.replace(tmp_file, STATE_FILE)
+
+
+def _init_worker():
+    import signal
+
+    # Shutting down is the daemon's job, workers just finish their task
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+class Daemon:
+    """The jobs, and the state kept warm between them."""
+
+    def __init__(self, workers: int | None = None):
+        import threading
+        from concurrent.futures import ProcessPoolExecutor
+        from methods import METHODS, DEFAULT_METHOD
+        from methods.sniff import decode_any
+
+        self.encode_func, self.decode_func = METHODS[DEFAULT_METHOD][0], decode_any
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker)
+        self.save_lock = threading.Lock()  # Held while reading or writing the local save
+        self._manager = None
+        self._manager_key = None
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    def _save_key(self, gd_path: str, gd_format: str):
+        try:
+            stat = os.stat(os.path.join(gd_path, "CCLocalLevels.dat"))
+            return gd_path, gd_format, stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return gd_path, gd_format, None, None
+
+    def manager(self):
+        """Save manager, reused until the config or the levels file changes. Call with save_lock held."""
+        from config import get_gd_path, get_manager, load_config
+
+        config = load_config()
+        try:
+            key = self._save_key(get_gd_path(config), config.get("format", "auto"))
+            if self._manager is None or key != self._manager_key:
+                self._manager = get_manager(config)
+                self._manager_key = key
+        except ValueError as e:
+            raise JobError(409, str(e))
+        return self._manager
+
+    def _inject(self, levels: list[tuple[str, str, str]]):
+        with self.save_lock:
+            manager = self.manager()
+            manager.injectLevels(levels)
+            manager.save(ccll=True, ccgm=False)
+            # Our own write must not count as an outside change
+            self._manager_key = self._save_key(*self._manager_key[:2])
+
+    def _decode(self, level_str: str):
+        import manifest
+
+        try:
+            return manifest.resolve(*self.pool.submit(self.decode_func, level_str).result(), self.decode_func)
+        except Exception as e:
+            raise JobError(422, f"Failed to decode: {e}")
+
+    def job_encode(self, request: dict):
+        from common import make_description
+        import verify
+
+        files = [Path(p) for p in request.get("paths", [])]
+        for filepath in files:
+            if not filepath.is_file():
+                raise JobError(404, f"File not found: {filepath}")
+
+        encoded_levels = list(self.pool.map(self.encode_func, files))
+        self._inject([
+            (encoded.level_string, filepath.stem, make_description(filepath.name, encoded.raw_size))
+            for filepath, encoded in zip(files, encoded_levels)
+        ])
+        verify.record("local", {filepath.stem: encoded for filepath, encoded in zip(files, encoded_levels)})
+        return {"levels": [
+            {"name": filepath.stem, "raw_size": encoded.raw_size, "object_count": encoded.object_count}
+            for filepath, encoded in zip(files, encoded_levels)
+        ]}
+
+    def job_inject(self, request: dict):
+        levels = [
+            (level["level_string"], level.get("name", "Injected"), level.get("description", "Injected level"))
+            for level in request.get("levels", [])
+        ]
+        self._inject(levels)
+        return {"injected": len(levels)}
+
+    def job_decode(self, request: dict):
+        from storage import SaveBackend
+
+        name = request.get("name", "")
+        try:
+            with self.save_lock:
+                level_str = SaveBackend(self.manager()).get(name).level_string
+        except ValueError:
+            raise JobError(404, f"Level '{name}' not found!")
+        filename, data = self._decode(level_str)
+        return data, {"Filename": filename}
+
+    def job_fetch(self, request: dict):
+        from gd_api import fetch_level
+
+        try:
+            level_data = fetch_level(int(request["id"]))
+        except Exception as e:
+            raise JobError(502, f"Failed to fetch: {e}")
+        filename, data = self._decode(level_data.get("level_string", ""))
+        return data, {
+            "Filename": filename,
+            "Level-Name": level_data.get("name", "Unknown"),
+            "Description": level_data.get("description", ""),
+        }
+
+    def job_upload(self, request: dict):
+        from common import make_description
+        from config import find_saved_credentials
+        from storage import GDBackend, upload_encoded
+
+        filepath = Path(request.get("path", ""))
+        if not filepath.is_file():
+            raise JobError(404, f"File not found: {filepath}")
+        # Cheap after the first time, the credentials cache is keyed on the save file
+        credentials = find_saved_credentials()
+        if credentials is None:
+            raise JobError(409, "No saved credentials")
+
+        encoded = self.pool.submit(self.encode_func, filepath).result()
+        level_name = filepath.stem[:20]
+        try:
+            level_id = upload_encoded(
+                encoded, level_name, make_description(filepath.name, encoded.raw_size), GDBackend(credentials),
+            )
+        except Exception as e:
+            raise JobError(502, f"Upload failed: {e}")
+        return {"level_id": level_id, "level_name": level_name}
+
+
+def make_handler(daemon: Daemon, token: str):
+    import hmac
+    import time
+    import urllib.parse
+    from http.server import BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            start = time.perf_counter()
+            job = getattr(daemon, "job_" + self.path.strip("/"), None)
+            # Always read the body, the connection is kept alive for the next request
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            try:
+                authorization = self.headers.get("Authorization", "")
+                if not hmac.compare_digest(authorization.encode(), f"Bearer {token}".encode()):
+                    raise JobError(403, "Bad token")
+                if job is None:
+                    raise JobError(404, f"Unknown job: {self.path}")
+                result = job(json.loads(body or b"{}"))
+            except JobError as e:
+                self._reply(e.status, {"error": str(e)})
+            except Exception as e:
+                self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+            else:
+                if isinstance(result, tuple):
+                    data, details = result
+                    self._reply(200, data, details)
+                else:
+                    self._reply(200, result)
+            self.log_message("%s %.3fs", self.path, time.perf_counter() - start)
+
+        def _reply(self, status: int, body, details: dict | None = None):
+            if isinstance(body, dict):
+                body = json.dumps(body).encode()
+                content_type = "application/json"
+            else:
+                content_type = "application/octet-stream"
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (details or {}).items():
+                self.send_header("X-" + key, urllib.parse.quote(value))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_request(self, code="-", size="-"):
+            pass  # do_POST logs the job with its duration instead
+
+    return Handler
+
+
+def serve(port: int = 0, workers: int | None = None) -> int:
+    """Run the daemon in the foreground until interrupted."""
+    import secrets
+    import signal
+    from http.server import ThreadingHTTPServer
+
+    state = read_state()
+    if state and ping(state):
+        print(f"Daemon already running on {HOST}:{state['port']} (pid {state.get('pid')})")
+        return 1
+
+    daemon = Daemon(workers)
+    token = secrets.token_urlsafe(32)
+    server = ThreadingHTTPServer((HOST, port), make_handler(daemon, token))
+    server.daemon_threads = True
+    port = server.server_address[1]
+    write_state({"pid": os.getpid(), "port": port, "token": token})
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)  # May be ignored when started in the background
+
+    print(f"Serving on {HOST}:{port} with {daemon.workers} workers, Ctrl+C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        daemon.close()
+        state = read_state()
+        if state and state.get("pid") == os.getpid():
+            STATE_FILE.unlink(missing_ok=True)
+    return 0
+
+
+def ping(state: dict) -> bool:
+    import http.client
+
+    try:
+        conn = http.client.HTTPConnection(HOST, state["port"], timeout=1)
+        conn.connect()
+        conn.close()
+        return True
+    except OSError:
+        return False
+
+
+class DaemonUnavailable(Exception):
+    pass
+
+
+def call(state: dict, job: str, request: dict):
+    """Send a job. Returns (status, body, details); raises DaemonUnavailable if nothing is listening."""
+    import http.client
+    import urllib.parse
+
+    conn = http.client.HTTPConnection(HOST, state["port"])
+    try:
+        try:
+            conn.connect()
+        except OSError as e:
+            raise DaemonUnavailable(str(e))
+        conn.request("POST", "/" + job, json.dumps(request).encode(), {
+            "Authorization": f"Bearer {state['token']}",
+            "Content-Type": "application/json",
+        })
+        response = conn.getresponse()
+        body = response.read()
+    finally:
+        conn.close()
+
+    details = {
+        key[2:].lower(): urllib.parse.unquote(value)
+        for key, value in response.getheaders() if key.lower().startswith("x-")
+    }
+    if response.getheader("Content-Type") == "application/json":
+        body = json.loads(body)
+    return response.status, body, details
+
+
+def run_client(args) -> int | None:
+    """Run a CLI command through the daemon. Returns None if the command should run locally instead."""
+    # Checked first, so commands without a daemon don't pay for the HTTP imports
+    state = read_state()
+    if state is None or args.archive or args.dedup or args.erasure or args.compact or args.extract is not None:
+        return None
+    if args.backend != "gd" or args.list or args.copy_to:
+        return None  # The daemon only talks to GD and the local save
+
+    import http.client
+    from common import collect_files, save_decoded_file
+
+    if args.upload:
+        filepath = Path(args.upload[0])
+        if len(args.upload) > 1 or not filepath.is_file():
+            return None  # Batches run locally, they already use a pool
+        job, request = "upload", {"path": str(filepath.resolve())}
+        print(f"Encoding {filepath.name} ({filepath.stat().st_size:,} bytes)...")
+    elif args.fetch:
+        job, request = "fetch", {"id": args.fetch}
+        print(f"Fetching level {args.fetch}...")
+    elif args.encode:
+        files = collect_files(args.encode)
+        if not files:
+            return None
+        job, request = "encode", {"paths": [str(f.resolve()) for f in files]}
+        print(f"Encoding {len(files)} file(s) ({sum(f.stat().st_size for f in files):,} bytes)...")
+    elif args.decode:
+        job, request = "decode", {"name": args.decode}
+        print(f"Extracting '{args.decode}'...")
+    else:
+        return None
+
+    try:
+        status, body, details = call(state, job, request)
+    except DaemonUnavailable:
+        return None  # Stale state file, the daemon is gone
+    except (OSError, http.client.HTTPException) as e:
+        print(f"Daemon request failed: {e}")
+        return 1
+
+    if status == 409 and job == "upload":
+        return None  # No saved credentials, the local path can prompt for them
+    if status != 200:
+        print(body.get("error", f"Daemon returned HTTP {status}") if isinstance(body, dict) else f"HTTP {status}")
+        return 1
+
+    if job == "upload":
+        print(f"Uploaded! Level ID: {body['level_id']}")
+        print(f"Fetch with: gd-storage --fetch {body['level_id']}")
+    elif job == "encode":
+        for level in body["levels"]:
+            print(f"Injected as '{level['name']}'")
+    else:
+        if job == "fetch":
+            print(f"Level: {details.get('level-name', 'Unknown')}")
+            if details.get("description"):
+                print(f"Description: {details['description']}")
+        try:
+            saved_path = save_decoded_file(details.get("filename", ""), body)
+        except (EOFError, OSError) as e:
+            print(f"Failed to save: {e}")
+            return 1
+        if not saved_path:
+            return 1
+        print(f"Saved to {saved_path} ({len(body):,} bytes)")
+    return 0
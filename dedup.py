@@ -0,0 +1,119 @@
+"""
+Content-defined chunking and the chunk store
+
+Files uploaded with --dedup are cut into chunks where a rolling (gear) hash
+of the content hits a pattern, so an edit only changes the chunks around it
+and the boundaries after it line up again. Every chunk is uploaded once as its
+own level and the file itself becomes a manifest level listing them:
+
+    {"kind": "chunks", "name": ..., "size": ..., "sha256": ...,
+     "chunks": [[sha256, size, level_id], ...]}
+
+INDEX_FILE remembers which level holds each chunk (sha256 -> level ID), so a
+new version only uploads the chunks that changed. Chunks are also kept in
+CACHE_DIR, fetching a version only downloads chunks that aren't there yet.
+"""
+import hashlib
+import json
+import os
+
+import config
+
+MIN_CHUNK = 256 << 10
+MAX_CHUNK = 4 << 20
+CUT_BITS = 20  # A cut past MIN_CHUNK has a 2^-20 chance per byte
+AVERAGE_CHUNK = MIN_CHUNK + (1 << CUT_BITS)  # ~1.25 MB, less for files with many MAX_CHUNK cuts
+
+INDEX_FILE = config.CONFIG_DIR / "chunks.json"
+CACHE_DIR = config.CACHE_DIR / "chunks"
+
+_MASK64 = (1 << 64) - 1
+_CUT_MASK = ((1 << CUT_BITS) - 1) << (64 - CUT_BITS)  # Top bits depend on the last 64 bytes
+_GEAR = [
+    int.from_bytes(hashlib.blake2b(bytes([b]), digest_size=8, person=b"gd-gear").digest(), "big")
+    for b in range(256)
+]
+
+
+def chunk_bounds(data) -> list[tuple[int, int]]:
+    """(start, end) of each chunk. Same content gives the same cuts, wherever it sits in the file."""
+    view = memoryview(data)
+    gear = _GEAR
+    bounds = []
+    start = 0
+    while start < len(view):
+        end = min(start + MAX_CHUNK, len(view))
+        cut = end
+        h = 0
+        # Bytes before MIN_CHUNK can't end the chunk, so they aren't hashed at all
+        for pos, byte in enumerate(view[start + MIN_CHUNK:end], start + MIN_CHUNK + 1):
+            h = ((h << 1) + gear[byte]) & _MASK64
+            if not h & _CUT_MASK:
+                cut = pos
+                break
+        bounds.append((start, cut))
+        start = cut
+    return bounds
+
+
+def load_index() -> dict:
+    try:
+        index = json.loads(INDEX_FILE.read_text())
+        return index if isinstance(index, dict) else {}
+    except (json.JSONDecodeError, OSError):
+        return {}
+
+
+def save_index(index: dict):
+    config.CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_file = INDEX_FILE.with_suffix(".tmp")
+    tmp_file.write_text(json.dumps(index))
+    os.replace(tmp_file, INDEX_FILE)
+
+
+def cache_get(digest: str) -> bytes | None:
+    """A cached chunk, None if missing or damaged."""
+    try:
+        data = (CACHE_DIR / digest).read_bytes()
+    except OSError:
+        return None
+    return data if hashlib.sha256(data).hexdigest() == digest else None
+
+
+def cache_put(digest: str, data):
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_file = CACHE_DIR / f"{digest}.tmp"
+        tmp_file.write_bytes(data)
+        os.replace(tmp_file, CACHE_DIR / digest)
+    except OSError:
+        pass  # The cache is best effort
+
+
+def assemble(manifest: dict, decode_func, workers: int = 4) -> tuple[bytes, int]:
+    """Rebuild a file from a "chunks" manifest. Returns (data, chunks that were cached)."""
+    from concurrent.futures import ThreadPoolExecutor
+    from gd_api import download_level
+
+    def load(entry):
+        digest, size, level_id = entry
+        data = cache_get(digest)
+        if data is not None:
+            return data, True
+        _, data = decode_func(download_level(level_id).get("level_string", ""))
+        if len(data) != size or hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"Chunk {digest[:12]} in level {level_id} is damaged")
+        cache_put(digest, data)
+        return data, False
+
+    with ThreadPoolExecutor(workers) as pool:
+        parts = list(pool.map(load, manifest["chunks"]))
+
+    index = load_index()
+    index.update({digest: level_id for digest, _, level_id in manifest["chunks"]})
+    save_index(index)
+
+    data = b"".join(part for part, _ in parts)
+    if len(data) != manifest["size"] or hashlib.sha256(data).hexdigest() != manifest["sha256"]:
+        raise ValueError("Reassembled file doesn't match its manifest")
+    return data, sum(1 for _, cached in parts if cached)
@@ -0,0 +1,116 @@
+"""
+Deflate helpers
+
+Builds gzip streams out of independently compressed segments.
+Every segment is raw deflate ending on a sync flush, so segments can be
+concatenated in any combination and reused without recompressing them.
+The gzip CRC is stitched together with crc32_combine instead of rescanning.
+
+gzip_parallel() uses the same trick to compress one buffer on several
+threads, like pigz: the result is a single ordinary gzip member.
+"""
+import os
+import struct
+import zlib
+
+GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\x0b'
+FINAL_BLOCK = b'\x03\x00'  # Empty final fixed-Huffman block, ends the deflate stream
+STORED_MAX = 0xFFFF  # Largest payload of a single stored block
+WINDOW = 1 << 15  # Deflate looks back at most this far
+GZIP_BLOCK = 1 << 20  # Input bytes per block in gzip_parallel
+
+_CRC_POLY = 0xEDB88320
+
+
+def deflate_segment(data, level: int = 6) -> bytes:
+    """Raw deflate a segment without ending the stream."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+def gzip_parallel(data, level: int = 9, block_size: int = GZIP_BLOCK, workers: int | None = None,
+                  strategy: int = zlib.Z_DEFAULT_STRATEGY, mem_level: int = 8) -> bytes:
+    """gzip data in blocks compressed on several threads (os.cpu_count() by default).
+
+    Each block is primed with the WINDOW bytes before it, so matches across
+    a cut aren't lost, and ends on a sync flush. That costs about 5 bytes a
+    block over gzip.compress at the same level. zlib releases the GIL while
+    compressing, so the threads really run side by side.
+    """
+    view = memoryview(data).cast('B')
+    block_size = max(block_size, WINDOW)
+
+    def compress_block(start: int) -> tuple[bytes, int, int]:
+        block = view[start:start + block_size]
+        if start:
+            zdict = bytes(view[max(0, start - WINDOW):start])
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, mem_level, strategy, zdict)
+        else:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, mem_level, strategy)
+        return compressor.compress(block) + compressor.flush(zlib.Z_SYNC_FLUSH), zlib.crc32(block), len(block)
+
+    starts = range(0, len(view), block_size)
+    workers = min(len(starts), workers or os.cpu_count() or 1)
+    if workers > 1:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(workers) as pool:
+            blocks = list(pool.map(compress_block, starts))
+    else:
+        blocks = [compress_block(start) for start in starts]
+
+    crc = 0
+    for _, block_crc, size in blocks:
+        crc = crc32_combine(crc, block_crc, size)
+    return b"".join([GZIP_HEADER, *(out for out, _, _ in blocks), FINAL_BLOCK, gzip_trailer(crc, len(view))])
+
+
+def stored_block(data) -> bytes:
+    """Wrap a small segment in an uncompressed deflate block (no compression cost)."""
+    length = len(data)
+    if length > STORED_MAX:
+        raise ValueError("Stored block too large")
+    return b'\x00' + struct.pack('<HH', length, length ^ 0xFFFF) + data
+
+
+def gzip_trailer(crc: int, size: int) -> bytes:
+    return struct.pack('<II', crc & 0xFFFFFFFF, size & 0xFFFFFFFF)
+
+
+def _multmodp(a: int, b: int) -> int:
+    """Multiply a and b modulo the CRC polynomial (reflected bit order)."""
+    m = 1 << 31
+    p = 0
+    while True:
+        if a & m:
+            p ^= b
+            if (a & (m - 1)) == 0:
+                break
+        m >>= 1
+        b = (b >> 1) ^ _CRC_POLY if b & 1 else b >> 1
+    return p
+
+
+# x^(2^n) mod p, for n = 0..31
+_X2N_TABLE = []
+_p = 1 << 30  # x^1
+for _ in range(32):
+    _X2N_TABLE.append(_p)
+    _p = _multmodp(_p, _p)
+del _p
+
+
+def _x2nmodp(n: int, k: int) -> int:
+    """x^(n * 2^k) mod p"""
+    p = 1 << 31  # x^0 == 1
+    while n:
+        if n & 1:
+            p = _multmodp(_X2N_TABLE[k & 31], p)
+        n >>= 1
+        k += 1
+    return p
+
+
+def crc32_combine(crc1: int, crc2: int, len2: int) -> int:
+    """CRC32 of A+B given crc32(A), crc32(B) and len(B), without touching the data."""
+    return _multmodp(_x2nmodp(len2, 3), crc1) ^ crc2
@@ -14,7 +14,7 @@ if __name__ == "__main__":
     from CCManager import newManager
 
     # Parse arguments
-    method_num = DEFAULT_METHOD
+    method_num = None  # Decoding detects the method unless one is given
     args = sys.argv[1:]
 
     # Extract --method argument
@@ -27,22 +27,27 @@ if __name__ == "__main__":
     if len(args) < 1:
         print("Usage:")
         print("  Encode: python encoder.py <filepath> [--method N]")
-        print("  Decode: python encoder.py --decode <levelname> [--method N]")
-        print("  Fetch:  python encoder.py --fetch <level_id> [--method N]")
+        print("  Decode: python encoder.py --decode <levelname> [--method N]  (detected if not given)")
+        print("  Fetch:  python encoder.py --fetch <level_id> [--method N]    (detected if not given)")
         print("  Upload: python encoder.py --upload <filepath> [--method N]")
         print()
         print("Methods:")
-        for num, (_, _, desc) in METHODS.items():
+        for num in METHODS:
             default = " (default)" if num == DEFAULT_METHOD else ""
-            print(f"  {num} - {desc}{default}")
+            print(f"  {num} - {METHODS.description(num)}{default}")
         sys.exit(1)
 
-    if method_num not in METHODS:
+    if method_num is not None and method_num not in METHODS:
         print(f"Invalid method {method_num}. Valid methods: {list(METHODS.keys())}")
         sys.exit(1)
 
-    encode_func, decode_func, method_desc = METHODS[method_num]
-    print(f"Using method {method_num}: {method_desc}")
+    encode_func, decode_func, method_desc = METHODS[method_num or DEFAULT_METHOD]
+    if method_num is None and args[0] in ("--fetch", "--decode"):
+        from methods.sniff import decode_any
+        decode_func = decode_any
+        print("Detecting the method from the level")
+    else:
+        print(f"Using method {method_num or DEFAULT_METHOD}: {method_desc}")
 
     if args[0] == "--fetch":
         # Download and decode a level from GD servers
@@ -91,7 +96,6 @@ if __name__ == "__main__":
 
         import dashlib
         import base64
-        import gzip
         from gd_api import get_account_id
         import getpass
 
@@ -101,17 +105,11 @@ if __name__ == "__main__":
             sys.exit(1)
 
         print(f"Encoding {filepath} ({filepath.stat().st_size:,} bytes)...")
-        level_str = encode_func(filepath)
+        encoded = encode_func(filepath)
+        level_str = encoded.level_string
         print(f"Encoded level string: {len(level_str):,} chars")
 
-        # Decompress to get raw level for object count
-        if level_str.startswith('H4sI'):
-            compressed = base64.urlsafe_b64decode(level_str + '==')
-            raw_level = gzip.decompress(compressed).decode('utf-8')
-        else:
-            raw_level = level_str
-
-        obj_count = raw_level.count(';')
+        obj_count = encoded.object_count
         print(f"Object count: {obj_count}")
 
         level_name = filepath.stem[:20]  # GD has name length limits
@@ -244,7 +242,7 @@ if __name__ == "__main__":
 
         print(f"Encoding {filepath} ({filepath.stat().st_size:,} bytes)...")
 
-        level_str = encode_func(filepath)
+        level_str = encode_func(filepath).level_string
         print(f"Level string: {len(level_str):,} chars")
 
         manager = newManager()
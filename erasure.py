@@ -0,0 +1,202 @@
+"""
+Erasure-coded shard sets
+
+Files uploaded with --erasure K+M are compressed once, cut into K data
+shards and extended with M Reed-Solomon parity shards. Every shard is its own
+level and the file itself becomes a manifest level:
+
+    {"kind": "erasure", "name": ..., "size": ..., "sha256": ...,
+     "k": K, "m": M, "payload_size": ..., "shard_size": ...,
+     "shards": [[sha256, level_id], ...]}   data shards first, then parity
+
+Any K of the K+M shards rebuild the file. Fetching asks for all of them at
+once and drops the remaining downloads as soon as K have arrived intact, so
+a slow, throttled or deleted level doesn't hold up the restore.
+
+The code is systematic Reed-Solomon over GF(2^8) with Cauchy parity rows:
+any K rows of [identity; Cauchy] are invertible. Shard arithmetic runs in C,
+multiplying a shard by a constant is bytes.translate() with that constant's
+table and adding shards is XOR on big integers.
+"""
+import hashlib
+import threading
+from functools import lru_cache
+
+MAX_SHARDS = 256  # K + M, the field has 256 elements
+FETCH_WORKERS = 16
+
+# GF(2^8) with the polynomial x^8 + x^4 + x^3 + x^2 + 1
+_EXP = [0] * 512
+_LOG = [0] * 256
+_x = 1
+for _i in range(255):
+    _EXP[_i] = _x
+    _LOG[_x] = _i
+    _x <<= 1
+    if _x & 0x100:
+        _x ^= 0x11D
+for _i in range(255, 512):
+    _EXP[_i] = _EXP[_i - 255]
+del _x, _i
+
+
+def _mul(a: int, b: int) -> int:
+    if a == 0 or b == 0:
+        return 0
+    return _EXP[_LOG[a] + _LOG[b]]
+
+
+def _inv(a: int) -> int:
+    return _EXP[255 - _LOG[a]]
+
+
+@lru_cache(maxsize=None)
+def _table(c: int) -> bytes:
+    """bytes.translate() table that multiplies every byte by c."""
+    return bytes(_mul(c, x) for x in range(256))
+
+
+def parse_spec(spec: str) -> tuple[int, int]:
+    """'4+2' -> (4, 2). Raises ValueError if it isn't a usable K+M."""
+    try:
+        k, m = (int(part) for part in spec.split("+"))
+    except ValueError:
+        raise ValueError(f"Invalid erasure spec '{spec}', expected K+M like 4+2")
+    if k < 1 or m < 1 or k + m > MAX_SHARDS:
+        raise ValueError(f"Invalid erasure spec '{spec}': need K >= 1, M >= 1 and K + M <= {MAX_SHARDS}")
+    return k, m
+
+
+def _row(index: int, k: int) -> list[int]:
+    """Row of the encoding matrix for shard index."""
+    if index < k:
+        return [int(i == index) for i in range(k)]
+    x = index  # Parity rows use x = K..K+M-1, columns y = 0..K-1, so x ^ y is never 0
+    return [_inv(x ^ y) for y in range(k)]
+
+
+def _combine(coefficients: list[int], shards: list[bytes], size: int) -> bytes:
+    """Sum of coefficient * shard."""
+    total = 0
+    for c, shard in zip(coefficients, shards):
+        if c == 0:
+            continue
+        if c != 1:
+            shard = shard.translate(_table(c))
+        total ^= int.from_bytes(shard, "little")
+    return total.to_bytes(size, "little")
+
+
+def _invert(matrix: list[list[int]]) -> list[list[int]]:
+    """Inverse of a square matrix over GF(2^8), Gauss-Jordan."""
+    n = len(matrix)
+    rows = [row[:] + [int(i == j) for j in range(n)] for i, row in enumerate(matrix)]
+    for col in range(n):
+        pivot = next((r for r in range(col, n) if rows[r][col]), None)
+        if pivot is None:
+            raise ValueError("Shards don't determine the data")  # Can't happen with a Cauchy matrix
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        scale = _inv(rows[col][col])
+        rows[col] = [_mul(scale, v) for v in rows[col]]
+        for r in range(n):
+            factor = rows[r][col]
+            if r != col and factor:
+                rows[r] = [v ^ _mul(factor, p) for v, p in zip(rows[r], rows[col])]
+    return [row[n:] for row in rows]
+
+
+def encode_shards(payload, k: int, m: int) -> list[bytes]:
+    """Cut payload into k data shards (zero padded) and add m parity shards."""
+    shard_size = max(1, -(-len(payload) // k))
+    padded = bytes(payload).ljust(k * shard_size, b"\x00")
+    data = [padded[i * shard_size:(i + 1) * shard_size] for i in range(k)]
+    return data + [_combine(_row(k + j, k), data, shard_size) for j in range(m)]
+
+
+def decode_shards(shards: dict[int, bytes], k: int, payload_size: int) -> bytes:
+    """Rebuild the payload from any k shards (index -> shard)."""
+    if len(shards) < k:
+        raise ValueError(f"Only {len(shards)} shards, {k} are needed")
+    indices = sorted(shards)[:k]  # Data shards first, they need no arithmetic
+    if indices == list(range(k)):
+        return b"".join(shards[i] for i in indices)[:payload_size]
+
+    chosen = [shards[i] for i in indices]
+    size = len(chosen[0])
+    inverse = _invert([_row(i, k) for i in indices])
+    data = [shards[i] if i in shards else _combine(inverse[i], chosen, size) for i in range(k)]
+    return b"".join(data)[:payload_size]
+
+
+def assemble(manifest: dict) -> tuple[bytes, list[int], dict[int, str]]:
+    """Rebuild a file from an "erasure" manifest, from the first k shards to arrive intact.
+
+    Returns (data, shard indices used, index -> error for shards that
+    failed). Downloads still running when k shards are in are dropped.
+    """
+    from methods.compression import decompress_data
+
+    payload, used, errors = _fetch(manifest)
+    data = decompress_data(payload)
+    if len(data) != manifest["size"] or hashlib.sha256(data).hexdigest() != manifest["sha256"]:
+        raise ValueError("Rebuilt file doesn't match its manifest")
+    return data, used, errors
+
+
+def _fetch(manifest: dict) -> tuple[bytes, list[int], dict[int, str]]:
+    """Download all shards at once, (payload, indices used, errors) as soon as k are in."""
+    from gd_api import LevelStream
+    from methods import METHODS
+
+    k = manifest["k"]
+    entries = manifest["shards"]
+    decode_stream = METHODS.module(6).decode_stream
+    done = threading.Event()
+    finished = threading.Semaphore(0)
+    slots = threading.Semaphore(FETCH_WORKERS)
+    lock = threading.Lock()
+    shards = {}
+    errors = {}
+
+    def download(index: int):
+        digest, level_id = entries[index]
+        try:
+            with slots:
+                if done.is_set():
+                    return
+                parts = []
+                with LevelStream(level_id, cache=False) as level:
+                    pieces = decode_stream(level, skip_decompression=True)
+                    next(pieces)  # Filename
+                    for piece in pieces:
+                        if done.is_set():
+                            return  # Enough shards, leaving closes the connection
+                        parts.append(piece)
+                data = b"".join(parts)
+                if len(data) != manifest["shard_size"] or hashlib.sha256(data).hexdigest() != digest:
+                    raise ValueError("damaged")
+                with lock:
+                    if len(shards) < k:
+                        shards[index] = data
+                        if len(shards) == k:
+                            done.set()
+        except Exception as e:
+            with lock:
+                errors[index] = str(e)
+        finally:
+            finished.release()
+
+    # Daemon threads: a download that is stuck when k shards are in mustn't keep the process alive
+    for index in range(len(entries)):
+        threading.Thread(target=download, args=(index,), daemon=True).start()
+    for _ in entries:
+        finished.acquire()
+        if done.is_set():
+            break
+
+    with lock:
+        if len(shards) < k:
+            raise ValueError(f"Only {len(shards)} of {len(entries)} shards arrived intact, {k} are needed")
+        used = sorted(shards)
+        payload = decode_shards(dict(shards), k, manifest["payload_size"])
+        return payload, used, dict(errors)
@@ -3,22 +3,142 @@ Geometry Dash Server API
 
 Raw HTTP implementation for downloading and uploading levels.
 """
-import urllib.request
+import http.client
+import os
+import threading
 import urllib.parse
 import base64
 import hashlib
 import zlib
+from pathlib import Path
 
-GD_URL = "https://www.boomlings.com/database"
+import config
+from methods.result import EncodedLevel
+from profiling import stage
+
+# GD_STORAGE_SERVER points everything at another server, e.g. benchmarks/gd_server.py
+GD_URL = os.environ.get("GD_STORAGE_SERVER", "https://www.boomlings.com/database").rstrip("/")
 SECRET = "Wmfd2893gb7"  # Public secret used by GD
 
+# Downloaded levels, reused by fetch_level while the server still has the same version
+LEVEL_CACHE_DIR = config.CACHE_DIR / "levels"
+
+# Idle keep-alive connections, shared by all threads (the daemon serves each request on its own thread)
+_idle_connections = []
+_idle_lock = threading.Lock()
+
+
+def _connect(timeout: float) -> http.client.HTTPConnection:
+    url = urllib.parse.urlsplit(GD_URL)
+    with _idle_lock:
+        while _idle_connections:
+            conn = _idle_connections.pop()
+            if conn.host == url.hostname and conn.port == (url.port or conn.default_port):
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                return conn
+            conn.close()
+
+    if url.scheme == "https":
+        return http.client.HTTPSConnection(url.hostname, url.port, timeout=timeout)
+    return http.client.HTTPConnection(url.hostname, url.port, timeout=timeout)
+
+
+def _open(endpoint: str, fields: dict, timeout: float = 30):
+    """POST form fields to a GD endpoint. Returns (connection, response) with the body unread.
+
+    Hand both to _release once the body has been read, so the connection can be reused.
+    """
+    body = urllib.parse.urlencode(fields).encode()
+    headers = {"User-Agent": "", "Content-Type": "application/x-www-form-urlencoded"}
+    path = f"{urllib.parse.urlsplit(GD_URL).path}/{endpoint}"
+
+    while True:
+        conn = _connect(timeout)
+        reused = conn.sock is not None
+        try:
+            conn.request("POST", path, body, headers)
+            response = conn.getresponse()
+        except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+            conn.close()
+            if reused:
+                continue  # The server dropped the idle connection, the request never got through
+            raise
+        except Exception:
+            conn.close()
+            raise
+
+        if response.status != 200:
+            conn.close()
+            raise ValueError(f"Server returned HTTP {response.status} {response.reason}")
+        return conn, response
+
+
+def _release(conn: http.client.HTTPConnection, response: http.client.HTTPResponse):
+    if response.will_close or not response.isclosed():
+        conn.close()
+    else:
+        with _idle_lock:
+            _idle_connections.append(conn)
+
+
+def _post(endpoint: str, fields: dict, timeout: float = 30) -> bytes:
+    """POST form fields to a GD endpoint and return the response body.
+
+    Connections are kept alive and reused, which saves a TLS handshake per call.
+    """
+    conn, response = _open(endpoint, fields, timeout)
+    try:
+        data = response.read()
+    except Exception:
+        conn.close()
+        raise
+    _release(conn, response)
+    return data
+
+
+def _parse_fields(text: str) -> dict:
+    """Parse a key:value:key:value response section."""
+    fields = text.split(":")
+    return {fields[i]: fields[i + 1] for i in range(0, len(fields) - 1, 2)}
+
+
+def _decode_description(desc_encoded: str) -> str:
+    try:
+        return base64.urlsafe_b64decode(desc_encoded + "==").decode('utf-8', errors='ignore')
+    except (ValueError, UnicodeDecodeError):
+        return desc_encoded
+
+
+def decode_level_string(level_string_encoded: str) -> str:
+    """Level string as stored on the server (field 4, base64 + gzip) -> raw level string."""
+    try:
+        # URL-safe base64 decode
+        with stage("fetch.base64", len(level_string_encoded)):
+            decoded = base64.urlsafe_b64decode(level_string_encoded + "==")
+        # Gzip decompress
+        with stage("fetch.gunzip", len(decoded)):
+            return zlib.decompress(decoded, 15 + 32).decode('utf-8', errors='ignore')
+    except (ValueError, zlib.error):
+        # Some levels might not be compressed
+        return level_string_encoded
+
+
+def _add_convenience_keys(level_data: dict, level_id: int) -> dict:
+    if level_data.get("3"):
+        level_data["description"] = _decode_description(level_data["3"])
+    level_data["name"] = level_data.get("2", "Unknown")
+    level_data["id"] = level_data.get("1", level_id)
+    return level_data
+
 
 def download_level(level_id: int) -> dict:
     """
     Download a level from GD servers by ID.
     Returns dict with 'level_string', 'name', 'description', etc.
     """
-    data = urllib.parse.urlencode({
+    fields = {
         "levelID": level_id,
         "secret": SECRET,
         "gameVersion": 22,
@@ -26,50 +146,274 @@ def download_level(level_id: int) -> dict:
         "gdw": 0,
         "inc": 1,
         "extras": 0,
-    }).encode()
+    }
 
-    req = urllib.request.Request(f"{GD_URL}/downloadGJLevel22.php", data=data)
-    req.add_header("User-Agent", "")
-
-    with urllib.request.urlopen(req, timeout=30) as response:
-        result = response.read().decode('utf-8', errors='ignore')
+    with stage("fetch.network") as st:
+        body = _post("downloadGJLevel22.php", fields)
+        st.bytes = len(body)
+    result = body.decode('utf-8', errors='ignore')
 
 
     if result == "-1":
         raise ValueError(f"Level {level_id} not found")
 
     # Parse the response (key:value:key:value format)
-    parts = result.split("#")[0]  # Remove hash/creator info
-    fields = parts.split(":")
-    level_data = {}
-    for i in range(0, len(fields) - 1, 2):
-        level_data[fields[i]] = fields[i + 1]
+    with stage("fetch.parse", len(result)):
+        level_data = _parse_fields(result.split("#")[0])  # Remove hash/creator info
 
     # Decode the level string (base64 + gzip)
-    level_string_encoded = level_data.get("4", "")
-    if level_string_encoded:
-        try:
-            # URL-safe base64 decode
-            decoded = base64.urlsafe_b64decode(level_string_encoded + "==")
-            # Gzip decompress
-            level_string = zlib.decompress(decoded, 15 + 32).decode('utf-8', errors='ignore')
-        except (ValueError, zlib.error):
-            # Some levels might not be compressed
-            level_string = level_string_encoded
-        level_data["level_string"] = level_string
-
-    # Decode description (base64)
-    desc_encoded = level_data.get("3", "")
-    if desc_encoded:
-        try:
-            level_data["description"] = base64.urlsafe_b64decode(desc_encoded + "==").decode('utf-8', errors='ignore')
-        except (ValueError, UnicodeDecodeError):
-            level_data["description"] = desc_encoded
+    if level_data.get("4"):
+        level_data["level_string"] = decode_level_string(level_data["4"])
 
-    # Key mappings for convenience
-    level_data["name"] = level_data.get("2", "Unknown")
-    level_data["id"] = level_data.get("1", level_id)
+    return _add_convenience_keys(level_data, level_id)
+
+
+def get_level_info(level_id: int) -> dict:
+    """
+    Look up a level's metadata without downloading the level string.
+    Returns dict with 'name', 'description', 'version', 'objects', etc.
+    """
+    body = _post("getGJLevels21.php", {
+        "str": level_id,
+        "type": 0,  # A numeric search is an ID lookup, which also finds unlisted levels
+        "secret": SECRET,
+        "gameVersion": 22,
+        "binaryVersion": 42,
+        "gdw": 0,
+    })
+    result = body.decode('utf-8', errors='ignore')
+
+    if result == "-1" or not result.strip():
+        raise ValueError(f"Level {level_id} not found")
+
+    # Levels are separated by |, followed by #creators#songs#page info
+    level_data = _parse_fields(result.split("#")[0].split("|")[0])
+    if str(level_data.get("1")) != str(level_id):
+        raise ValueError(f"Level {level_id} not found")
+
+    level_data = _add_convenience_keys(level_data, level_id)
+    level_data["version"] = int(level_data.get("5", 0) or 0)
+    level_data["objects"] = int(level_data.get("45", 0) or 0)
+    level_data["downloads"] = int(level_data.get("10", 0) or 0)
+    return level_data
 
+
+def load_cached_level(level_id: int, info: dict) -> dict | None:
+    """A previously downloaded level, if it is still the version described by info."""
+    import json
+
+    try:
+        cached = json.loads((LEVEL_CACHE_DIR / f"{int(level_id)}.json").read_text())
+        if not isinstance(cached, dict) or cached.get("5") != info.get("5") or cached.get("3") != info.get("3"):
+            return None
+        level_string_encoded = (LEVEL_CACHE_DIR / f"{int(level_id)}.level").read_text()
+    except (json.JSONDecodeError, OSError):
+        return None
+
+    level_data = _add_convenience_keys(cached, level_id)
+    level_data["level_string"] = decode_level_string(level_string_encoded)
+    level_data["cached"] = True
+    return level_data
+
+
+def _store_cached_level(level_id: int, level_data: dict, level_file: Path | None = None):
+    """Cache a level's fields. The level string (field 4) is kept in its compact server form,
+    either taken from level_data or from level_file, a finished download written next to the cache.
+    """
+    import json
+
+    try:
+        LEVEL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        level_path = LEVEL_CACHE_DIR / f"{int(level_id)}.level"
+        if level_file is None:
+            level_file = LEVEL_CACHE_DIR / f"{int(level_id)}.level.tmp"
+            level_file.write_text(level_data.get("4", ""))
+        os.replace(level_file, level_path)
+
+        tmp_file = LEVEL_CACHE_DIR / f"{int(level_id)}.tmp"
+        tmp_file.write_text(json.dumps({key: level_data.get(key, "") for key in ("1", "2", "3", "5")}))
+        os.replace(tmp_file, LEVEL_CACHE_DIR / f"{int(level_id)}.json")
+    except OSError:
+        pass  # The cache is best effort
+
+
+class LevelStream:
+    """
+    A level download, read as it arrives.
+
+    fields holds the response fields that come before the level string (ID,
+    name, description) as soon as the object exists. Iterating yields the raw
+    level string in pieces, with base64 and gzip undone on the fly. The fields
+    after the level string are added to fields once iteration is done.
+
+    The level is cached like fetch_level does, the encoded level string is
+    written to the cache as it passes through.
+
+        with LevelStream(level_id) as level:
+            print(level.fields["name"])
+            for piece in level:
+                ...
+    """
+
+    def __init__(self, level_id: int, chunk_size: int = 1 << 16, cache: bool = True):
+        self.level_id = level_id
+        self.chunk_size = chunk_size
+        self.fields = {}
+        self._buffer = b""
+        self._has_level = False
+        self._cache_file = None
+        self._conn, self._response = _open("downloadGJLevel22.php", {
+            "levelID": level_id,
+            "secret": SECRET,
+            "gameVersion": 22,
+            "binaryVersion": 42,
+            "gdw": 0,
+            "inc": 1,
+            "extras": 0,
+        })
+        try:
+            self._read_fields()
+            if cache:
+                LEVEL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                self._cache_file = open(LEVEL_CACHE_DIR / f"{int(level_id)}.level.tmp", "wb")
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        """Drop the connection if the level wasn't read to the end."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        if self._cache_file is not None:
+            self._cache_file.close()
+            Path(self._cache_file.name).unlink(missing_ok=True)
+            self._cache_file = None
+
+    def _read(self) -> bool:
+        with stage("fetch.network") as st:
+            data = self._response.read1(self.chunk_size)
+            st.bytes = len(data)
+        self._buffer += data
+        return bool(data)
+
+    def _read_fields(self):
+        """Parse key:value pairs up to the level string key (4)."""
+        pos = 0
+        while True:
+            colon = self._buffer.find(b":", pos)
+            if colon < 0:
+                if self._read():
+                    continue
+                if self._buffer.strip() == b"-1" or not self.fields:
+                    raise ValueError(f"Level {self.level_id} not found")
+                break
+            key = self._buffer[pos:colon].decode('utf-8', errors='ignore')
+            if key == "4":  # The level string
+                pos = colon + 1
+                self._has_level = True
+                break
+
+            ends = [i for i in (self._buffer.find(b":", colon + 1), self._buffer.find(b"#", colon + 1)) if i >= 0]
+            if not ends:
+                if self._read():
+                    continue
+                ends = [len(self._buffer)]
+            end = min(ends)
+            self.fields[key] = self._buffer[colon + 1:end].decode('utf-8', errors='ignore')
+            pos = end + 1
+            if end == len(self._buffer) or self._buffer[end:end + 1] == b"#":
+                break
+        self._buffer = self._buffer[pos:]
+        _add_convenience_keys(self.fields, self.level_id)
+
+    def __iter__(self):
+        if self._conn is None:
+            raise ValueError("Level stream already consumed")
+        if not self._has_level:
+            self.close()
+            return
+
+        mode = None  # "gzip" for base64 + gzip, "raw" for a plain level string
+        pending = b""
+        inflate = zlib.decompressobj(15 + 32)
+        try:
+            while True:
+                ends = [i for i in (self._buffer.find(b":"), self._buffer.find(b"#")) if i >= 0]
+                end = min(ends) if ends else len(self._buffer)
+                piece, self._buffer = self._buffer[:end], self._buffer[end:]
+                if self._cache_file is not None:
+                    self._cache_file.write(piece)
+
+                pending += piece
+                if mode is None and len(pending) >= 4:
+                    mode = "gzip" if pending.startswith(b"H4sI") else "raw"
+                if mode == "raw":
+                    yield pending
+                    pending = b""
+                elif mode == "gzip":
+                    usable = len(pending) - len(pending) % 4
+                    with stage("fetch.gunzip", usable):
+                        out = inflate.decompress(base64.urlsafe_b64decode(pending[:usable]))
+                    pending = pending[usable:]
+                    if out:
+                        yield out
+
+                if ends or not self._read():
+                    break
+
+            # Whatever is left of the level string
+            if mode == "gzip" or (mode is None and pending.startswith(b"H4sI")):
+                out = inflate.decompress(base64.urlsafe_b64decode(pending + b"=" * (-len(pending) % 4)))
+                out += inflate.flush()
+                if not inflate.eof:
+                    raise ValueError("Invalid level: truncated level string")
+                if out:
+                    yield out
+            elif pending:
+                yield pending
+
+            # The fields after the level string
+            while self._read():
+                pass
+            trailing = self._buffer.split(b"#")[0].decode('utf-8', errors='ignore')
+            self.fields.update(_parse_fields(trailing.lstrip(":")))
+            self._response.read()  # Marks the response finished so the connection can be reused
+        except BaseException:
+            self.close()
+            raise
+
+        _release(self._conn, self._response)
+        self._conn = None
+        if self._cache_file is not None:
+            self._cache_file.close()
+            _store_cached_level(self.level_id, self.fields, Path(self._cache_file.name))
+            self._cache_file = None
+
+
+def fetch_level(level_id: int, info: dict | None = None) -> dict:
+    """
+    download_level, but skips the download if the cached copy is current.
+    The metadata probe costs a small request; pass info if you already have it.
+    """
+    if info is None:
+        try:
+            info = get_level_info(level_id)
+        except ValueError:
+            info = {}  # Not searchable, download it anyway
+    cached = load_cached_level(level_id, info) if info else None
+    if cached is not None:
+        return cached
+
+    level_data = download_level(level_id)
+    _store_cached_level(level_id, level_data)
     return level_data
 
 
@@ -98,7 +442,7 @@ def upload_level(
     gjp2: str,
     account_id: int,
     level_name: str,
-    level_string: str,
+    level_string: str | EncodedLevel,
     description: str = "",
     unlisted: bool = True,
 ) -> int:
@@ -106,18 +450,22 @@ def upload_level(
     Upload a level to GD servers.
     Returns the new level ID.
 
-    Note: This function is kept for reference but dashlib.uploadLevel is preferred.
+    Pass the EncodedLevel from an encoder to reuse its object count;
+    a plain level string has to be decompressed to count objects.
     """
-
-    # Decompress to get raw level string for obj count
-    if level_string.startswith('H4sI'):
-        compressed_bytes = base64.urlsafe_b64decode(level_string + '==')
-        raw_level = zlib.decompress(compressed_bytes, 15 + 32).decode('utf-8')
+    if isinstance(level_string, EncodedLevel):
+        level_encoded = level_string.level_string
+        obj_count = level_string.object_count
     else:
-        raw_level = level_string
+        # Decompress to get raw level string for obj count
+        if level_string.startswith('H4sI'):
+            compressed_bytes = base64.urlsafe_b64decode(level_string + '==')
+            raw_level = zlib.decompress(compressed_bytes, 15 + 32).decode('utf-8')
+        else:
+            raw_level = level_string
 
-    level_encoded = level_string
-    obj_count = raw_level.count(';')
+        level_encoded = level_string
+        obj_count = raw_level.count(';')
 
     # Encode description
     desc_encoded = base64.urlsafe_b64encode(description.encode()).decode()
@@ -135,7 +483,7 @@ def upload_level(
         level_length = 0  # Tiny
 
     # Level upload data
-    data = urllib.parse.urlencode({
+    fields = {
         "accountID": account_id,
         "gjp2": gjp2,
         "userName": username,
@@ -163,18 +511,14 @@ def upload_level(
         "gameVersion": 22,
         "binaryVersion": 42,
         "gdw": 0,
-    }).encode()
-
-    req = urllib.request.Request(f"{GD_URL}/uploadGJLevel21.php", data=data)
-    req.add_header("User-Agent", "")
+    }
 
-    with urllib.request.urlopen(req, timeout=60) as response:
-        result = response.read().decode()
+    result = _post("uploadGJLevel21.php", fields, timeout=60).decode()
 
     if result == "-1":
-        raise ValueError("Upload failed - invalid credentials or verification")
-    elif result.startswith("-"):
-        raise ValueError(f"Upload failed with error code: {result}")
+        raise ValueError("Invalid credentials or verification")
+    elif not result.isdigit():
+        raise ValueError(f"Server returned: {result}")
 
     return int(result)
 
@@ -212,19 +556,12 @@ def lookup_account_id(username: str) -> int:
     """
     Look up account ID by username using the getGJUsers endpoint.
     """
-    data = urllib.parse.urlencode({
+    result = _post("getGJUsers20.php", {
         "str": username,
         "secret": SECRET,
         "gameVersion": 22,
         "binaryVersion": 42,
-    }).encode()
-
-    req = urllib.request.Request(f"{GD_URL}/getGJUsers20.php", data=data)
-    req.add_header("User-Agent", "")
-    req.add_header("Content-Type", "application/x-www-form-urlencoded")
-
-    with urllib.request.urlopen(req, timeout=30) as response:
-        result = response.read().decode()
+    }).decode()
 
     if result == "-1" or not result.strip():
         raise ValueError(f"User '{username}' not found")
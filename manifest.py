@@ -0,0 +1,64 @@
+"""
+Manifest levels
+
+A manifest is a small level that says how to rebuild a file from other
+levels instead of holding the data itself. It is stored like any other file
+(method 6) under a name ending in SUFFIX, and its payload is JSON:
+
+    {"format": "gd-storage-manifest", "version": 1, "kind": "...", ...}
+
+The kind decides the remaining fields, see dedup.py for "chunks"
+and erasure.py for "erasure".
+"""
+import json
+
+FORMAT = "gd-storage-manifest"
+VERSION = 1
+SUFFIX = ".gdsm"
+
+
+def is_manifest(filename: str) -> bool:
+    return filename.endswith(SUFFIX)
+
+
+def dumps(kind: str, **fields) -> bytes:
+    return json.dumps({"format": FORMAT, "version": VERSION, "kind": kind, **fields}, separators=(",", ":")).encode()
+
+
+def loads(data) -> dict:
+    try:
+        manifest = json.loads(bytes(data))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError("Invalid manifest")
+    if not isinstance(manifest, dict) or manifest.get("format") != FORMAT:
+        raise ValueError("Invalid manifest")
+    if manifest.get("version") != VERSION:
+        raise ValueError(f"Unsupported manifest version: {manifest.get('version')}")
+    return manifest
+
+
+def resolve(filename: str, data: bytes, decode_func) -> tuple[str, bytes]:
+    """If the payload is a manifest level, rebuild the file it describes."""
+    if not is_manifest(filename):
+        return filename, data
+
+    info = loads(data)
+    if info["kind"] == "chunks":
+        import dedup
+
+        print(f"Manifest: {info['name']} in {len(info['chunks'])} chunks")
+        data, cached = dedup.assemble(info, decode_func)
+        print(f"Reused {cached} cached chunks, downloaded {len(info['chunks']) - cached}")
+        return info["name"], data
+    if info["kind"] == "erasure":
+        import erasure
+
+        print(f"Manifest: {info['name']} in {info['k']}+{info['m']} shards")
+        data, used, errors = erasure.assemble(info)
+        for index, error in sorted(errors.items()):
+            print(f"  Shard {index} (level {info['shards'][index][1]}) failed: {error}")
+        skipped = len(info["shards"]) - len(used) - len(errors)
+        print(f"Rebuilt from shards {', '.join(map(str, used))}"
+              + (f", didn't wait for {skipped} more" if skipped else ""))
+        return info["name"], data
+    raise ValueError(f"Unknown manifest kind: {info['kind']}")
@@ -1,18 +1,57 @@
-from .compression import compress_data, decompress_data
-from .method1_xy import encode as method1_encode, decode as method1_decode
-from .method2_raw_groups import encode as method2_encode, decode as method2_decode
-from .method3_base10000 import encode as method3_encode, decode as method3_decode
-from .method4_base64_groups import encode as method4_encode, decode as method4_decode
-from .method5_property31 import encode as method5_encode, decode as method5_decode
-from .method6_optimized import encode as method6_encode, decode as method6_decode
-
-METHODS = {
-    1: (method1_encode, method1_decode, "X/Y Coordinates - Unoptimized"),
-    2: (method2_encode, method2_decode, "Raw Groups - 1GB levels"),
-    3: (method3_encode, method3_decode, "Base 10000 - Slow"),
-    4: (method4_encode, method4_decode, "Base64 Groups - Stripped by GD"),
-    5: (method5_encode, method5_decode, "Property 31 - Doesn't work"),
-    6: (method6_encode, method6_decode, "Optimized Base 9999 - Best"),
+from collections.abc import Mapping
+from importlib import import_module
+
+# Method modules are only imported once selected - they pull in gdparse and zstandard
+_METHOD_MODULES = {
+    1: ("method1_xy", "X/Y Coordinates - Unoptimized"),
+    2: ("method2_raw_groups", "Raw Groups - 1GB levels"),
+    3: ("method3_base10000", "Base 10000 - Slow"),
+    4: ("method4_base64_groups", "Base64 Groups - Stripped by GD"),
+    5: ("method5_property31", "Property 31 - Doesn't work"),
+    6: ("method6_optimized", "Optimized Base 9999 - Best"),
 }
 
+
+class MethodRegistry(Mapping):
+    """Maps method number -> (encode, decode, description), importing lazily."""
+
+    def __init__(self, modules: dict):
+        self._modules = modules
+        self._loaded = {}
+
+    def __getitem__(self, num):
+        if num not in self._loaded:
+            module = self.module(num)
+            self._loaded[num] = (module.encode, module.decode, self.description(num))
+        return self._loaded[num]
+
+    def __iter__(self):
+        return iter(self._modules)
+
+    def __len__(self):
+        return len(self._modules)
+
+    def module(self, num):
+        """Import and return the module implementing a method."""
+        module_name, _ = self._modules[num]
+        return import_module(f".{module_name}", __name__)
+
+    def description(self, num) -> str:
+        """Describe a method without importing it."""
+        return self._modules[num][1]
+
+
+METHODS = MethodRegistry(_METHOD_MODULES)
+
 DEFAULT_METHOD = 6
+
+
+def __getattr__(name):
+    # Keep the old eager re-exports (compress_data, method6_encode, ...) working
+    if name in ("compress_data", "decompress_data"):
+        from . import compression
+        return getattr(compression, name)
+    for num, (module_name, _) in _METHOD_MODULES.items():
+        if name in (f"method{num}_encode", f"method{num}_decode"):
+            return getattr(METHODS.module(num), name.rsplit("_", 1)[1])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,76 @@
+"""
+Buffer helpers shared by the encoders
+"""
+import hashlib
+import mmap
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+from profiling import stage
+
+# Smaller files are simply read, mapping them isn't worth the syscalls
+MMAP_THRESHOLD = 1 << 20
+CHUNK_SIZE = 4 << 20  # Multiple of the page size, see iter_chunks
+
+
+def as_view(data) -> memoryview:
+    """Flat byte view of any buffer-protocol object, without copying it."""
+    view = memoryview(data)
+    if view.format != 'B' or view.ndim != 1:
+        view = view.cast('B')
+    return view
+
+
+def iter_chunks(view: memoryview, chunk_size: int = CHUNK_SIZE):
+    """Yield consecutive slices of a view.
+
+    If the view covers a whole mmap'd file, pages are dropped from this
+    process once their chunk is consumed, so reading a large file front to
+    back never holds more than one chunk resident.
+    """
+    source = view.obj
+    drop = (
+        isinstance(source, mmap.mmap) and len(view) == len(source)
+        and hasattr(mmap, "MADV_DONTNEED")
+    )
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size]
+        if drop:
+            source.madvise(mmap.MADV_DONTNEED, start, min(chunk_size, len(view) - start))
+
+
+def sha256_hex(view: memoryview) -> str:
+    hasher = hashlib.sha256()
+    for chunk in iter_chunks(view):
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+@contextmanager
+def open_input(filepath: str | Path):
+    """Yield a file's contents as a buffer.
+
+    Large files are memory-mapped read-only, so zstd and the base conversion
+    read straight from the page cache instead of a heap copy of the file.
+    """
+    size = os.path.getsize(filepath)
+    if size < MMAP_THRESHOLD:
+        with stage("encode.read", size):
+            data = Path(filepath).read_bytes()
+        yield data
+        return
+
+    with open(filepath, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mapped, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+        mapped.madvise(mmap.MADV_SEQUENTIAL)  # Read ahead and drop behind
+    view = memoryview(mapped)
+    try:
+        yield view
+    finally:
+        view.release()
+        try:
+            mapped.close()
+        except BufferError:
+            pass  # A view is still referenced (e.g. by a traceback), closed when collected
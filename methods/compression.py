@@ -1,10 +1,55 @@
 import zstandard as zstd
 
+from .buffers import as_view, iter_chunks
+
+COMPRESSION_LEVEL = 19
+
+
 def compress_data(data: bytes) -> bytes:
-    compressor = zstd.ZstdCompressor(level=19)
+    compressor = zstd.ZstdCompressor(level=COMPRESSION_LEVEL)
     return compressor.compress(data)
 
 
+def compress_parts(*parts) -> bytes:
+    """Compress the concatenation of several buffers without joining them first."""
+    compressor = zstd.ZstdCompressor(level=COMPRESSION_LEVEL)
+    # Pledge the size so the frame header records it, decompress_data needs it
+    stream = compressor.compressobj(size=sum(len(p) for p in parts))
+    out = []
+    for part in parts:
+        for chunk in iter_chunks(as_view(part)):
+            out.append(stream.compress(chunk))
+    out.append(stream.flush())
+    return b"".join(out)
+
+
 def decompress_data(data: bytes) -> bytes:
     decompressor = zstd.ZstdDecompressor()
     return decompressor.decompress(data)
+
+
+def is_compressed(data) -> bool:
+    """Whether data starts with a zstd frame."""
+    return bytes(data[:4]) == zstd.FRAME_HEADER
+
+
+def decompressed_size(data) -> int:
+    """Size recorded in the frame header, -1 if unknown."""
+    return zstd.frame_content_size(data)
+
+
+def decompress_stream(pieces):
+    """Decompress a frame arriving in pieces, yielding output as it becomes available."""
+    decompressor = zstd.ZstdDecompressor().decompressobj()
+    for piece in pieces:
+        out = decompressor.decompress(piece)
+        if out:
+            yield out
+    if not decompressor.eof:
+        raise ValueError("Invalid data: truncated payload")
+
+
+def decompress_reader(data):
+    """File-like reader (read/readinto) over the decompressed data."""
+    decompressor = zstd.ZstdDecompressor()
+    return decompressor.stream_reader(data)
@@ -0,0 +1,77 @@
+"""
+Codec core for methods 1-5
+
+The legacy methods all lay out objects the same way and read the same few
+properties back, so that part lives here:
+
+- encoding builds every object's text in one list and joins it once, in the
+  exact layout GDLevel/LevelObject.create_block serialize to
+- decoding reads properties straight from the level text. gdparse would
+  turn a 1- or 2-group value like "12.34" into an int or float, and it
+  builds an object per block, which made method 1 take seconds per MB
+- groups are parsed into array buffers, not lists of Python ints
+"""
+from array import array
+from functools import lru_cache
+
+from profiling import stage
+
+BLOCK_ID = 211
+
+_TEXT = [str(i) for i in range(10000)]  # Group values are at most 9999
+
+
+@lru_cache(maxsize=None)
+def level_header() -> str:
+    """The header (colors) GDLevel.create_empty() serializes to, before the first ';'."""
+    from gdparse import GDLevel
+
+    return GDLevel.create_empty().serialize().split(";", 1)[0]
+
+
+def block(x: int, y: int, key: int | None = None, value: str = "") -> str:
+    """Object text of LevelObject.create_block(BLOCK_ID, x, y), optionally with one more property."""
+    if key is None:
+        return f"1,{BLOCK_ID},2,{x},3,{y}"
+    return f"1,{BLOCK_ID},2,{x},3,{y},{key},{value}"
+
+
+def join_groups(values) -> str:
+    """Group property text ("1.2.3") from ints (a byte buffer works too)."""
+    return ".".join(map(_TEXT.__getitem__, values))
+
+
+def build_level(objects: list[str]) -> str:
+    """Level string from object texts."""
+    with stage("encode.serialize") as st:
+        level_string = f"{level_header()};{';'.join(objects)};"
+        st.bytes = len(level_string)
+    return level_string
+
+
+def read_properties(level_string: str, *keys: int, default: str = "") -> list[list[str]]:
+    """Each key's value in every object, in object order (default where an object lacks it)."""
+    keys = [str(key) for key in keys]
+    columns = [[] for _ in keys]
+    with stage("decode.parse", len(level_string)):
+        for obj in level_string.split(";")[1:]:  # The level header comes first
+            if not obj:
+                continue
+            fields = obj.split(",")
+            props = dict(zip(fields[::2], fields[1::2]))
+            for key, column in zip(keys, columns):
+                column.append(props.get(key, default))
+    return columns
+
+
+def read_groups(level_string: str, typecode: str = "H") -> array:
+    """Every object's groups (property 57), one after another, in an array of typecode."""
+    (values,) = read_properties(level_string, 57)
+    groups = array(typecode)
+    try:
+        for text in values:
+            if text:
+                groups.extend(map(int, text.split(".")))
+    except (ValueError, OverflowError):
+        raise ValueError("Invalid level: bad group value")
+    return groups
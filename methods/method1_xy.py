@@ -8,74 +8,74 @@ Encodes each byte pair as X and Y coordinates of objects.
 
 While this did technically work - I didn't bother actually testing it as it was too unoptimized
 """
-from gdparse import GDLevel, LevelObject
 from pathlib import Path
+import time
 from .compression import compress_data, decompress_data
+from .buffers import as_view, open_input, sha256_hex
+from .core import block, build_level, read_properties
+from .result import EncodedLevel
 
-BLOCK_ID = 211
 
-
-def encode(filepath: str | Path, skip_compression: bool = False) -> str:
+def encode(filepath: str | Path, skip_compression: bool = False) -> EncodedLevel:
     filepath = Path(filepath)
-    raw_data = filepath.read_bytes()
+    with open_input(filepath) as data:
+        return encode_bytes(data, filepath.name, skip_compression)
+
+
+def encode_bytes(data, filename: str = "", skip_compression: bool = False) -> EncodedLevel:
+    """Encode an in-memory payload (any buffer, not copied). This method doesn't store the filename."""
+    start_time = time.perf_counter()
+    raw_data = as_view(data)
 
     compressed = compress_data(raw_data) if not skip_compression else raw_data
 
     print(f"Original: {len(raw_data)} bytes")
     print(f"Compressed: {len(compressed)} bytes ({len(compressed)/len(raw_data)*100:.1f}%)")
 
-    # Create empty level
-    level = GDLevel.create_empty()
-
     # Encode each byte as an object
     # Go through the bytes two by two - X being the first byte and y being the second
-    for i in range(0, len(compressed) - len(compressed) % 2, 2):
-        byte1 = compressed[i]
-        byte2 = compressed[i+1]
-        obj = LevelObject.create_block(
-            block_id=BLOCK_ID,
-            x=byte1,
-            y=byte2,
-        )
-        level.add_object(obj)
+    view = as_view(compressed)
+    objects = [block(x, y) for x, y in zip(view[0::2], view[1::2])]
     # Check if the last byte doesn't have a pair - in which case it has -1 as the y for the decoder
-    if len(compressed) % 2 == 1:
-        obj = LevelObject.create_block(
-            block_id=BLOCK_ID,
-            x=compressed[len(compressed) - 1],
-            y=-1
-        )
-        level.add_object(obj)
+    if len(view) % 2 == 1:
+        objects.append(block(view[-1], -1))
 
     print(f"Objects created: {len(compressed)}")
 
-    return level.serialize()
+    return EncodedLevel(
+        level_string=build_level(objects),
+        method=1,
+        object_count=len(objects),
+        raw_size=len(raw_data),
+        compressed_size=len(compressed),
+        payload_hash=sha256_hex(raw_data),
+        encode_time=time.perf_counter() - start_time,
+    )
 
 # While this did technically work - I didn't bother actually testing it as it was too unoptimized
 
 
 def decode(level_string: str, skip_decompression: bool = False) -> bytes:
 
-    level = GDLevel(level_string)
-
-    compressed_bytes = []
-
     # Extract byte value from X and Y
-
-    for obj in level.objects:
-        x = obj.properties.get(2, 0)
-        y = obj.properties.get(3, 0)
-
-        compressed_bytes.append(x)
-
-        if y != -1:
-            compressed_bytes.append(y)
-
-    compressed = bytes(compressed_bytes)
+    xs, ys = read_properties(level_string, 2, 3, default="0")
+
+    try:
+        # Every object holds 2 bytes, except one with Y = -1 at the end
+        single = bool(ys) and ys[-1] == "-1"
+        if single:
+            ys[-1] = "0"
+        compressed = bytearray(2 * len(xs))
+        compressed[0::2] = bytes(map(int, xs))
+        compressed[1::2] = bytes(map(int, ys))
+    except ValueError:
+        raise ValueError("Invalid level: X/Y positions aren't bytes")
+    if single:
+        del compressed[-1]
 
     # Decompress
     if not skip_decompression:
         return decompress_data(compressed)
-    return compressed
+    return bytes(compressed)
 
 #  ^ This is for the unoptimized version
@@ -9,31 +9,49 @@ Geometry Dash took longer to load in general and the game crashed when you tried
 But the level preserved! So technically it worked...?
 Obviously storing raw data wasn't gonna be space or time efficient
 """
-from gdparse import GDLevel, LevelObject
 from pathlib import Path
+import time
 from .compression import compress_data, decompress_data
+from .buffers import as_view, open_input, sha256_hex
+from .core import block, build_level, join_groups, read_groups
+from .result import EncodedLevel
+from profiling import stage
 
-BLOCK_ID = 211
 CHUNK_SIZE = 9999
 
 
-def encode(filepath: str | Path, skip_compression: bool = False) -> str:
+def encode(filepath: str | Path, skip_compression: bool = False) -> EncodedLevel:
+    filepath = Path(filepath)
+    with open_input(filepath) as data:
+        return encode_bytes(data, filepath.name, skip_compression)
+
+
+def encode_bytes(data, filename: str = "", skip_compression: bool = False) -> EncodedLevel:
+    """Encode an in-memory payload (any buffer, not copied). This method doesn't store the filename."""
     # This one might work... Geometry Dash doesn't check
     # for repeating groups inside objects when loading the level
-    filepath = Path(filepath)
-    data = filepath.read_bytes()
+    start_time = time.perf_counter()
+    file_data = as_view(data)
+    data = file_data
     if not skip_compression:
         data=compress_data(data)
-    chunks = [data[i:i+CHUNK_SIZE] for i in range (0, len(data), CHUNK_SIZE)]
-    level = GDLevel.create_empty()
-    for i, chunk in enumerate(chunks):
-        #Convert chunk bytes to groups string
-        groups_str = '.'.join(str(b) for b in chunk)
-        obj = LevelObject.create_block(block_id=BLOCK_ID, x=i*10, y=0)
-        obj.properties[57]=groups_str
-        level.add_object(obj)
+    view = as_view(data)
+    with stage("encode.packing", len(view)):
+        # Chunk bytes straight to groups strings
+        objects = [
+            block(i * 10, 0, 57, join_groups(view[start:start + CHUNK_SIZE]))
+            for i, start in enumerate(range(0, len(view), CHUNK_SIZE))
+        ]
 
-    return level.serialize()
+    return EncodedLevel(
+        level_string=build_level(objects),
+        method=2,
+        object_count=len(objects),
+        raw_size=len(file_data),
+        compressed_size=len(data),
+        payload_hash=sha256_hex(file_data),
+        encode_time=time.perf_counter() - start_time,
+    )
 
 # ^ This worked! YAY - But the level was ~1GB, and while it did load
 # Geometry Dash took longer to load in general and the game crashed when you tried to close it
@@ -42,15 +60,8 @@ def encode(filepath: str | Path, skip_compression: bool = False) -> str:
 
 
 def decode(level_string: str, skip_decompression: bool = False) -> bytes:
-    level = GDLevel(level_string)
-
-    group_data=[]
-
-    for obj in level.objects:
-        object_groups=obj.properties.get(57).split('.')
-        byte_values= [int(x) for x in object_groups]
-        group_data.extend(byte_values)
-    data = bytes(group_data)
+    # Every group is one byte
+    data = read_groups(level_string, "B").tobytes()
     if not skip_decompression:
         data = decompress_data(data)
 
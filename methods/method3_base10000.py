@@ -9,66 +9,92 @@ Also - the time to process this is insanely long - simply not worth it
 
 Python big int division is O(n^2), so smaller chunks = faster
 """
-from gdparse import GDLevel, LevelObject
 from pathlib import Path
+import time
 from .compression import compress_data, decompress_data
+from .buffers import as_view, open_input, sha256_hex
+from .core import block, build_level, read_properties
+from .result import EncodedLevel
+from profiling import stage
 
-BLOCK_ID = 211
 BASE10000_CHUNK = 256  # bytes per chunk
 
 
-def encode(filepath: str | Path, skip_compression: bool = False) -> str:
+def encode(filepath: str | Path, skip_compression: bool = False) -> EncodedLevel:
+    filepath = Path(filepath)
+    with open_input(filepath) as data:
+        return encode_bytes(data, filepath.name, skip_compression)
+
+
+def encode_bytes(data, filename: str = "", skip_compression: bool = False) -> EncodedLevel:
+    """Encode an in-memory payload (any buffer, not copied). This method doesn't store the filename."""
     # Let's try using Base 10000
     # There are 9999 groups - we only used the first 255
-    filepath = Path(filepath)
-    data = filepath.read_bytes()
+    start_time = time.perf_counter()
+    file_data = as_view(data)
+    data = file_data
     if not skip_compression:
         data=compress_data(data)
-    level = GDLevel.create_empty()
-    for i in range(0, len(data), BASE10000_CHUNK):
-        chunk = data[i:i + BASE10000_CHUNK]
-
-        # Convert Bytes to Base 10000
-        big_int = int.from_bytes(chunk, 'big')
-        groups=[]
-        while big_int > 0:
-            groups.append(big_int % 10000)
-            big_int //= 10000
-        groups = list(reversed(groups)) or [0]
-
-        #Store chunk length as first group
-        groups = [len(chunk)] + groups
-
-        groups_str = '.'.join(str(g) for g in groups)
-        obj = LevelObject.create_block(block_id=BLOCK_ID, x=i*30, y=0)
-        obj.properties[57] = groups_str
-        level.add_object(obj)
-
-    return level.serialize()
+    view = as_view(data)
+    objects = []
+    with stage("encode.base_convert", len(view)):
+        for i in range(0, len(view), BASE10000_CHUNK):
+            chunk = view[i:i + BASE10000_CHUNK]
+            #Store chunk length as first group
+            groups_str = f"{len(chunk)}.{to_base10000(chunk)}"
+            objects.append(block(i * 30, 0, 57, groups_str))
+
+    return EncodedLevel(
+        level_string=build_level(objects),
+        method=3,
+        object_count=len(objects),
+        raw_size=len(file_data),
+        compressed_size=len(data),
+        payload_hash=sha256_hex(file_data),
+        encode_time=time.perf_counter() - start_time,
+    )
 
 
 # So this helps - not by a lot but it does make the level smaller - but not small enough
 # Also - the time to process this is insanely long - simply not worth it
 
 
-def decode(level_string: str, skip_decompression: bool = False) -> bytes:
-    level = GDLevel(level_string)
-    result = b''
+def to_base10000(chunk) -> str:
+    """Bytes (big endian number) -> base 10000 digits as group text, most significant first.
 
-    for obj in level.objects:
-        groups = [int(g) for g in obj.properties.get(57).split('.')]
-        chunk_len = groups[0]
-        groups = groups[1:]
+    A base 10000 digit is exactly 4 decimal digits, so the decimal string is
+    cut up instead of dividing the big int by 10000 over and over.
+    """
+    digits = str(int.from_bytes(chunk, 'big'))
+    digits = digits.zfill(-(-len(digits) // 4) * 4)
+    return ".".join([str(int(digits[i:i + 4])) for i in range(0, len(digits), 4)])
 
-        big_int = 0
-        for g in groups:
-            big_int = big_int * 10000 + g
 
-        result += big_int.to_bytes(chunk_len, 'big')
+def from_base10000(groups_str: str, size: int) -> bytes:
+    """Inverse of to_base10000(): group text -> size bytes."""
+    digits = "".join([g.zfill(4) for g in groups_str.split('.')])
+    return int(digits).to_bytes(size, 'big')
 
-    if not skip_decompression:
-        result = decompress_data(result)
 
-    return result
+def decode(level_string: str, skip_decompression: bool = False) -> bytes:
+    (values,) = read_properties(level_string, 57)
+
+    # The first group of every object is its chunk length, so the output size is known up front
+    try:
+        chunks = [text.split('.', 1) for text in values]
+        sizes = [int(chunk_len) for chunk_len, _ in chunks]
+    except ValueError:
+        raise ValueError("Invalid level: no chunk length in an object")
+
+    result = bytearray(sum(sizes))
+    with stage("decode.base_convert", len(result)):
+        position = 0
+        for (_, groups_str), size in zip(chunks, sizes):
+            result[position:position + size] = from_base10000(groups_str, size)
+            position += size
+
+    if not skip_decompression:
+        return decompress_data(result)
+    return bytes(result)
 
 # ^ This is for the group method using Base10000 for storing
@@ -5,40 +5,53 @@ Stores base64 encoded data in property 31 (text property) of a single object.
 
 Now I didn't know why I thought this would work but - it didn't...
 """
-from gdparse import GDLevel, LevelObject
 from pathlib import Path
+import time
 import base64
 from .compression import compress_data, decompress_data
+from .buffers import as_view, open_input, sha256_hex
+from .core import block, build_level, read_properties
+from .result import EncodedLevel
 
-BLOCK_ID = 211
 
-
-def encode(filepath: str | Path, skip_compression: bool = False) -> str:
+def encode(filepath: str | Path, skip_compression: bool = False) -> EncodedLevel:
     filepath = Path(filepath)
-    data = filepath.read_bytes()
+    with open_input(filepath) as data:
+        return encode_bytes(data, filepath.name, skip_compression)
+
+
+def encode_bytes(data, filename: str = "", skip_compression: bool = False) -> EncodedLevel:
+    """Encode an in-memory payload (any buffer, not copied). This method doesn't store the filename."""
+    start_time = time.perf_counter()
+    file_data = as_view(data)
+    data = file_data
     if not skip_compression:
         data = compress_data(data)
 
     # Encode file in Base64
     b64_string = base64.b64encode(data).decode('ascii')
-    level = GDLevel.create_empty()
-
-    # Create a single object
-    obj = LevelObject.create_block(block_id=BLOCK_ID, x=0, y=0)
 
     # Add the whole data inside a single objects string
-    obj.properties[31] = b64_string
-    level.add_object(obj)
-
-    return level.serialize()
+    objects = [block(0, 0, 31, b64_string)]
+
+    return EncodedLevel(
+        level_string=build_level(objects),
+        method=5,
+        object_count=len(objects),
+        raw_size=len(file_data),
+        compressed_size=len(data),
+        payload_hash=sha256_hex(file_data),
+        encode_time=time.perf_counter() - start_time,
+    )
 
 # Now I didn't know why I thought this would work but - it didn't...
 
 
 def decode(level_string: str, skip_decompression: bool = False) -> bytes:
-    level = GDLevel(level_string)
-
-    b64_string = level.objects[0].properties.get(31)
+    (values,) = read_properties(level_string, 31)
+    if not values:
+        raise ValueError("Invalid level: no objects")
+    b64_string = values[0]
     data = base64.b64decode(b64_string)
 
     if not skip_decompression:
@@ -20,142 +20,367 @@ What else was fixed in this version:
 - Repeating groups was removed
 - If an object can have at most two groups, only make it have one and add the other one to the next object
 - This is because if it only has two groups it is interpreted as a float and ultimately corrupts the image
+- plan_objects() borrows a group from the object before instead, so no extra object is needed
 - Added compression directly inside here for uploading - instead of relying on Geometry Dash to compress it
 """
 from gdparse import GDLevel, LevelObject
 from pathlib import Path
-from .compression import compress_data, decompress_data
+from .compression import (
+    compress_parts, decompress_data, decompressed_size, decompress_reader, decompress_stream, is_compressed,
+)
+from .buffers import as_view, open_input, sha256_hex
+from .result import EncodedLevel
+from deflate import GZIP_BLOCK, gzip_parallel
+from profiling import count, stage
 import gzip
 import base64
+import time
+import zlib
 
 BLOCK_ID = 211
 GROUPS_PER_OBJECT = 10  # GD truncates groups beyond 10 when saving in the editor!
+MAX_LENGTH = 9999 * 9999 - 1  # Largest payload the 2 length groups can hold
+GZIP_LEVEL = 9                # Outer gzip of the level string, same as gzip.compress
+GZIP_BLOCK_SIZE = GZIP_BLOCK  # Level string bytes per thread's block
+GZIP_THREADS = None           # None: one per CPU, or 1 in a process pool worker (the pool already fills the CPUs)
 
 
-def encode(filepath: str | Path, skip_compression: bool = False) -> str:
-    # Let's instead process 8 bytes at a time
+def encode(filepath: str | Path, skip_compression: bool = False, compact: bool = False) -> EncodedLevel:
     filepath = Path(filepath)
-    file_data = filepath.read_bytes()
+    with open_input(filepath) as file_data:
+        return encode_bytes(file_data, filepath.name, skip_compression, compact)
+
+
+def encode_bytes(data, filename: str, skip_compression: bool = False, compact: bool = False) -> EncodedLevel:
+    """Encode an in-memory payload (bytes, bytearray, memoryview, mmap...) without copying it.
+
+    compact leaves out the object positions and tunes the outer gzip for the
+    group digits, see _gzip_level. It decodes the same way.
+    """
+    # Let's instead process 8 bytes at a time
+    start_time = time.perf_counter()
+    file_data = as_view(data)
 
     # Prepend filename (1 byte length + filename bytes) before compression
-    filename = filepath.name.encode('utf-8')
+    filename = filename.encode('utf-8')
     if len(filename) > 255:
         filename = filename[:255]
-    data = bytes([len(filename)]) + filename + file_data
+    prefix = bytes([len(filename)]) + filename
 
     if not skip_compression:
-        data = compress_data(data)
+        with stage("encode.zstd", len(prefix) + len(file_data)):
+            parts = [compress_parts(prefix, file_data)]
+    else:
+        # Fill up the prefix's 8-byte chunk from the file so the rest is chunk aligned
+        head = (8 - len(prefix) % 8) % 8
+        parts = [prefix + file_data[:head], file_data[head:]]
+    length = sum(len(p) for p in parts)
+    if length > MAX_LENGTH:
+        raise ValueError(f"Too large for one level: {length:,} byte payload, the limit is {MAX_LENGTH:,}")
+
     all_groups = []
     # Process 8 bytes at a time
-    for i in range(0, len(data), 8):
-        chunk = data[i:i+8]
-
-        if len(chunk) < 8:
-            chunk = chunk.ljust(8, b'\x00')
-
-        num = int.from_bytes(chunk, 'big')
-        chunk_groups = []
-        while num > 0:
-            chunk_groups.append((num % 9999) + 1)  # 1-9999 instead of 0-9999
-            num //= 9999
-        # Pad to exactly 5 groups (8 bytes = max 5 base-9999 digits)
-        while len(chunk_groups) < 5:
-            chunk_groups.append(1)  # Use 1 as padding (represents 0)
-        all_groups.extend(reversed(chunk_groups))
-
-    # Store original length as first 2 groups (base 9999, supports up to ~99MB)
+    with stage("encode.base_convert", length):
+        for data in parts:
+            for i in range(0, len(data), 8):
+                chunk = data[i:i+8]
+
+                if len(chunk) < 8:
+                    chunk = bytes(chunk).ljust(8, b'\x00')
+
+                num = int.from_bytes(chunk, 'big')
+                chunk_groups = []
+                while num > 0:
+                    chunk_groups.append((num % 9999) + 1)  # 1-9999 instead of 0-9999
+                    num //= 9999
+                # Pad to exactly 5 groups (8 bytes = max 5 base-9999 digits)
+                while len(chunk_groups) < 5:
+                    chunk_groups.append(1)  # Use 1 as padding (represents 0)
+                all_groups.extend(reversed(chunk_groups))
+
+    # Store original length as first 2 groups (base 9999, up to MAX_LENGTH)
     # This keeps all group values within 1-9999
-    length = len(data)
     len_high = (length // 9999) + 1  # High part (1-9999)
     len_low = (length % 9999) + 1    # Low part (1-9999)
     all_groups = [len_high, len_low] + all_groups
 
-    level = GDLevel.create_empty()
-    obj_index = 0
-    current_obj_groups = []
-    current_obj_set = set()  # Track groups in current object to avoid duplicates
-
-    for group in all_groups:
-        # If this group already exists in current object, or we hit the limit, start new object
-        if group in current_obj_set or len(current_obj_groups) >= GROUPS_PER_OBJECT:
-            # Would this create a 2-group object? (GD parses "X.Y" as float and corrupts it)
-            if len(current_obj_groups) == 2:
-                # Only save first group, push second to next object
-                first_group = current_obj_groups[0]
-                second_group = current_obj_groups[1]
-
-                groups_str = str(first_group)
-                obj = LevelObject.create_block(block_id=BLOCK_ID, x=obj_index * 30, y=0)
-                obj.properties[57] = groups_str
-                level.add_object(obj)
-                obj_index += 1
-
-                # Start new object with the pushed second group
-                current_obj_groups = [second_group]
-                current_obj_set = {second_group}
+    with stage("encode.packing", length):
+        level = GDLevel.create_empty()
+        position = 0
+        for size in plan_objects(all_groups):
+            if compact:
+                # Only the block ID and the groups, every object at the origin
+                obj = LevelObject(f"1,{BLOCK_ID}")
             else:
-                # Save current object normally
-                if current_obj_groups:
-                    groups_str = '.'.join(str(g) for g in current_obj_groups)
-                    obj = LevelObject.create_block(block_id=BLOCK_ID, x=obj_index * 30, y=0)
-                    obj.properties[57] = groups_str
-                    level.add_object(obj)
-                    obj_index += 1
-                # Start new object
-                current_obj_groups = []
-                current_obj_set = set()
-
-        # Check again - the pushed group might conflict with the new group
-        if group in current_obj_set:
-            # Save the single pushed group and start fresh
-            if current_obj_groups:
-                groups_str = '.'.join(str(g) for g in current_obj_groups)
-                obj = LevelObject.create_block(block_id=BLOCK_ID, x=obj_index * 30, y=0)
-                obj.properties[57] = groups_str
-                level.add_object(obj)
-                obj_index += 1
-            current_obj_groups = []
-            current_obj_set = set()
-
-        current_obj_groups.append(group)
-        current_obj_set.add(group)
-
-    # Don't forget the last object
-    if current_obj_groups:
-        groups_str = '.'.join(str(g) for g in current_obj_groups)
-        obj = LevelObject.create_block(block_id=BLOCK_ID, x=obj_index * 30, y=0)
-        obj.properties[57] = groups_str
-        level.add_object(obj)
+                obj = LevelObject.create_block(block_id=BLOCK_ID, x=len(level.objects) * 30, y=0)
+            obj.properties[57] = '.'.join(map(str, all_groups[position:position + size]))
+            level.add_object(obj)
+            position += size
+    count("encode.groups", len(all_groups))
+    count("encode.objects", len(level.objects))
 
     # Serialize and compress to GD's expected format (gzip + base64)
-    raw_level = level.serialize()
-    compressed = gzip.compress(raw_level.encode('utf-8'))
-    return base64.urlsafe_b64encode(compressed).decode('ascii').rstrip('=')
+    with stage("encode.serialize") as st:
+        raw_level = level.serialize().encode('utf-8')
+        st.bytes = len(raw_level)
+    with stage("encode.gzip", len(raw_level)):
+        compressed = _gzip_level(raw_level, compact)
+    with stage("encode.base64", len(compressed)):
+        level_string = base64.urlsafe_b64encode(compressed).decode('ascii').rstrip('=')
+    return EncodedLevel(
+        level_string=level_string,
+        method=6,
+        object_count=len(level.objects),
+        group_count=len(all_groups),
+        raw_size=len(file_data),
+        compressed_size=length,
+        payload_hash=sha256_hex(file_data),
+        encode_time=time.perf_counter() - start_time,
+    )
 
 # 8 byte processing is way faster
 # Faster rendering & smaller (~13%)
 # Also, group 0 doesn't exist. I don't really use the GD Editor...
 
 
+def plan_objects(groups: list[int]) -> list[int]:
+    """Split the groups into objects. Returns the object sizes, in order.
+
+    Every object holds 1 or 3-10 consecutive groups with no repeats. Taking
+    as many groups as possible each time gives the fewest objects, except
+    that 2-group objects aren't allowed: instead of cutting those down to
+    one group (an extra object every time), the object before lends its last
+    groups so this one gets 3 or more. Whenever that works the count is the
+    minimum possible, on real payloads it nearly always does.
+    """
+    sizes = []
+    n = len(groups)
+    i = 0
+    while i < n:
+        window = groups[i:i + GROUPS_PER_OBJECT]
+        size = len(window)
+        if len(set(window)) != size:
+            # Stop before the first repeat
+            seen = set()
+            size = 0
+            for group in window:
+                if group in seen:
+                    break
+                seen.add(group)
+                size += 1
+
+        if size == 2:
+            size = 1  # If nothing can be borrowed
+            if sizes:
+                previous = sizes[-1]
+                for lend in range(1, min(previous, GROUPS_PER_OBJECT - 1)):
+                    if previous - lend == 2:
+                        continue
+                    borrowed = groups[i - lend:i + 2]
+                    if len(set(borrowed)) != len(borrowed):
+                        break  # Lending more would keep the repeat
+                    sizes[-1] = previous - lend
+                    i -= lend
+                    size = lend + 2
+                    break
+
+        sizes.append(size)
+        i += size
+    return sizes
+
+
+def _gzip_level(raw_level: bytes, compact: bool = False) -> bytes:
+    """gzip a serialized level, in blocks on several threads (see deflate.gzip_parallel).
+
+    Compact levels use Z_FILTERED, which favours Huffman coding over the
+    short, mostly useless matches between random group digits and saves
+    ~5-10%.
+    """
+    from multiprocessing import parent_process
+
+    threads = GZIP_THREADS
+    if threads is None and parent_process() is not None:
+        threads = 1  # Batch encodes, the daemon and dedup run one worker per CPU, don't multiply that
+    if compact:
+        return gzip_parallel(raw_level, GZIP_LEVEL, GZIP_BLOCK_SIZE, threads, zlib.Z_FILTERED, 9)
+    return gzip_parallel(raw_level, GZIP_LEVEL, GZIP_BLOCK_SIZE, threads)
+
+
 def decode(level_string: str, skip_decompression: bool = False) -> tuple[str, bytes]:
     """Decode a level string back to (filename, data)."""
+    result = _decode_payload(level_string)
+
+    # Payloads encoded with skip_compression (e.g. archives) start with the filename, not a zstd frame
+    if not skip_decompression and is_compressed(result):
+        with stage("decode.zstd", len(result)) as st:
+            result = decompress_data(result)
+            st.bytes = len(result)
+
+    filename, offset = _split_filename(result)
+    file_data = result[offset:]
+
+    return filename, file_data
+
+
+def decode_into(level_string: str, writable, skip_decompression: bool = False) -> tuple[str, int]:
+    """Decode a level string straight into a writable buffer (bytearray, memoryview, mmap...).
+
+    Returns (filename, bytes written). Raises ValueError if the buffer is too small.
+    """
+    payload = _decode_payload(level_string)
+    target = as_view(writable)
+
+    if skip_decompression or not is_compressed(payload):
+        filename, offset = _split_filename(payload)
+        size = len(payload) - offset
+        if size > len(target):
+            raise ValueError(f"Buffer too small: need {size:,} bytes")
+        target[:size] = memoryview(payload)[offset:]
+        return filename, size
+
+    total = decompressed_size(payload)
+    if total < 1:
+        raise ValueError("Invalid data: unknown decompressed size")
+
+    with stage("decode.zstd", len(payload)) as st:
+        reader = decompress_reader(payload)
+        filename_len = _read_exact(reader, 1)[0]
+        filename = _read_exact(reader, filename_len).decode('utf-8', errors='replace')
+        size = total - 1 - filename_len
+        if size > len(target):
+            raise ValueError(f"Buffer too small: need {size:,} bytes")
+
+        written = 0
+        while written < size:
+            n = reader.readinto(target[written:size])
+            if not n:
+                raise ValueError("Invalid data: truncated payload")
+            written += n
+        st.bytes = size
+
+    return filename, size
+
+
+def decode_stream(chunks, skip_decompression: bool = False):
+    """Decode a raw level string arriving in pieces (bytes).
+
+    Yields the filename first, then the file data in pieces. Only about one
+    piece of the level is held at a time, so a download can be decoded while
+    it arrives.
+    """
+    payload = _stream_payload(_stream_groups(chunks))
+    if not skip_decompression:
+        payload = _maybe_decompress(payload)
+
+    head = b""
+    for piece in payload:
+        head += piece
+        if len(head) >= 1 + head[0]:
+            break
+    filename, offset = _split_filename(head)
+    yield filename
+    if len(head) > offset:
+        yield head[offset:]
+    yield from payload
+
+
+def _stream_groups(chunks):
+    """Yield lists of groups, object by object, from level string pieces."""
+    pending = b""
+    header = True  # The level header comes before the first ';'
+    for chunk in chunks:
+        pending += chunk
+        objects = pending.split(b";")
+        pending = objects.pop()
+        if header and objects:
+            objects = objects[1:]
+            header = False
+        groups = _object_groups(objects)
+        if groups:
+            yield groups
+    if pending and not header:
+        yield _object_groups([pending])
+
+
+def _object_groups(objects) -> list[int]:
+    groups = []
+    for obj in objects:
+        fields = obj.split(b",")
+        for i in range(0, len(fields) - 1, 2):
+            if fields[i] == b"57":
+                groups.extend(map(int, fields[i + 1].split(b".")))
+                break
+    return groups
+
+
+def _stream_payload(group_lists):
+    """Groups -> payload bytes, same as _decode_payload but piece by piece."""
+    carry = []
+    remaining = None  # Payload bytes still to come, from the 2 length groups
+    for groups in group_lists:
+        carry.extend(groups)
+        if remaining is None:
+            if len(carry) < 2:
+                continue
+            remaining = (carry[0] - 1) * 9999 + (carry[1] - 1)
+            carry = carry[2:]
+
+        usable = len(carry) - len(carry) % 5
+        piece = _groups_to_bytes(carry[:usable])[:remaining]
+        carry = carry[usable:]
+        remaining -= len(piece)
+        if piece:
+            yield piece
+
+    if remaining is None:
+        raise ValueError("Invalid level: not enough data to decode")
+    if carry and remaining:
+        yield _groups_to_bytes(carry)[:remaining]
+
+
+def _groups_to_bytes(groups: list[int]) -> bytes:
+    result = bytearray()
+    for i in range(0, len(groups), 5):
+        num = 0
+        for g in groups[i:i+5]:
+            num = num * 9999 + (g - 1)
+        result.extend(num.to_bytes(8, 'big'))
+    return bytes(result)
+
+
+def _maybe_decompress(payload):
+    """Decompress the payload pieces, unless it was stored without compression."""
+    head = b""
+    for piece in payload:
+        head += piece
+        if len(head) >= 4:
+            break
+    if is_compressed(head):
+        yield from decompress_stream(_chain(head, payload))
+    else:
+        yield from _chain(head, payload)
+
+
+def _chain(head: bytes, rest):
+    if head:
+        yield head
+    yield from rest
+
+
+def _decode_payload(level_string: str) -> bytes:
+    """Level string -> payload bytes (still zstd compressed unless encoded with skip_compression)."""
     # Handle both compressed (H4sI...) and raw (kS38...) formats
     if level_string.startswith('H4sI'):
         # Gzip + base64 compressed format
-        compressed = base64.urlsafe_b64decode(level_string + '==')
-        level_string = gzip.decompress(compressed).decode('utf-8')
+        with stage("decode.base64", len(level_string)):
+            compressed = base64.urlsafe_b64decode(level_string + '==')
+        with stage("decode.gunzip", len(compressed)):
+            level_string = gzip.decompress(compressed).decode('utf-8')
 
-    level = GDLevel(level_string)
-
-    # Collect all groups from all objects
-    all_groups = []
-    for obj in level.objects:
-        groups_val = obj.properties.get(57)
-        if groups_val is None:
-            continue
-        # Handle both string and numeric values
-        groups_str = str(groups_val)
-        all_groups.extend(int(g) for g in groups_str.split('.'))
+    with stage("decode.parse", len(level_string)):
+        # Read the groups straight from the text - a parser would turn a 2-group
+        # value like "1234.50" into a float and lose the trailing zero
+        all_groups = _object_groups(level_string.encode('utf-8').split(b";")[1:])
 
     # Validate minimum data
     if len(all_groups) < 2:
@@ -168,35 +393,44 @@ def decode(level_string: str, skip_decompression: bool = False) -> tuple[str, by
     all_groups = all_groups[2:]
 
     # Process 5 groups at a time (each 8 bytes = ~5 groups)
-    result = bytearray()
-    for i in range(0, len(all_groups), 5):
-        chunk_groups = all_groups[i:i+5]
+    with stage("decode.base_convert", original_len):
+        result = bytearray()
+        for i in range(0, len(all_groups), 5):
+            chunk_groups = all_groups[i:i+5]
 
-        # Convert base 9999 back to integer (groups are 1-9999, subtract 1)
-        num = 0
-        for g in chunk_groups:
-            num = num * 9999 + (g - 1)
+            # Convert base 9999 back to integer (groups are 1-9999, subtract 1)
+            num = 0
+            for g in chunk_groups:
+                num = num * 9999 + (g - 1)
 
-        result.extend(num.to_bytes(8, 'big'))
+            result.extend(num.to_bytes(8, 'big'))
 
-    # Trim to original length (remove padding)
-    result = bytes(result[:original_len])
+        # Trim to original length (remove padding)
+        return bytes(result[:original_len])
 
-    if not skip_decompression:
-        result = decompress_data(result)
 
+def _split_filename(data: bytes) -> tuple[str, int]:
+    """Read the filename prefix. Returns (filename, offset of the file data)."""
     # Validate minimum data for filename extraction
-    if len(result) < 1:
+    if len(data) < 1:
         raise ValueError("Invalid data: empty result after decompression")
 
     # Extract filename (1 byte length + filename bytes)
-    filename_len = result[0]
-    if len(result) < 1 + filename_len:
+    filename_len = data[0]
+    if len(data) < 1 + filename_len:
         raise ValueError("Invalid data: truncated filename")
 
-    filename = result[1:1 + filename_len].decode('utf-8', errors='replace')
-    file_data = result[1 + filename_len:]
+    filename = data[1:1 + filename_len].decode('utf-8', errors='replace')
+    return filename, 1 + filename_len
 
-    return filename, file_data
+
+def _read_exact(reader, size: int) -> bytes:
+    data = reader.read(size)
+    while len(data) < size:
+        more = reader.read(size - len(data))
+        if not more:
+            raise ValueError("Invalid data: truncated filename")
+        data += more
+    return data
 
 # ^ This is for the group method using Base9999 and 8 byte processing
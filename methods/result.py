@@ -0,0 +1,27 @@
+"""
+Encoder result
+
+Encoders return the level string together with what they already know about
+it, so callers never have to decompress the level again to find out.
+"""
+from dataclasses import dataclass
+
+
+@dataclass
+class EncodedLevel:
+    level_string: str
+    method: int
+    object_count: int
+    raw_size: int         # Input file bytes
+    compressed_size: int  # Payload bytes after compression, before group encoding
+    payload_hash: str     # SHA-256 hex of the input file
+    encode_time: float    # Seconds spent in the encoder
+    group_count: int = 0  # Data groups across all objects, 0 for methods that don't pack groups
+
+    @property
+    def groups_per_object(self) -> float:
+        """Packing efficiency, at most 10 (GROUPS_PER_OBJECT)."""
+        return self.group_count / self.object_count if self.object_count else 0.0
+
+    def __str__(self):
+        return self.level_string
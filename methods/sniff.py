@@ -0,0 +1,308 @@
+"""
+Format sniffing
+
+Tells which method produced a level string from its first kilobyte,
+so decoding never needs --method and never tries one method after another:
+
+- base64 + gzip wrapping (H4sI...): only the start is unpacked to look at
+- property 31 on the first object: method 5
+- property 57 (groups) holding base64 text: method 4
+- method 6 if every object has at most 10 distinct groups in 1-9999, the
+  objects are 30 units apart (or have no position, compact mode) and the
+  header groups hold a sane length followed by a zstd frame or a filename prefix
+- otherwise method 2 (bytes, 0-255) or 3 (chunk length, then base 10000), told
+  apart by the object spacing or, with a single object, the group layout
+- X/Y positions and no groups: method 1
+
+decode_any() and decode_stream() sniff, then hand the level to the right
+decoder. Methods 1-5 don't store a filename, they decode to ("", data).
+"""
+import base64
+import zlib
+from dataclasses import dataclass
+
+from . import METHODS
+
+SNIFF_BYTES = 1024  # Raw level string looked at, the header and a whole method 3 object fit
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+BLOCK_ID = "211"
+GROUPS_PER_OBJECT = 10
+METHOD2_SPACING = 10        # X distance between objects
+METHOD3_SPACING = 256 * 30  # 30 per byte, 256 byte chunks
+BASE10000_CHUNK = 256
+
+
+@dataclass
+class LevelFormat:
+    method: int
+    gzipped: bool        # Wrapped in base64 + gzip, as uploaded and as GD saves it
+    payload: str | None  # "zstd", "raw" (encoded with skip_compression) or None if the start doesn't tell
+
+
+def level_head(level_string: str, size: int = SNIFF_BYTES) -> tuple[str, bool, bool]:
+    """(first bytes of the raw level string, gzipped, whether that is the whole string)."""
+    if not level_string.startswith("H4sI"):
+        return level_string[:size], False, len(level_string) <= size
+
+    inflate = zlib.decompressobj(16 + 15)
+    head = b""
+    # 4 base64 characters are 3 bytes, gzip rarely shrinks a level's start below a third
+    step = size // 3 * 4 + 64
+    for start in range(0, len(level_string), step):
+        encoded = level_string[start:start + step]
+        if len(encoded) % 4:
+            encoded += "=" * (-len(encoded) % 4)
+        try:
+            head += inflate.decompress(base64.urlsafe_b64decode(encoded), size - len(head))
+        except (ValueError, zlib.error):
+            raise ValueError("Invalid level: bad base64/gzip data")
+        if len(head) >= size or inflate.eof:
+            break
+    return head.decode("ascii", errors="replace"), True, inflate.eof and len(head) < size
+
+
+def unwrap(level_string: str) -> str:
+    """The raw level string, with base64 + gzip undone if it's wrapped."""
+    if not level_string.startswith("H4sI"):
+        return level_string
+    return zlib.decompress(base64.urlsafe_b64decode(level_string + "=="), 16 + 15).decode("utf-8", errors="ignore")
+
+
+def unwrap_stream(level_string: str, size: int = 1 << 20):
+    """unwrap() in pieces (bytes) for decode_stream(), about one piece is unpacked at a time."""
+    if not level_string.startswith("H4sI"):
+        for start in range(0, len(level_string), size):
+            yield level_string[start:start + size].encode("utf-8")
+        return
+
+    inflate = zlib.decompressobj(16 + 15)
+    step = size // 4 * 4
+    for start in range(0, len(level_string), step):
+        encoded = level_string[start:start + step]
+        if len(encoded) % 4:
+            encoded += "=" * (-len(encoded) % 4)
+        try:
+            out = inflate.decompress(base64.urlsafe_b64decode(encoded))
+        except (ValueError, zlib.error):
+            raise ValueError("Invalid level: bad base64/gzip data")
+        if out:
+            yield out
+    if not inflate.eof:
+        raise ValueError("Invalid level: truncated level string")
+
+
+def sniff(level_string: str) -> LevelFormat:
+    """Which method encoded this level string. Raises ValueError if it isn't one of ours."""
+    return sniff_head(*level_head(level_string))
+
+
+def sniff_head(head: str, gzipped: bool = False, complete: bool = False) -> LevelFormat:
+    """Same as sniff(), from the start of a raw level string."""
+    parts = head.split(";")[1:]  # The level header comes first
+    partial = not complete and bool(parts)
+    if complete or (parts and not parts[-1]):
+        parts = [p for p in parts if p]
+        partial = False
+    if not parts:
+        raise ValueError("Not a GD Storage level: no objects")
+
+    objects = []
+    for i, text in enumerate(parts):
+        cut = partial and i == len(parts) - 1
+        fields = text.split(",")
+        if cut and len(fields) % 2:
+            fields = fields[:-1]
+        objects.append((dict(zip(fields[::2], fields[1::2])), cut))
+
+    props, cut = objects[0]
+    if props.get("1") != BLOCK_ID:
+        raise ValueError("Not a GD Storage level")
+
+    if "31" in props:
+        return LevelFormat(5, gzipped, _base64_payload(props["31"]))
+
+    if "57" not in props:
+        if "2" in props and "3" in props:
+            return LevelFormat(1, gzipped, _xy_payload(objects))
+        raise ValueError("Not a GD Storage level: no data in the first object")
+
+    if not props["57"].replace(".", "").isdigit():
+        return LevelFormat(4, gzipped, _base64_payload(props["57"]))
+
+    first = _groups(props["57"], cut)
+    if len(first) <= GROUPS_PER_OBJECT:
+        payload = _method6_payload(objects, complete)
+        if payload:
+            return LevelFormat(6, gzipped, payload)
+    method, payload = _legacy_groups(objects)
+    return LevelFormat(method, gzipped, payload)
+
+
+def _groups(value: str, cut: bool) -> list[int]:
+    groups = value.split(".")
+    if cut:
+        groups = groups[:-1]  # The last one may be missing digits
+    return [int(g) for g in groups if g]
+
+
+def _legacy_groups(objects) -> tuple[int, str | None]:
+    """(method, payload) for plain group numbers: method 2 (bytes) or 3 (base 10000 chunks).
+
+    The object spacing tells them apart (10 for method 2, 30 per byte for
+    method 3). A level with a single object only has its group layout, if
+    that fits both, the payload starting with a zstd frame decides.
+    """
+    props, cut = objects[0]
+    first = _groups(props["57"], cut)
+    candidates = {2, 3}
+    if len(objects) > 1 and not objects[1][1]:
+        x = objects[1][0].get("2")
+        candidates &= {2} if x == str(METHOD2_SPACING) else {3} if x == str(METHOD3_SPACING) else set()
+    if not first or max(first) > 255:
+        candidates.discard(2)
+    if not _base10000_chunk(first, cut):
+        candidates.discard(3)
+
+    payloads = {method: _legacy_payload(method, first, cut) for method in candidates}
+    if len(candidates) == 2:
+        candidates = {method for method in candidates if payloads[method] == "zstd"}
+        if len(candidates) != 1:
+            raise ValueError("Not a GD Storage level: groups fit both method 2 and method 3")
+    if not candidates:
+        raise ValueError("Not a GD Storage level: unknown group layout")
+    method = candidates.pop()
+    return method, payloads[method]
+
+
+def _base10000_chunk(groups: list[int], cut: bool) -> bool:
+    """Whether groups can be a method 3 object: chunk length, then that many bytes in base 10000."""
+    if len(groups) < 2 or not 1 <= groups[0] <= BASE10000_CHUNK:
+        return False
+    digits = groups[1:]
+    if len(digits) > -(-len(str(256 ** groups[0] - 1)) // 4):
+        return False
+    if max(digits) > 9999 or (digits[0] == 0 and (cut or len(digits) > 1)):
+        return False  # Only the number 0 has a leading 0 digit
+    return cut or int("".join(str(d).zfill(4) for d in digits)) < 256 ** groups[0]
+
+
+def _legacy_payload(method: int, groups: list[int], cut: bool) -> str | None:
+    if method == 2:
+        return _byte_payload(groups)
+    if cut:
+        return None
+    num = int("".join(str(d).zfill(4) for d in groups[1:]))
+    return _magic_payload(num.to_bytes(groups[0], "big"))
+
+
+def _method6_payload(objects, complete: bool) -> str | None:
+    """"zstd" or "raw" if the objects look like method 6, else None."""
+    groups = []
+    for index, (props, cut) in enumerate(objects):
+        object_groups = _groups(props.get("57", ""), cut)
+        if not cut:
+            if not object_groups or len(object_groups) > GROUPS_PER_OBJECT:
+                return None
+            if len(set(object_groups)) != len(object_groups):
+                return None
+            if "2" in props and props["2"] != str(index * 30):
+                return None  # Compact levels have no positions at all
+        if any(not 1 <= g <= 9999 for g in object_groups):
+            return None
+        groups.extend(object_groups)
+
+    if len(groups) < 2:
+        return None
+    length = (groups[0] - 1) * 9999 + (groups[1] - 1)
+    if not length:
+        return None
+    if complete and len(groups) - 2 != -(-length // 8) * 5:
+        return None  # A whole level has exactly the groups its length needs
+    if len(groups) < 7:
+        return None
+
+    num = 0
+    for g in groups[2:7]:
+        num = num * 9999 + (g - 1)
+    if num >= 1 << 64:
+        return None
+    first = num.to_bytes(8, "big")
+    if first.startswith(ZSTD_MAGIC):
+        return "zstd"
+    if 1 + first[0] <= length:
+        return "raw"
+    return None
+
+
+def _magic_payload(data: bytes) -> str | None:
+    if len(data) < len(ZSTD_MAGIC):
+        return None
+    return "zstd" if data.startswith(ZSTD_MAGIC) else "raw"
+
+
+def _byte_payload(groups: list[int]) -> str | None:
+    return _magic_payload(bytes(groups[:len(ZSTD_MAGIC)]))
+
+
+def _base64_payload(text: str) -> str | None:
+    return _magic_payload(base64.b64decode(text[:8] + "=" * (-len(text[:8]) % 4))) if len(text) >= 8 else None
+
+
+def _xy_payload(objects) -> str | None:
+    data = bytearray()
+    for props, cut in objects:
+        if cut or "2" not in props or "3" not in props:
+            break
+        data.append(int(props["2"]))
+        if props["3"] != "-1":
+            data.append(int(props["3"]))
+    return _magic_payload(bytes(data))
+
+
+def decode_any(level_string: str, skip_decompression: bool = False) -> tuple[str, bytes]:
+    """Decode a level string made by any method. Returns (filename, data)."""
+    from .compression import decompress_data, is_compressed
+
+    level_format = sniff(level_string)
+    module = METHODS.module(level_format.method)
+    if level_format.method == 6:
+        return module.decode(level_string, skip_decompression)
+
+    # The legacy decoders always decompress, and only take a raw level string
+    data = module.decode(unwrap(level_string), skip_decompression=True)
+    if not skip_decompression and is_compressed(data):
+        data = decompress_data(data)
+    return "", data
+
+
+def decode_stream(chunks, skip_decompression: bool = False):
+    """decode_any() for a raw level string arriving in pieces (bytes).
+
+    Yields the filename first, then the data in pieces. Method 6 levels are
+    decoded as they arrive, other methods once the whole level is in.
+    """
+    chunks = iter(chunks)
+    head = b""
+    for piece in chunks:
+        head += piece
+        if len(head) >= SNIFF_BYTES:
+            complete = False
+            break
+    else:
+        complete = True
+
+    level_format = sniff_head(head.decode("ascii", errors="replace"), complete=complete)
+    if level_format.method == 6:
+        yield from METHODS.module(6).decode_stream(_chain(head, chunks), skip_decompression)
+        return
+
+    level_string = b"".join(_chain(head, chunks)).decode("utf-8", errors="ignore")
+    filename, data = decode_any(level_string, skip_decompression)
+    yield filename
+    yield data
+
+
+def _chain(head: bytes, rest):
+    if head:
+        yield head
+    yield from rest
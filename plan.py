@@ -0,0 +1,193 @@
+"""
+Upload planning
+
+Estimates what encoding a file with method 6 would produce (payload size,
+groups, objects, level string and upload size, how many levels) without
+encoding it, for `gd-storage --plan`:
+
+- the zstd ratio comes from compressing SAMPLE_BLOCKS evenly spread blocks,
+  or the whole file if it is small (then the payload size is exact). The
+  bounds are the sampling error (about 95%); the blocks are compressed
+  separately, so repeats further apart than a block aren't seen and the
+  estimate leans high for such files
+- groups follow from the payload size: 2 length groups plus 5 per 8 bytes
+- objects and level string bytes follow from the packing rules. How full
+  the objects get is measured by packing a level made from the sample: zstd
+  output can repeat 8-byte chunks, which makes objects end early. Samples
+  too small for that use groups_per_object(), the figure for random data
+- the gzip + base64 step is measured on that same level
+"""
+import math
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+SAMPLE_BLOCKS = 16
+SAMPLE_BLOCK = 128 << 10
+WHOLE_FILE = SAMPLE_BLOCKS * SAMPLE_BLOCK  # Files up to this size are compressed whole, exactly
+LEVEL_SAMPLE = 256 << 10                   # Payload bytes encoded to measure packing and gzip + base64
+MIN_SAMPLE_OBJECTS = 100                   # Fewer objects than this say little about packing
+Z = 1.96
+
+# Digits of a group value: the top group of an 8-byte chunk is at most
+# 2^64 / 9999^4 + 1 = 1845, the other four are spread over 1-9999
+TOP_GROUP = 1845
+DIGITS_TOP = (9 * 1 + 90 * 2 + 900 * 3 + (TOP_GROUP - 999) * 4) / TOP_GROUP
+DIGITS_OTHER = (9 * 1 + 90 * 2 + 900 * 3 + 9000 * 4) / 9999
+
+
+@dataclass
+class Estimate:
+    value: float
+    low: float
+    high: float
+
+    def scale(self, func) -> "Estimate":
+        return Estimate(func(self.value), func(self.low), func(self.high))
+
+
+@dataclass
+class Plan:
+    name: str
+    size: int
+    sampled: int               # Bytes compressed for the estimate
+    exact: bool                # The whole file was compressed
+    payload: Estimate          # Method 6 payload bytes (filename prefix + zstd frame)
+    groups: Estimate
+    objects: Estimate
+    level_bytes: Estimate      # Raw level string
+    upload_bytes: Estimate     # Level string as uploaded (gzip + base64)
+    levels: int                # Levels needed, 1 unless the payload is over method 6's limit
+    dedup_chunks: int          # Chunk levels --dedup would upload the first time (plus a manifest level)
+    seconds: float
+
+
+def plan_file(filepath: str | Path, compact: bool = False) -> Plan:
+    """Estimate the encode of one file."""
+    from methods.buffers import open_input
+
+    start = time.perf_counter()
+    filepath = Path(filepath)
+
+    name = filepath.name.encode("utf-8")[:255]
+
+    with open_input(filepath) as data:
+        size = len(data)
+        payload, sample, sampled = _payload_size(memoryview(data), bytes([len(name)]) + name)
+
+    groups = payload.scale(lambda p: 2 + math.ceil(p / 8) * 5)
+
+    from methods.method6_optimized import encode_bytes
+    from methods.sniff import unwrap
+
+    # A level from the start of the sample shows how full objects get and how well it gzips
+    level = encode_bytes(sample[:LEVEL_SAMPLE], "", skip_compression=True, compact=compact)
+    per_object = level.groups_per_object
+    if level.object_count < MIN_SAMPLE_OBJECTS:
+        per_object = groups_per_object()
+    upload_ratio = len(level.level_string) / len(unwrap(level.level_string))
+
+    objects = groups.scale(lambda g: math.ceil(g / per_object))
+    level_bytes = Estimate(*(
+        level_size(g, math.ceil(g / per_object), compact) for g in (groups.value, groups.low, groups.high)
+    ))
+    upload_bytes = level_bytes.scale(lambda b: b * upload_ratio)
+
+    from methods.method6_optimized import MAX_LENGTH
+    from dedup import AVERAGE_CHUNK
+
+    return Plan(
+        name=filepath.name,
+        size=size,
+        sampled=sampled,
+        exact=sampled == size,
+        payload=payload,
+        groups=groups,
+        objects=objects,
+        level_bytes=level_bytes,
+        upload_bytes=upload_bytes,
+        levels=max(1, math.ceil(payload.value / MAX_LENGTH)),
+        dedup_chunks=max(1, round(size / AVERAGE_CHUNK)),
+        seconds=time.perf_counter() - start,
+    )
+
+
+def _payload_size(view: memoryview, prefix: bytes) -> tuple[Estimate, bytes, int]:
+    """(payload size estimate, compressed sample, file bytes compressed).
+
+    The payload is the filename prefix and the file in one zstd frame, like encode_bytes() makes it.
+    """
+    from methods.compression import compress_data, compress_parts
+
+    size = len(view)
+    if size <= WHOLE_FILE:
+        payload = compress_parts(prefix, view)
+        return Estimate(len(payload), len(payload), len(payload)), payload, size
+
+    step = (size - SAMPLE_BLOCK) / (SAMPLE_BLOCKS - 1)
+    ratios = []
+    sample = []
+    for i in range(SAMPLE_BLOCKS):
+        offset = round(i * step)
+        compressed = compress_data(view[offset:offset + SAMPLE_BLOCK])
+        ratios.append(len(compressed) / SAMPLE_BLOCK)
+        sample.append(compressed)
+
+    mean = sum(ratios) / len(ratios)
+    variance = sum((r - mean) ** 2 for r in ratios) / (len(ratios) - 1)
+    # Sampling without replacement from the file's blocks
+    coverage = SAMPLE_BLOCKS * SAMPLE_BLOCK / size
+    margin = Z * math.sqrt(variance / len(ratios) * (1 - coverage))
+    estimate = Estimate(mean * size, max(0.0, mean - margin) * size, (mean + margin) * size)
+    return estimate.scale(lambda c: len(prefix) + c), b"".join(sample), SAMPLE_BLOCKS * SAMPLE_BLOCK
+
+
+def groups_per_object() -> float:
+    """Expected groups per object for compressed data.
+
+    An object takes groups until one repeats or it has 10. With q the chance
+    two groups are equal, the first k groups are all different with
+    probability prod(1 - j*q for j < k), and summing that over k = 1..10
+    gives the expected size. The 2-group rule costs nothing, plan_objects()
+    borrows instead of adding objects.
+    """
+    from methods.method6_optimized import GROUPS_PER_OBJECT
+
+    # 1 in 25 pairs are both top groups, the rest involve a group spread over 1-9999
+    q = 1 / 25 / TOP_GROUP + 24 / 25 / 9999
+    expected = 0.0
+    distinct = 1.0
+    for k in range(1, GROUPS_PER_OBJECT + 1):
+        expected += distinct
+        distinct *= 1 - k * q
+    return expected
+
+
+def level_size(groups: float, objects: int, compact: bool = False) -> float:
+    """Raw level string bytes for that many groups in that many objects."""
+    from gdparse import GDLevel
+    from methods.method6_optimized import BLOCK_ID
+
+    header = len(GDLevel.create_empty().serialize())
+    if compact:
+        fixed = len(f"1,{BLOCK_ID},57,;") * objects
+    else:
+        # "1,211,2,<x>,3,0,57,<groups>;" with x = 0, 30, 60...
+        fixed = len(f"1,{BLOCK_ID},2,,3,0,57,;") * objects + _position_digits(objects)
+    digits = groups * (DIGITS_TOP + 4 * DIGITS_OTHER) / 5
+    dots = groups - objects
+    return header + fixed + digits + dots
+
+
+def _position_digits(objects: int, spacing: int = 30) -> int:
+    """Total digits of the x positions 0, spacing, 2*spacing... of that many objects."""
+    total = 0
+    low = 0
+    digits = 1
+    while low < objects:
+        high = min(objects, -(-10 ** digits // spacing))  # First index with more digits
+        total += (high - low) * digits
+        low = high
+        digits += 1
+    return total
+
@@ -0,0 +1,138 @@
+"""
+Stage profiling
+
+Timing and byte counters around the stages of encoding, decoding, fetching
+and save file I/O. Nothing is recorded unless a hook is installed; until then
+stage() hands back a shared no-op context, so instrumented code pays about
+one function call per stage.
+
+    with profiling.profile() as prof:
+        encode(path)
+    print(prof.report())
+
+A hook is any callable taking (stage_name, seconds, nbytes). Hooks that also
+have a count(name, value) method get the counters passed to count(), like the
+object and group totals from packing.
+"""
+import time
+from contextlib import contextmanager
+
+_hook = None
+
+
+class _Stage:
+    __slots__ = ("name", "bytes", "start")
+
+    def __init__(self, name: str, nbytes: int):
+        self.name = name
+        self.bytes = nbytes
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        hook = _hook
+        if hook is not None:
+            hook(self.name, time.perf_counter() - self.start, self.bytes)
+        return False
+
+
+class _NullStage:
+    __slots__ = ("bytes",)  # Assigning .bytes is allowed and ignored
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name: str, nbytes: int = 0):
+    """Time a stage. Set .bytes on the returned object if the size is only known afterwards."""
+    if _hook is None:
+        return _NULL_STAGE
+    return _Stage(name, nbytes)
+
+
+def count(name: str, value: int):
+    """Add to a counter, if the installed hook keeps counters."""
+    hook = _hook
+    if hook is not None and hasattr(hook, "count"):
+        hook.count(name, value)
+
+
+def enabled() -> bool:
+    return _hook is not None
+
+
+def set_hook(hook):
+    """Install a hook (or None to disable). Returns the previous hook."""
+    global _hook
+    previous = _hook
+    _hook = hook
+    return previous
+
+
+class Profile:
+    """Hook that sums calls, seconds and bytes per stage."""
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self.start = time.perf_counter()
+        self.end = None
+
+    def __call__(self, name: str, seconds: float, nbytes: int):
+        entry = self.stages.setdefault(name, [0, 0.0, 0])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] += nbytes or 0
+
+    def count(self, name: str, value: int):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    @property
+    def wall_time(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    def to_dict(self) -> dict:
+        return {
+            "wall_s": self.wall_time,
+            "stages": {
+                name: {"calls": calls, "seconds": seconds, "bytes": nbytes}
+                for name, (calls, seconds, nbytes) in self.stages.items()
+            },
+            "counters": dict(self.counters),
+        }
+
+    def report(self) -> str:
+        wall = self.wall_time
+        lines = [f"{'Stage':<22} {'Calls':>6} {'Time (s)':>10} {'Share':>7} {'Bytes':>15} {'MB/s':>9}"]
+        for name, (calls, seconds, nbytes) in self.stages.items():
+            share = seconds / wall if wall else 0.0
+            rate = f"{nbytes / seconds / 1e6:9.2f}" if nbytes and seconds else f"{'':>9}"
+            lines.append(f"{name:<22} {calls:>6} {seconds:>10.4f} {share:>7.1%} {nbytes:>15,} {rate}")
+        lines.append(f"{'Total (wall)':<22} {'':>6} {wall:>10.4f}")
+        for name, value in self.counters.items():
+            lines.append(f"{name:<22} {value:>17,}")
+        groups, objects = self.counters.get("encode.groups"), self.counters.get("encode.objects")
+        if groups and objects:
+            lines.append(f"{'Groups per object':<22} {groups / objects:>17.3f}")
+        return "\n".join(lines)
+
+
+@contextmanager
+def profile(hook=None):
+    """Record stages for the duration of the block. Yields the hook (a Profile by default)."""
+    collector = hook if hook is not None else Profile()
+    previous = set_hook(collector)
+    try:
+        yield collector
+    finally:
+        set_hook(previous)
+        if isinstance(collector, Profile):
+            collector.end = time.perf_counter()
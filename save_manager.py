@@ -2,45 +2,110 @@
 Fixed version of PyCCManager
 """
 import os
+import re
 import zlib
+import json
 import base64
-import struct
+import hashlib
 import platform
 from Cryptodome.Cipher import AES
 
+import config
+from deflate import (
+    GZIP_HEADER, FINAL_BLOCK, crc32_combine, deflate_segment, gzip_trailer, stored_block,
+)
+from profiling import stage
+
+# Segment layouts of saves we wrote, so the next run can reuse their compressed blocks
+INDEX_DIR = config.CACHE_DIR / "segments"
+
+# Level keys get renumbered on every inject, so they are split into their own tiny segments
+LEVEL_KEY = re.compile(rb"<k>k_\d+</k>")
+SMALL_SEGMENT = 512  # Segments below this are stored uncompressed and never cached
+
+XOR_TABLE = bytes(b ^ 11 for b in range(256))
+
 
 class GDData:
     def __init__(self, path):
         self.path = path
         self.ccll_path = f"{path}/CCLocalLevels.dat"
         self.ccgm_path = f"{path}/CCGameManager.dat"
-        self.ccll = self.decode(open(self.ccll_path, "rb").read())
-        self.ccgm = self.decode(open(self.ccgm_path, "rb").read())
+        # Decoded lazily - reading credentials should not pay for the levels file
+        self._ccll = None
+        self._ccgm = None
+
+    @property
+    def ccll(self):
+        if self._ccll is None:
+            self._ccll = self._load(self.ccll_path)
+        return self._ccll
+
+    @ccll.setter
+    def ccll(self, value):
+        self._ccll = value
+
+    @property
+    def ccgm(self):
+        if self._ccgm is None:
+            self._ccgm = self._load(self.ccgm_path)
+        return self._ccgm
+
+    @ccgm.setter
+    def ccgm(self, value):
+        self._ccgm = value
 
     def injectLevel(self, levelData, levelName="Injected", levelDesc="Injected level"):
-        levels = self.ccll.split(b">k_")
-        header = levels[0]
-        payload = (
-            header + b">k_0</k><d><k>kCEK</k><i>4</i><k>k18</k><i>2</i><k>k2</k><s>"
-            + levelName.encode() + b"</s><k>k4</k><s>"
-            + levelData.encode() + b"</s><k>k5</k><s>"
-            + levelDesc.encode() + b"</s><k>k13</k><t /><k>k21</k><i>2</i><k>k16</k><i>1</i>"
-            + b"<k>k80</k><i>338</i><k>k81</k><i>23</i><k>k83</k><i>109</i><k>k50</k><i>35</i>"
-            + b"<k>k48</k><i>23</i><k>kI1</k><r>-1118.36</r><k>kI2</k><r>-366.449</r>"
-            + b"<k>kI3</k><r>0.7</r><k>kI4</k><i>2</i><k>kI5</k><i>11</i><k>kI7</k><i>1</i>"
-            + b"<k>kI6</k><d><k>0</k><s>0</s><k>1</k><s>0</s><k>2</k><s>0</s><k>3</k><s>0</s>"
-            + b"<k>4</k><s>0</s><k>5</k><s>0</s><k>6</k><s>0</s><k>7</k><s>0</s><k>8</k><s>0</s>"
-            + b"<k>9</k><s>0</s><k>10</k><s>0</s><k>11</k><s>2</s><k>12</k><s>0</s></d></d><k"
-        )
-        for i in range(1, len(levels)):
-            payload += b">k_" + str(i).encode() + b"<" + b"<".join(levels[i].split(b"<")[1:])
-        self.ccll = payload
+        self.injectLevels([(levelData, levelName, levelDesc)])
+
+    def injectLevels(self, levels):
+        """Inject several (levelData, levelName, levelDesc) tuples in one pass.
+
+        The first entry ends up at the top of the created levels list.
+        """
+        existing = self.ccll.split(b">k_")
+        header = existing[0]
+        parts = [header]
+        for index, (levelData, levelName, levelDesc) in enumerate(levels):
+            parts.append(
+                b">k_" + str(index).encode() + b"</k><d><k>kCEK</k><i>4</i><k>k18</k><i>2</i><k>k2</k><s>"
+                + levelName.encode() + b"</s><k>k4</k><s>"
+                + levelData.encode() + b"</s><k>k5</k><s>"
+                + levelDesc.encode() + b"</s><k>k13</k><t /><k>k21</k><i>2</i><k>k16</k><i>1</i>"
+                + b"<k>k80</k><i>338</i><k>k81</k><i>23</i><k>k83</k><i>109</i><k>k50</k><i>35</i>"
+                + b"<k>k48</k><i>23</i><k>kI1</k><r>-1118.36</r><k>kI2</k><r>-366.449</r>"
+                + b"<k>kI3</k><r>0.7</r><k>kI4</k><i>2</i><k>kI5</k><i>11</i><k>kI7</k><i>1</i>"
+                + b"<k>kI6</k><d><k>0</k><s>0</s><k>1</k><s>0</s><k>2</k><s>0</s><k>3</k><s>0</s>"
+                + b"<k>4</k><s>0</s><k>5</k><s>0</s><k>6</k><s>0</s><k>7</k><s>0</s><k>8</k><s>0</s>"
+                + b"<k>9</k><s>0</s><k>10</k><s>0</s><k>11</k><s>2</s><k>12</k><s>0</s></d></d><k"
+            )
+        # Shift the existing levels down by the number of injected ones
+        offset = len(levels) - 1
+        for i in range(1, len(existing)):
+            parts.append(b">k_" + str(i + offset).encode() + b"<" + existing[i].split(b"<", 1)[1])
+        self.ccll = b"".join(parts)
 
     def save(self, ccll=True, ccgm=True):
-        if ccll:
-            open(self.ccll_path, "wb").write(self.encode(self.ccll))
-        if ccgm:
-            open(self.ccgm_path, "wb").write(self.encode(self.ccgm))
+        # Files that were never loaded are unchanged, no need to rewrite them
+        if ccll and self._ccll is not None:
+            self._store(self.ccll_path, self._ccll)
+        if ccgm and self._ccgm is not None:
+            self._store(self.ccgm_path, self._ccgm)
+
+    def _load(self, path):
+        with stage("save.read") as st:
+            with open(path, "rb") as f:
+                data = f.read()
+            st.bytes = len(data)
+        with stage("save.decode", len(data)):
+            return self.decode(data)
+
+    def _store(self, path, data):
+        with stage("save.encode", len(data)):
+            encoded = self.encode(data)
+        with stage("save.write", len(encoded)):
+            with open(path, "wb") as f:
+                f.write(encoded)
 
     def encode(self, data):
         raise NotImplementedError
@@ -50,26 +115,135 @@ class GDData:
 
 
 class GDWinData(GDData):
-    """Windows GD save format (XOR + zlib)"""
+    """Windows GD save format (XOR + zlib)
+
+    The deflate stream is written as independently flushed segments, one per
+    level block. Compressed segments are cached (and their layout persisted in
+    INDEX_DIR), so re-saving after an inject only compresses the new level.
+    The cache is only filled in when a file is saved, reading costs nothing extra.
+    """
 
     def __init__(self, path=None):
         if path is None:
             path = os.path.join(os.getenv("LOCALAPPDATA", ""), "GeometryDash")
+        self._segment_cache = {}
+        self._saved_segments = {}  # path -> (blob, data, layout) as loaded, restored on the first save
         super().__init__(path)
 
     def encode(self, data):
-        compressed = zlib.compress(data)
-        crc32 = struct.pack('I', zlib.crc32(data))
-        size = struct.pack('I', len(data))
-        encrypted = base64.b64encode(
-            b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\x0b' + compressed[2:-4] + crc32 + size,
-            b'-_'
-        )
-        return bytes([a ^ 11 for a in encrypted])
+        blob, _ = self._deflate(data)
+        return self._wrap(blob)
 
     def decode(self, data):
-        decrypted = bytes([a ^ 11 for a in data])
-        return zlib.decompress(base64.b64decode(decrypted, b'-_')[10:], -zlib.MAX_WBITS)
+        return zlib.decompress(self._unwrap(data)[10:], -zlib.MAX_WBITS)
+
+    def _wrap(self, blob):
+        return base64.b64encode(blob, b'-_').translate(XOR_TABLE)
+
+    def _unwrap(self, data):
+        return base64.b64decode(data.translate(XOR_TABLE), b'-_')
+
+    def _deflate(self, data):
+        """Gzip data segment by segment, reusing cached segments. Returns (blob, layout)."""
+        view = memoryview(data)
+        cache = {}
+        parts = [GZIP_HEADER]
+        layout = []
+        crc = 0
+        for start, end in _segment_bounds(data):
+            segment = view[start:end]
+            size = end - start
+            if size < SMALL_SEGMENT:
+                compressed = stored_block(segment)
+                crc = zlib.crc32(segment, crc)
+                segment_crc = zlib.crc32(segment)
+            else:
+                key = hashlib.blake2b(segment, digest_size=16).digest()
+                cached = self._segment_cache.get(key)
+                if cached is None:
+                    cached = (deflate_segment(segment), zlib.crc32(segment))
+                    crc = zlib.crc32(segment, crc)
+                else:
+                    crc = crc32_combine(crc, cached[1], size)
+                cache[key] = cached
+                compressed, segment_crc = cached
+            parts.append(compressed)
+            layout.append((size, len(compressed), segment_crc))
+        parts.append(FINAL_BLOCK)
+        parts.append(gzip_trailer(crc, len(data)))
+        # Only keep segments that are still part of the save
+        self._segment_cache = cache
+        return b"".join(parts), layout
+
+    def _index_path(self, path):
+        digest = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+        return INDEX_DIR / f"{digest}.json"
+
+    def _load(self, path):
+        with stage("save.read") as st:
+            with open(path, "rb") as f:
+                raw = f.read()
+            st.bytes = len(raw)
+        with stage("save.decode", len(raw)):
+            blob = self._unwrap(raw)
+            data = zlib.decompress(blob[10:], -zlib.MAX_WBITS)
+        layout = self._saved_layout(path, blob, data)
+        if layout:
+            self._saved_segments[path] = (blob, data, layout)
+        return data
+
+    def _store(self, path, data):
+        saved = self._saved_segments.pop(path, None)
+        if saved:
+            with stage("save.index", len(saved[1])):
+                self._restore_segments(*saved)
+        with stage("save.encode", len(data)):
+            blob, layout = self._deflate(data)
+            encoded = self._wrap(blob)
+        with stage("save.write", len(encoded)):
+            with open(path, "wb") as f:
+                f.write(encoded)
+        try:
+            stat = os.stat(path)
+            index_path = self._index_path(path)
+            index_path.parent.mkdir(parents=True, exist_ok=True)
+            index_path.write_text(json.dumps({
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "segments": layout,
+            }))
+        except OSError:
+            pass  # The index is only an optimization
+
+    def _saved_layout(self, path, blob, data):
+        """Segment layout of a save we wrote earlier, if it is unchanged, else None."""
+        try:
+            index = json.loads(self._index_path(path).read_text())
+            stat = os.stat(path)
+        except (OSError, ValueError):
+            return None
+        if index.get("size") != stat.st_size or index.get("mtime_ns") != stat.st_mtime_ns:
+            return None
+
+        segments = index.get("segments", [])
+        if sum(s[0] for s in segments) != len(data):
+            return None
+        if len(GZIP_HEADER) + sum(s[1] for s in segments) + len(FINAL_BLOCK) + 8 != len(blob):
+            return None
+        return segments
+
+    def _restore_segments(self, blob, data, segments):
+        """Seed the segment cache from the loaded file's segments (see _saved_layout)."""
+        raw = memoryview(data)
+        compressed = memoryview(blob)
+        raw_pos, comp_pos = 0, len(GZIP_HEADER)
+        for size, comp_size, segment_crc in segments:
+            if size >= SMALL_SEGMENT:
+                segment = raw[raw_pos:raw_pos + size]
+                key = hashlib.blake2b(segment, digest_size=16).digest()
+                self._segment_cache[key] = (bytes(compressed[comp_pos:comp_pos + comp_size]), segment_crc)
+            raw_pos += size
+            comp_pos += comp_size
 
 
 class GDMacData(GDData):
@@ -93,6 +267,18 @@ class GDMacData(GDData):
         return self.cipher.decrypt(data)
 
 
+def _segment_bounds(data):
+    """Yield (start, end) of the level blocks and the level keys between them."""
+    start = 0
+    for match in LEVEL_KEY.finditer(data):
+        if match.start() > start:
+            yield start, match.start()
+        yield match.start(), match.end()
+        start = match.end()
+    if len(data) > start:
+        yield start, len(data)
+
+
 def new_manager(path=None, format="auto"):
     """
     Create a GD save manager.
@@ -0,0 +1,242 @@
+"""
+Storage backends
+
+Where encoded levels are kept, behind one interface:
+
+    put(level, name, description) -> key    level is an EncodedLevel or a level string
+    get(key) -> StoredLevel                 with the level string
+    stat(key) -> StoredLevel                without it
+    list() -> [StoredLevel]                 without it
+
+- GDBackend: the GD servers, keys are level IDs. Uploading needs credentials
+- SaveBackend: the local GD save, keys are level names
+- DirBackend: a plain directory, one <key>.level file (the level string as
+  it would be uploaded) and one <key>.json file per level. Batches can be
+  staged there at disk speed and copied to GD later with --copy-to gd
+
+Keys only mean something to the backend that handed them out, so manifests
+(--dedup, --erasure) are GD-only: they point at level IDs.
+"""
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+from methods.result import EncodedLevel
+
+
+@dataclass
+class StoredLevel:
+    key: int | str
+    name: str
+    description: str = ""
+    size: int = 0              # Level string as stored, 0 if the backend doesn't say
+    level_string: str = ""     # Only filled in by get()
+    expected: dict | None = None  # What it decodes to ({"sha256", "size"}), if the backend knows
+
+
+def _parts(level) -> tuple[str, dict | None]:
+    """(level string as uploaded, what it decodes to if known) of an EncodedLevel or level string."""
+    if isinstance(level, EncodedLevel):
+        return level.level_string, {"sha256": level.payload_hash, "size": level.raw_size}
+    if not level.startswith("H4sI"):
+        # A raw level string (GDBackend.get() returns them unpacked), wrap it like GD stores levels
+        import base64
+        import gzip
+
+        level = base64.urlsafe_b64encode(gzip.compress(level.encode("utf-8"))).decode("ascii")
+    return level, None
+
+
+class Backend:
+    name = ""              # As given to --backend
+    hash_section = None    # Section of verify.HASHES_FILE that puts are recorded in
+    single_writer = False  # Every put rewrites one file: store a batch with one put_many, not put by put
+
+    def put(self, level, name: str, description: str = ""):
+        return self.put_many([(level, name, description)])[0]
+
+    def put_many(self, levels: list[tuple]) -> list:
+        """Store several (level, name, description) tuples. Returns their keys in order."""
+        return [self.put(*level) for level in levels]
+
+    def get(self, key) -> StoredLevel:
+        raise NotImplementedError
+
+    def stat(self, key) -> StoredLevel:
+        raise NotImplementedError
+
+    def list(self) -> list[StoredLevel]:
+        raise NotImplementedError
+
+
+class GDBackend(Backend):
+    name = "gd"
+    hash_section = "levels"
+
+    def __init__(self, credentials: tuple | None = None):
+        self.credentials = credentials  # (username, account_id, gjp2), only needed to upload
+
+    def put(self, level, name: str, description: str = "") -> int:
+        from gd_api import upload_level
+
+        if not self.credentials:
+            raise ValueError("Uploading to GD needs credentials")
+        username, account_id, gjp2 = self.credentials
+        if not isinstance(level, EncodedLevel):
+            level = _parts(level)[0]
+        return upload_level(username, gjp2, account_id, name, level, description, unlisted=False)
+
+    def get(self, key) -> StoredLevel:
+        from gd_api import fetch_level
+
+        level_data = fetch_level(int(key))
+        return StoredLevel(
+            int(key), level_data.get("name", "Unknown"), level_data.get("description", ""),
+            len(level_data.get("4", "")), level_data.get("level_string", ""),
+        )
+
+    def stat(self, key) -> StoredLevel:
+        from gd_api import get_level_info
+
+        info = get_level_info(int(key))
+        return StoredLevel(int(key), info["name"], info.get("description", ""))
+
+    def list(self) -> list[StoredLevel]:
+        """The levels uploaded from here that are still on the server (the servers can't list by uploader)."""
+        import verify
+
+        levels = []
+        for key in verify.load_hashes()["levels"]:
+            try:
+                levels.append(self.stat(key))
+            except ValueError:
+                continue  # Deleted
+        return levels
+
+
+class SaveBackend(Backend):
+    name = "save"
+    hash_section = "local"
+    single_writer = True
+
+    def __init__(self, manager):
+        self.manager = manager  # save_manager.GDData
+        self._lock = threading.Lock()
+
+    def put_many(self, levels: list[tuple]) -> list[str]:
+        # One write of the save for the whole batch. Puts from several threads would
+        # interleave on the shared save data and drop each other's levels
+        with self._lock:
+            self.manager.injectLevels([(_parts(level)[0], name, description) for level, name, description in levels])
+            self.manager.save(ccll=True, ccgm=False)
+        return [name for _, name, _ in levels]
+
+    def entries(self):
+        """Every level in the save that has a level string, newest first, with the level string."""
+        ccll = self.manager.ccll.decode('utf-8', errors='ignore')
+        for entry in ccll.split('<k>k_')[1:]:
+            fields = {}
+            for key in ("k2", "k4", "k5"):
+                start = entry.find(f'<k>{key}</k><s>')
+                if start != -1:
+                    start += len(f'<k>{key}</k><s>')
+                    fields[key] = entry[start:entry.find('</s>', start)]
+            if "k2" in fields and "k4" in fields:
+                yield StoredLevel(
+                    fields["k2"], fields["k2"], fields.get("k5", ""), len(fields["k4"]), fields["k4"],
+                )
+
+    def get(self, key) -> StoredLevel:
+        for level in self.entries():
+            if level.name == key:
+                return level
+        raise ValueError(f"Level '{key}' not found in the local save")
+
+    def stat(self, key) -> StoredLevel:
+        level = self.get(key)
+        level.level_string = ""
+        return level
+
+    def list(self) -> list[StoredLevel]:
+        levels = list(self.entries())
+        for level in levels:
+            level.level_string = ""
+        return levels
+
+
+class DirBackend(Backend):
+    hash_section = None
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path).expanduser()
+        self.name = f"dir:{path}"
+
+    def put(self, level, name: str, description: str = "") -> str:
+        level_string, expected = _parts(level)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        # Creating the .level file claims the key, also against other processes
+        stem = re.sub(r"[^\w.\- ]", "_", name).strip(". ") or "level"
+        for i in range(10000):
+            key = stem if i == 0 else f"{stem}_{i}"
+            try:
+                with open(self.path / f"{key}.level", "x", encoding="ascii") as f:
+                    f.write(level_string)
+                break
+            except FileExistsError:
+                continue
+        else:
+            raise ValueError(f"No free key for '{name}' in {self.path}")
+
+        # Written last, list() only sees levels that are complete
+        meta = {"name": name, "description": description, "expected": expected}
+        tmp_file = self.path / f"{key}.{os.getpid()}.tmp"
+        tmp_file.write_text(json.dumps(meta))
+        os.replace(tmp_file, self.path / f"{key}.json")
+        return key
+
+    def get(self, key) -> StoredLevel:
+        level = self.stat(key)
+        level.level_string = (self.path / f"{key}.level").read_text(encoding="ascii")
+        return level
+
+    def stat(self, key) -> StoredLevel:
+        try:
+            meta = json.loads((self.path / f"{key}.json").read_text())
+            size = (self.path / f"{key}.level").stat().st_size
+        except (OSError, json.JSONDecodeError):
+            raise ValueError(f"Level '{key}' not found in {self.path}")
+        return StoredLevel(str(key), meta.get("name", key), meta.get("description", ""), size,
+                           expected=meta.get("expected"))
+
+    def list(self) -> list[StoredLevel]:
+        if not self.path.is_dir():
+            return []
+        levels = []
+        for meta_file in sorted(self.path.glob("*.json")):
+            try:
+                levels.append(self.stat(meta_file.stem))
+            except ValueError:
+                continue  # Removed meanwhile
+        return levels
+
+
+def upload_encoded(encoded, level_name: str, description: str, backend) -> int | str:
+    """Store an EncodedLevel in a backend. Returns its key, the level ID on GD.
+
+    The level's hash is recorded for --verify.
+    """
+    return upload_encoded_many([(encoded, level_name, description)], backend)[0]
+
+
+def upload_encoded_many(levels: list[tuple], backend) -> list:
+    """upload_encoded() for several (EncodedLevel, level name, description) tuples, in one put_many."""
+    import verify
+
+    keys = backend.put_many(levels)
+    if backend.hash_section:
+        verify.record(backend.hash_section, {key: encoded for key, (encoded, _, _) in zip(keys, levels)})
+    return keys
@@ -0,0 +1,186 @@
+"""
+Level verification
+
+`gd-storage --verify` checks that stored levels still decode to what was
+stored. The decoded data is hashed as it comes out of the decoder and then
+dropped, nothing is written and a level of any size only needs about one
+piece of it in memory.
+
+Uploads and --encode record what each level decodes to in HASHES_FILE:
+
+    {"levels": {"<level ID>": {"sha256": ..., "size": ...}},
+     "local": {"<level name>": {"sha256": ..., "size": ...}}}
+
+Levels that aren't in there (uploaded from elsewhere, or before hashes were
+kept) are still decoded to the end, there is just nothing to compare with.
+For "chunks" and "erasure" manifest levels every chunk or shard level is
+checked against the hash the manifest lists for it.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+from config import CONFIG_DIR
+
+HASHES_FILE = CONFIG_DIR / "hashes.json"
+CHUNK_WORKERS = 4
+SECTIONS = ("levels", "local")
+
+_lock = threading.Lock()
+
+
+def load_hashes() -> dict:
+    try:
+        hashes = json.loads(HASHES_FILE.read_text())
+    except (json.JSONDecodeError, OSError):
+        hashes = {}
+    if not isinstance(hashes, dict):
+        hashes = {}
+    for section in SECTIONS:
+        if not isinstance(hashes.get(section), dict):
+            hashes[section] = {}
+    return hashes
+
+
+def record(section: str, levels: dict):
+    """Remember what levels decode to.
+
+    levels maps level ID ("levels") or name ("local") -> EncodedLevel, or a
+    {"sha256", "size"} dict for levels copied from another backend.
+    """
+    with _lock:
+        hashes = load_hashes()
+        for key, encoded in levels.items():
+            if not isinstance(encoded, dict):
+                encoded = {"sha256": encoded.payload_hash, "size": encoded.raw_size}
+            hashes[section][str(key)] = encoded
+        try:
+            CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+            tmp_file = HASHES_FILE.with_suffix(f".{os.getpid()}.tmp")
+            tmp_file.write_text(json.dumps(hashes))
+            os.replace(tmp_file, HASHES_FILE)
+        except OSError:
+            pass  # Verification just has less to compare with
+
+
+@dataclass
+class Result:
+    target: str         # "level 123" or "'name'"
+    status: str         # "ok", "unchecked" (no stored hash), "mismatch" or "failed"
+    filename: str = ""
+    size: int = 0
+    message: str = ""
+    seconds: float = 0.0
+
+
+def verify_remote(level_id: int, expected: dict | None = None) -> Result:
+    """Stream a level from the GD servers through the decoder and check what comes out."""
+    from gd_api import LevelStream
+    from methods.sniff import decode_stream
+
+    start = time.perf_counter()
+    try:
+        with LevelStream(level_id, cache=False) as level:
+            result = _check(f"level {level_id}", decode_stream(level), expected)
+    except Exception as e:
+        result = Result(f"level {level_id}", "failed", message=str(e))
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def verify_local(name: str, level_string: str, expected: dict | None = None, label: str = "") -> Result:
+    """Same as verify_remote(), for a level string from the local save."""
+    from methods.sniff import decode_stream, unwrap_stream
+
+    start = time.perf_counter()
+    target = label or f"'{name}'"
+    try:
+        result = _check(target, decode_stream(unwrap_stream(level_string)), expected)
+    except Exception as e:
+        result = Result(target, "failed", message=str(e))
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def _check(target: str, pieces, expected: dict | None) -> Result:
+    from manifest import is_manifest
+
+    filename = next(pieces)
+    keep = is_manifest(filename)  # Manifests are small, and needed whole to check their chunks
+    digest = hashlib.sha256()
+    size = 0
+    kept = []
+    for piece in pieces:
+        digest.update(piece)
+        size += len(piece)
+        if keep:
+            kept.append(piece)
+
+    result = Result(target, "unchecked", filename, size)
+    if expected:
+        if digest.hexdigest() != expected.get("sha256") or size != expected.get("size"):
+            result.status = "mismatch"
+            result.message = f"expected {expected.get('size', 0):,} bytes with sha256 {expected.get('sha256', '')[:16]}"
+            return result
+        result.status = "ok"
+
+    if keep:
+        _check_manifest(result, b"".join(kept))
+    return result
+
+
+def _check_manifest(result: Result, data: bytes):
+    """Check the levels a "chunks" or "erasure" manifest points to. Updates result."""
+    from concurrent.futures import ThreadPoolExecutor
+    import manifest
+
+    info = manifest.loads(data)
+    if info["kind"] == "chunks":
+        entries, what = info["chunks"], "chunks"
+    elif info["kind"] == "erasure":
+        entries, what = [[digest, info["shard_size"], level_id] for digest, level_id in info["shards"]], "shards"
+    else:
+        result.status, result.message = "failed", f"Unknown manifest kind: {info['kind']}"
+        return
+
+    with ThreadPoolExecutor(CHUNK_WORKERS) as pool:
+        parts = list(pool.map(
+            lambda entry: verify_remote(entry[2], {"sha256": entry[0], "size": entry[1]}), entries,
+        ))
+    bad = [part for part in parts if part.status != "ok"]
+    result.filename, result.size = info["name"], info["size"]
+    if bad:
+        # A level that couldn't be fetched is a failure, one that decodes differently is damage
+        result.status = "failed" if all(part.status == "failed" for part in bad) else "mismatch"
+        result.message = f"{len(bad)} of {len(parts)} {what} bad, first: {bad[0].target}: {bad[0].message}"
+        if what == "shards":
+            result.message += " (still recoverable)" if len(bad) <= info["m"] else " (not recoverable)"
+    elif what == "chunks" and sum(part.size for part in parts) != info["size"]:
+        result.status, result.message = "mismatch", "chunks don't add up to the file size"
+    else:
+        result.message = f"{len(parts)} {what} ok"
+
+
+def _run(job) -> Result:
+    kind, key, level_string, expected, label = job
+    if kind == "levels":
+        return verify_remote(key, expected)
+    return verify_local(key, level_string, expected, label)
+
+
+def verify_many(jobs: list[tuple], workers: int | None = None):
+    """Run (kind, key, level string, expected, label) jobs in parallel. Yields Results in order."""
+    import profiling
+
+    # Stages inside worker processes can't be profiled
+    if len(jobs) == 1 or profiling.enabled():
+        yield from map(_run, jobs)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(min(len(jobs), workers or os.cpu_count() or 1)) as pool:
+        yield from pool.map(_run, jobs)